@@ -1,14 +1,213 @@
-"""ASGI wrapper so the Flask app can run under Uvicorn."""
+"""ASGI entrypoint so the Flask app can run under Uvicorn.
+
+Flask itself stays synchronous and runs on a bounded thread pool. In front of
+it sits a small asyncio layer that answers anonymous GETs for the hot public
+read endpoints (trail catalogue, forums, certificate verification) from a
+short-lived in-process microcache. Cache hits, and requests waiting for the
+same key to be rendered, are served on the event loop without occupying a
+thread, so a worker can hold thousands of such connections open while the
+pool is reserved for requests that actually need the database.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from typing import Awaitable, Callable, Optional
 
 from uvicorn.middleware.wsgi import WSGIMiddleware
 
+from app.core.settings import settings
 from app.main import create_app
+from app.services.local_cache import LocalCache
+
+Scope = dict
+Message = dict
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+PUBLIC_CACHEABLE = (
+    re.compile(r"^/certificates/(?!me(?:/|$))[^/]+/?$"),
+    re.compile(r"^/forums(?:/.*)?$"),
+    re.compile(r"^/trails/?$"),
+    re.compile(r"^/trails/showcase/?$"),
+    re.compile(
+        r"^/trails/\d+(?:/(?:sections|sections/\d+/items|sections-with-items"
+        r"|included-items|requirements|audience))?/?$"
+    ),
+)
+
+# Request headers that change the rendered response (url_root, CORS).
+_VARY_HEADERS = (b"host", b"origin", b"x-forwarded-host", b"x-forwarded-proto")
+_UNCACHEABLE_CONTROL = (b"no-store", b"private", b"no-cache")
+
+
+class _CachedResponse:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: list, body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    async def replay(self, send: Send, *, head: bool = False) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status,
+                "headers": self.headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": b"" if head else self.body})
+
+
+class PublicMicrocache:
+    """Serve anonymous public GETs from memory, everything else through WSGI."""
+
+    def __init__(
+        self,
+        wsgi_app,
+        *,
+        workers: int = 32,
+        ttl_seconds: float = 5.0,
+        max_entries: int = 1024,
+        max_body_bytes: int = 512 * 1024,
+        session_cookie: str = settings.COOKIE_NAME,
+    ) -> None:
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=workers)
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_body_bytes = int(max_body_bytes)
+        self._cache: LocalCache[tuple, _CachedResponse] = LocalCache(
+            max_entries=max_entries, ttl_seconds=self.ttl_seconds
+        )
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._session_marker = f"{session_cookie}=".encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            if method != "OPTIONS":
+                # Writes invalidate cached reads under the same top-level path.
+                self._purge(scope["path"])
+            await self.wsgi(scope, receive, send)
+            return
+
+        key = self._cache_key(scope)
+        if key is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        head = method == "HEAD"
+        cached = self._cache.get(key)
+        if cached is not None:
+            await cached.replay(send, head=head)
+            return
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # Another request is rendering this key; wait on the loop instead
+            # of taking a second thread.
+            response = await asyncio.shield(pending)
+            if response is not None:
+                await response.replay(send, head=head)
+                return
+            await self.wsgi(scope, receive, send)
+            return
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        shared: Optional[_CachedResponse] = None
+        try:
+            response = await self._render(scope, receive)
+            if self._storable(response):
+                shared = response
+                self._cache.set(key, response)
+        finally:
+            # Waiters fall back to their own render when nothing is shareable.
+            self._inflight.pop(key, None)
+            future.set_result(shared)
+        await response.replay(send, head=head)
+
+    # --- helpers -------------------------------------------------------------
+    def _cache_key(self, scope: Scope) -> Optional[tuple]:
+        if self.ttl_seconds <= 0:
+            return None
+        path = scope["path"]
+        if not any(pattern.match(path) for pattern in PUBLIC_CACHEABLE):
+            return None
+        headers = dict(scope.get("headers") or [])
+        if b"authorization" in headers:
+            return None
+        if self._session_marker in headers.get(b"cookie", b""):
+            return None
+        return (
+            path,
+            scope.get("query_string", b""),
+            scope.get("scheme", "http"),
+            *(headers.get(name, b"") for name in _VARY_HEADERS),
+        )
+
+    def _storable(self, response: _CachedResponse) -> bool:
+        if response.status != 200 or len(response.body) > self.max_body_bytes:
+            return False
+        for name, value in response.headers:
+            lowered = name.lower()
+            if lowered == b"set-cookie":
+                return False
+            if lowered == b"cache-control" and any(
+                token in value.lower() for token in _UNCACHEABLE_CONTROL
+            ):
+                return False
+        return True
+
+    async def _render(self, scope: Scope, receive: Receive) -> _CachedResponse:
+        start: dict = {}
+        chunks: list[bytes] = []
+
+        async def capture(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        # Render as GET so a HEAD miss still fills the cache.
+        await self.wsgi(dict(scope, method="GET"), receive, capture)
+        return _CachedResponse(
+            start.get("status", 500), list(start.get("headers", [])), b"".join(chunks)
+        )
+
+    def _purge(self, path: str) -> None:
+        prefix = "/" + path.strip("/").split("/", 1)[0]
+        self._cache.pop_where(lambda key: key[0].startswith(prefix))
+
+    @staticmethod
+    async def _lifespan(receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
 
 
 def build_app():
     """Return the Flask application wrapped as ASGI."""
     flask_app = create_app()
-    return WSGIMiddleware(flask_app)
+    if settings.asgi_microcache_ttl_seconds <= 0:
+        return WSGIMiddleware(flask_app, workers=settings.asgi_wsgi_workers)
+    return PublicMicrocache(
+        flask_app,
+        workers=settings.asgi_wsgi_workers,
+        ttl_seconds=settings.asgi_microcache_ttl_seconds,
+        max_entries=settings.asgi_microcache_max_entries,
+    )
 
 
 app = build_app()
@@ -8,6 +8,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from app.core.metrics import InstrumentedQueuePool
 from app.core.settings import settings
 
 
@@ -31,6 +32,7 @@ else:
             "pool_timeout": settings.db_pool_timeout,
             "pool_recycle": settings.db_pool_recycle,
             "pool_use_lifo": True,
+            "poolclass": InstrumentedQueuePool,
         }
     )
 
@@ -0,0 +1,459 @@
+"""Per-request latency, SQL and pool metrics in Prometheus text format.
+
+Counters live in the process (one registry per Uvicorn worker); with
+``METRICS_MULTIPROC_DIR`` set, each worker also dumps its registry there and
+``/metrics`` sums every dump, so any worker answers for all of them. Every Flask
+request gets a :class:`RequestStats` bound to a context variable; SQLAlchemy
+cursor events add statement counts and time to it, and the instrumented
+queue pool adds the time spent waiting for a connection. At the end of the
+request the totals feed the histograms exposed on ``GET /metrics`` (only
+when ``METRICS_TOKEN`` is set) and, when ``SERVER_TIMING_ENABLED`` is set,
+the ``Server-Timing`` header.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import Flask, Response, abort, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from app.core.settings import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+_QUERY_START_KEY = "metrics.query_start"
+
+
+@dataclass
+class RequestStats:
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Stats of the request running in this context, if any."""
+
+    return _current_stats.get()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(v))}"' for name, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def combine(left: float, right: float) -> float:
+        return left + right
+
+    def expose(
+        self, values: Optional[Dict[Tuple[str, ...], float]] = None
+    ) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        items = sorted((self.snapshot() if values is None else values).items())
+        for labels, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.label_names, labels)}"
+                f" {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return int(state[-2]) if state else 0
+
+    def sum(self, *labels: str) -> float:
+        state = self._values.get(labels)
+        return state[-1] if state else 0.0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(state) for labels, state in self._values.items()}
+
+    @staticmethod
+    def combine(left: List[float], right: List[float]) -> List[float]:
+        return [a + b for a, b in zip(left, right)]
+
+    def expose(
+        self, values: Optional[Dict[Tuple[str, ...], List[float]]] = None
+    ) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        items = sorted((self.snapshot() if values is None else values).items())
+        for labels, state in items:
+            for bound, count in zip(self.buckets, state):
+                le = _format_labels(
+                    self.label_names, labels, le=_format_value(float(bound))
+                )
+                lines.append(f"{self.name}_bucket{le} {count}")
+            inf = _format_labels(self.label_names, labels, le="+Inf")
+            plain = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_bucket{inf} {state[-2]}")
+            lines.append(f"{self.name}_sum{plain} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{plain} {state[-2]}")
+        return lines
+
+
+ROUTE_LABELS = ("method", "route")
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests handled, by route template and status code.",
+    ("method", "route", "status"),
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent in Flask per request.",
+    ROUTE_LABELS,
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes",
+    "Response body size, when known up front.",
+    ROUTE_LABELS,
+    buckets=SIZE_BUCKETS,
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request.",
+    ROUTE_LABELS,
+    buckets=SQL_COUNT_BUCKETS,
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Time spent executing SQL per request.",
+    ROUTE_LABELS,
+)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+)
+SQL_STATEMENTS = Counter("db_statements_total", "SQL statements executed.")
+
+METRICS = (
+    REQUESTS,
+    REQUEST_LATENCY,
+    RESPONSE_SIZE,
+    REQUEST_SQL_STATEMENTS,
+    REQUEST_SQL_DURATION,
+    POOL_WAIT,
+    SQL_STATEMENTS,
+)
+
+
+def render_metrics() -> str:
+    directory = settings.metrics_multiproc_dir
+    merged = None
+    if directory:
+        write_snapshot(directory)
+        merged = _read_snapshots(directory)
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.expose(None if merged is None else merged[metric.name]))
+    return "\n".join(lines) + "\n"
+
+
+# --- Multi-process aggregation ---------------------------------------------------
+# Dumps of exited workers are kept so the summed counters never go backwards;
+# the directory must be emptied when the whole service restarts.
+_snapshot_lock = threading.Lock()
+_snapshot_thread: Optional[threading.Thread] = None
+
+
+def write_snapshot(directory: str) -> None:
+    """Dump this worker's registry to ``<directory>/<pid>.json``."""
+
+    payload = {
+        metric.name: [
+            [list(labels), value] for labels, value in metric.snapshot().items()
+        ]
+        for metric in METRICS
+    }
+    root = Path(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=root, prefix=".tmp-", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle)
+    os.replace(tmp_name, root / f"{os.getpid()}.json")
+
+
+def _read_snapshots(directory: str) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+    merged: Dict[str, Dict[Tuple[str, ...], Any]] = {m.name: {} for m in METRICS}
+    combine = {metric.name: metric.combine for metric in METRICS}
+    for path in Path(directory).glob("[0-9]*.json"):
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue  # a worker being replaced mid-write; next scrape sees it
+        for name, entries in payload.items():
+            target = merged.get(name)
+            if target is None:
+                continue
+            for labels, value in entries:
+                key = tuple(labels)
+                current = target.get(key)
+                target[key] = (
+                    value if current is None else combine[name](current, value)
+                )
+    return merged
+
+
+def _snapshot_loop(directory: str, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            write_snapshot(directory)
+        except OSError:
+            pass  # retried on the next tick
+
+
+def _start_snapshots(directory: str, interval: float) -> None:
+    global _snapshot_thread
+    with _snapshot_lock:
+        if _snapshot_thread is not None:
+            return
+        _snapshot_thread = threading.Thread(
+            target=_snapshot_loop,
+            args=(directory, interval),
+            name="metrics-snapshot",
+            daemon=True,
+        )
+        _snapshot_thread.start()
+    atexit.register(write_snapshot, directory)
+
+
+def reset_metrics() -> None:
+    for metric in METRICS:
+        metric.clear()
+
+
+# --- SQLAlchemy hooks -----------------------------------------------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_QUERY_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    SQL_STATEMENTS.inc()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # after_cursor_execute is skipped for failed statements.
+    connection = context.connection
+    starts = connection.info.get(_QUERY_START_KEY) if connection is not None else None
+    if starts:
+        starts.pop()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """``QueuePool`` that records how long each checkout waited.
+
+    The time includes opening a new connection when the pool is still
+    growing, which is also time the request spent without a connection.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            POOL_WAIT.observe(waited)
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.pool_wait_seconds += waited
+
+
+# --- Flask hooks ----------------------------------------------------------------
+_START_ENVIRON_KEY = "metrics.start"
+_STATS_TOKEN_ENVIRON_KEY = "metrics.token"
+
+
+def _route_label() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def _server_timing(total: float, stats: RequestStats) -> str:
+    return ", ".join(
+        (
+            f"app;dur={total * 1000:.1f}",
+            f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_count} queries"',
+            f"pool;dur={stats.pool_wait_seconds * 1000:.1f}",
+        )
+    )
+
+
+def _metrics_view():
+    token = settings.metrics_token
+    if not token:
+        # Route templates, traffic and latency are not public information:
+        # without a configured token the endpoint does not exist.
+        abort(404)
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied, f"Bearer {token}"):
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    return Response(
+        render_metrics(),
+        headers={"Cache-Control": "no-store"},
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def init_metrics(app: Flask) -> None:
+    """Time every request and serve ``GET /metrics`` (register before other hooks)."""
+
+    if not settings.metrics_enabled:
+        return
+    if settings.metrics_multiproc_dir:
+        _start_snapshots(
+            settings.metrics_multiproc_dir, settings.metrics_snapshot_seconds
+        )
+
+    @app.before_request
+    def _start_request_metrics():
+        request.environ[_START_ENVIRON_KEY] = time.perf_counter()
+        request.environ[_STATS_TOKEN_ENVIRON_KEY] = _current_stats.set(RequestStats())
+
+    @app.after_request
+    def _record_request_metrics(response):
+        start = request.environ.get(_START_ENVIRON_KEY)
+        stats = _current_stats.get()
+        if start is None or stats is None:
+            return response
+        total = time.perf_counter() - start
+        method, route = request.method, _route_label()
+        REQUESTS.inc(method, route, str(response.status_code))
+        REQUEST_LATENCY.observe(total, method, route)
+        REQUEST_SQL_STATEMENTS.observe(stats.sql_count, method, route)
+        REQUEST_SQL_DURATION.observe(stats.sql_seconds, method, route)
+        if not response.is_streamed and response.content_length is not None:
+            RESPONSE_SIZE.observe(response.content_length, method, route)
+        if settings.server_timing_enabled:
+            response.headers["Server-Timing"] = _server_timing(total, stats)
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(_exc=None):
+        token = request.environ.pop(_STATS_TOKEN_ENVIRON_KEY, None)
+        if token is not None:
+            try:
+                _current_stats.reset(token)
+            except ValueError:  # torn down from another context
+                _current_stats.set(None)
+
+    app.add_url_rule("/metrics", "metrics", _metrics_view, methods=["GET"])
+
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "InstrumentedQueuePool",
+    "RequestStats",
+    "current_request_stats",
+    "init_metrics",
+    "render_metrics",
+    "reset_metrics",
+    "write_snapshot",
+]
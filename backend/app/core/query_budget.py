@@ -0,0 +1,211 @@
+"""Query budgets: cap the SQL a block or route may run and spot N+1 loops.
+
+``query_budget(max_queries, max_repeats=...)`` works as a context manager or
+decorator. While it is active every statement executed in the same context
+is counted and grouped by *shape* (whitespace, numbers and expanded IN
+lists normalised), so the same query issued once per row shows up as one
+shape repeated N times. Leaving the block raises
+:class:`QueryBudgetExceeded` when either limit was passed.
+
+Routes declare their budget with ``@route_query_budget(...)``; with
+``QUERY_BUDGET_MODE`` set to ``log`` (staging) overruns are logged, with
+``raise`` (the test suite) the request fails.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from flask import Flask, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})+\s*\)")
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+# Savepoints are transaction bookkeeping (the test harness wraps every test
+# in one), not queries a route chose to run.
+_SAVEPOINT = re.compile(r"^\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO)\b", re.I)
+_BUDGET_ENVIRON_KEY = "query_budget.active"
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block or route runs more SQL than it declared."""
+
+
+def statement_shape(statement: str) -> str:
+    shape = _SPACE.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("(?)", shape)
+    return _NUMBER.sub("N", shape)
+
+
+_active: ContextVar[Tuple["query_budget", ...]] = ContextVar(
+    "query_budgets", default=()
+)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    budgets = _active.get()
+    if budgets and not _SAVEPOINT.match(statement):
+        shape = statement_shape(statement)
+        for budget in budgets:
+            budget.statements.append(shape)
+
+
+class query_budget(ContextDecorator):
+    """Fail when more than ``max_queries`` statements run inside the block.
+
+    ``max_repeats`` additionally limits how often one statement shape may
+    repeat, which catches N+1 loops even while the total stays small.
+    """
+
+    def __init__(
+        self,
+        max_queries: Optional[int] = None,
+        *,
+        max_repeats: Optional[int] = None,
+        name: str = "bloco",
+    ) -> None:
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.name = name
+        self.statements: List[str] = []
+        self._token = None
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """Shapes run more than ``max_repeats`` times, most frequent first."""
+
+        if self.max_repeats is None:
+            return []
+        return [
+            (shape, times)
+            for shape, times in Counter(self.statements).most_common()
+            if times > self.max_repeats
+        ]
+
+    def violations(self) -> List[str]:
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(
+                f"{self.name}: {self.count} queries (orçamento {self.max_queries})"
+            )
+        for shape, times in self.repeated():
+            problems.append(
+                f"{self.name}: query repetida {times}x"
+                f" (máximo {self.max_repeats}): {shape[:200]}"
+            )
+        return problems
+
+    def __enter__(self) -> "query_budget":
+        self.statements = []
+        self._token = _active.set(_active.get() + (self,))
+        return self
+
+    def stop(self) -> None:
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.stop()
+        if exc_type is None:
+            problems = self.violations()
+            if problems:
+                raise QueryBudgetExceeded("\n".join(problems))
+        return False
+
+    # ContextDecorator reuses the instance for every call of a decorated
+    # function; give each call its own counters instead.
+    def _recreate_cm(self) -> "query_budget":
+        return query_budget(
+            self.max_queries, max_repeats=self.max_repeats, name=self.name
+        )
+
+
+@dataclass(frozen=True)
+class RouteQueryBudget:
+    max_queries: Optional[int]
+    max_repeats: Optional[int]
+
+
+def route_query_budget(
+    max_queries: Optional[int] = None, *, max_repeats: Optional[int] = 2
+) -> Callable:
+    """Declare a view's SQL budget; place it under the route decorator."""
+
+    declared = RouteQueryBudget(max_queries, max_repeats)
+
+    def decorator(view: Callable) -> Callable:
+        view.query_budget = declared
+        return view
+
+    return decorator
+
+
+def init_query_budgets(app: Flask) -> None:
+    """Check declared route budgets when ``QUERY_BUDGET_MODE`` is ``log`` or ``raise``."""
+
+    @app.before_request
+    def _start_query_budget():
+        if settings.query_budget_mode == "off":
+            return None
+        view = current_app.view_functions.get(request.endpoint)
+        declared = getattr(view, "query_budget", None)
+        if declared is None:
+            return None
+        budget = query_budget(
+            declared.max_queries,
+            max_repeats=declared.max_repeats,
+            name=f"{request.method} {request.url_rule.rule}",
+        )
+        request.environ[_BUDGET_ENVIRON_KEY] = budget.__enter__()
+        return None
+
+    @app.after_request
+    def _check_query_budget(response):
+        budget = request.environ.pop(_BUDGET_ENVIRON_KEY, None)
+        if budget is None:
+            return response
+        budget.stop()
+        problems = budget.violations()
+        if problems:
+            if settings.query_budget_mode == "raise":
+                raise QueryBudgetExceeded("\n".join(problems))
+            for problem in problems:
+                logger.warning("Orçamento de queries excedido: %s", problem)
+        return response
+
+    @app.teardown_request
+    def _drop_query_budget(_exc=None):
+        budget = request.environ.pop(_BUDGET_ENVIRON_KEY, None)
+        if budget is not None:
+            try:
+                budget.stop()
+            except ValueError:  # torn down from another context
+                pass
+
+
+__all__ = [
+    "QueryBudgetExceeded",
+    "RouteQueryBudget",
+    "init_query_budgets",
+    "query_budget",
+    "route_query_budget",
+    "statement_shape",
+]
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Iterable, List
+from typing import Iterable, List, Literal
 
 from pydantic import Field, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -64,6 +64,33 @@ class Settings(BaseSettings):
         default=10, env="AUTH_RATE_LIMIT_MAX_ATTEMPTS", ge=1
     )
 
+    metrics_enabled: bool = Field(default=True, env="METRICS_ENABLED")
+    metrics_token: str | None = Field(default=None, env="METRICS_TOKEN")
+    metrics_multiproc_dir: str | None = Field(default=None, env="METRICS_MULTIPROC_DIR")
+    metrics_snapshot_seconds: float = Field(
+        default=5.0, env="METRICS_SNAPSHOT_SECONDS", gt=0
+    )
+    server_timing_enabled: bool = Field(default=False, env="SERVER_TIMING_ENABLED")
+
+    query_budget_mode: Literal["off", "log", "raise"] = Field(
+        default="off", env="QUERY_BUDGET_MODE"
+    )
+
+    route_rate_limits_enabled: bool = Field(
+        default=True, env="ROUTE_RATE_LIMITS_ENABLED"
+    )
+    max_in_flight_requests: int = Field(default=0, env="MAX_IN_FLIGHT_REQUESTS", ge=0)
+    in_flight_wait_seconds: float = Field(
+        default=0.1, env="IN_FLIGHT_WAIT_SECONDS", ge=0
+    )
+    trusted_proxy_hops: int = Field(default=0, env="TRUSTED_PROXY_HOPS", ge=0)
+
+    bcrypt_rounds: int = Field(default=12, env="BCRYPT_ROUNDS", ge=4, le=31)
+    password_hash_workers: int = Field(default=2, env="PASSWORD_HASH_WORKERS", ge=0)
+    password_hash_max_pending: int = Field(
+        default=32, env="PASSWORD_HASH_MAX_PENDING", ge=0
+    )
+
     smtp_host: str | None = Field(default=None, env="SMTP_HOST")
     smtp_port: int = Field(default=587, env="SMTP_PORT")
     smtp_user: str | None = Field(default=None, env="SMTP_USER")
@@ -72,6 +99,13 @@ class Settings(BaseSettings):
     smtp_timeout: int = Field(default=20, env="SMTP_TIMEOUT")
     smtp_from_name: str = Field(default="Equipe Rota", env="SMTP_FROM_NAME")
     smtp_from_email: str | None = Field(default=None, env="SMTP_FROM_EMAIL")
+    email_queue_workers: int = Field(default=2, env="EMAIL_QUEUE_WORKERS", ge=0)
+    email_queue_max_size: int = Field(default=1000, env="EMAIL_QUEUE_MAX_SIZE", ge=1)
+    email_spool_dir: str = Field(default=".cache/email-spool", env="EMAIL_SPOOL_DIR")
+    email_max_attempts: int = Field(default=5, env="EMAIL_MAX_ATTEMPTS", ge=1)
+    email_retry_backoff_seconds: float = Field(
+        default=30.0, env="EMAIL_RETRY_BACKOFF_SECONDS", ge=0
+    )
     app_base_url: str | None = Field(default=None, env="APP_BASE_URL")
     password_reset_base_url: str | None = Field(
         default=None, env="PASSWORD_RESET_BASE_URL"
@@ -81,6 +115,68 @@ class Settings(BaseSettings):
     )
     rota_brand_color: str = Field(default="#0A3D8F", env="ROTA_BRAND_COLOR")
 
+    trail_outline_cache_size: int = Field(
+        default=1024, env="TRAIL_OUTLINE_CACHE_SIZE", ge=1
+    )
+    trail_outline_ttl_seconds: int = Field(
+        default=300, env="TRAIL_OUTLINE_TTL_SECONDS", ge=0
+    )
+    item_detail_cache_size: int = Field(
+        default=2048, env="ITEM_DETAIL_CACHE_SIZE", ge=1
+    )
+    item_detail_cache_ttl_seconds: int = Field(
+        default=300, env="ITEM_DETAIL_CACHE_TTL_SECONDS", ge=0
+    )
+
+    trail_builder_download_workers: int = Field(
+        default=4, env="TRAIL_BUILDER_DOWNLOAD_WORKERS", ge=1
+    )
+    document_revalidate_seconds: int = Field(
+        default=3600, env="DOCUMENT_REVALIDATE_SECONDS", ge=0
+    )
+
+    image_derivative_workers: int = Field(
+        default=2, env="IMAGE_DERIVATIVE_WORKERS", ge=0
+    )
+
+    asgi_wsgi_workers: int = Field(default=32, env="ASGI_WSGI_WORKERS", ge=1)
+    asgi_microcache_ttl_seconds: float = Field(
+        default=5.0, env="ASGI_MICROCACHE_TTL_SECONDS", ge=0
+    )
+    asgi_microcache_max_entries: int = Field(
+        default=1024, env="ASGI_MICROCACHE_MAX_ENTRIES", ge=1
+    )
+
+    session_cache_ttl_seconds: int = Field(
+        default=30, env="SESSION_CACHE_TTL_SECONDS", ge=0
+    )
+    session_cache_max_entries: int = Field(
+        default=10000, env="SESSION_CACHE_MAX_ENTRIES", ge=1
+    )
+
+    progress_coalesce_seconds: float = Field(
+        default=0.0, env="PROGRESS_COALESCE_SECONDS", ge=0
+    )
+    progress_coalesce_max_entries: int = Field(
+        default=10000, env="PROGRESS_COALESCE_MAX_ENTRIES", ge=1
+    )
+    progress_aggregation_mode: Literal["sync", "incremental"] = Field(
+        default="sync", env="PROGRESS_AGGREGATION_MODE"
+    )
+
+    certificate_cache_backend: Literal["memory", "disk", "redis"] = Field(
+        default="memory", env="CERTIFICATE_CACHE_BACKEND"
+    )
+    certificate_cache_dir: str = Field(
+        default=".cache/certificates", env="CERTIFICATE_CACHE_DIR"
+    )
+    certificate_cache_ttl_seconds: int = Field(
+        default=86400, env="CERTIFICATE_CACHE_TTL_SECONDS", ge=0
+    )
+    certificate_cache_max_entries: int = Field(
+        default=2048, env="CERTIFICATE_CACHE_MAX_ENTRIES", ge=1
+    )
+
     model_config = SettingsConfigDict(
         env_file=".env",  # troque para ".env.docker" se rodar no compose
         env_file_encoding="utf-8",
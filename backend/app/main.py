@@ -2,6 +2,8 @@ from flask import Flask, request
 from flask_cors import CORS as FlaskCORS
 
 from app.core.db import close_db
+from app.core.metrics import init_metrics
+from app.core.query_budget import init_query_budgets
 from app.core.settings import settings
 from app.routes.auth import bp as auth_bp
 from app.routes.me import bp as me_bp
@@ -13,13 +15,23 @@ from app.routes.forums import bp as forums_bp
 from app.routes.admin import bp as admin_bp
 from app.routes.uploads import uploads_bp
 from app.routes.members import members_bp, admin_members_bp
-from app.services.forum_bootstrap import ensure_forum_tables
+from app.services.lookups import warm_lookups
+from app.services.media import MAX_REQUEST_BYTES, MediaRequest
+from app.services.request_limits import init_request_limits
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
-
-    ensure_forum_tables()
+    # Uploads are spooled straight into the uploads folder and capped per route;
+    # MAX_CONTENT_LENGTH is the hard ceiling for any request body.
+    app.request_class = MediaRequest
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+
+    warm_lookups()
+    # Metrics first, so shed and throttled requests are timed too.
+    init_metrics(app)
+    init_query_budgets(app)
+    init_request_limits(app)
 
     allowed_origins = settings.cors_allowed_origins_list() or [settings.API_ORIGIN]
 
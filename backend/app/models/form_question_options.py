@@ -15,7 +15,12 @@ if TYPE_CHECKING:
 class FormQuestionOption(Base):
     __tablename__ = "form_question_options"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite only autoincrements INTEGER primary keys; bulk inserts rely on it.
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
     question_id: Mapped[int | None] = mapped_column(
         BigInteger, ForeignKey("form_question.id", ondelete="CASCADE"), nullable=True
     )
@@ -18,7 +18,12 @@ if TYPE_CHECKING:
 class FormSubmission(Base):
     __tablename__ = "form_submissions"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite only autoincrements INTEGER primary keys; bulk inserts rely on it.
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
     form_id: Mapped[int | None] = mapped_column(
         BigInteger, ForeignKey("forms.id", ondelete="CASCADE"), nullable=True
     )
@@ -3,7 +3,7 @@ from __future__ import annotations
 from decimal import Decimal
 from typing import TYPE_CHECKING, List, Optional
 
-from sqlalchemy import BigInteger, Boolean, ForeignKey, Numeric, String, Text
+from sqlalchemy import BigInteger, Boolean, ForeignKey, Integer, Numeric, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -17,7 +17,12 @@ if TYPE_CHECKING:
 class Form(Base):
     __tablename__ = "forms"
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite only autoincrements INTEGER primary keys; bulk inserts rely on it.
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
     trail_item_id: Mapped[int | None] = mapped_column(
         BigInteger,
         ForeignKey("trail_items.id", ondelete="CASCADE"),
@@ -48,6 +48,16 @@ class Forum(Base):
         onupdate=func.now(),
         nullable=False,
     )
+    # Denormalised counters maintained by ForumsRepository.create_topic/post.
+    topics_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    posts_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    last_activity_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     trail: Mapped[Optional["Trails"]] = relationship(back_populates="forums")
     topics: Mapped[List["ForumTopic"]] = relationship(
@@ -77,6 +87,12 @@ class ForumTopic(Base):
         onupdate=func.now(),
         nullable=False,
     )
+    posts_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    last_post_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
 
     forum: Mapped["Forum"] = relationship(back_populates="topics")
     created_by: Mapped[Optional["User"]] = relationship()
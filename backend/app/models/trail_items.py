@@ -13,6 +13,8 @@ if TYPE_CHECKING:
 
 
 class ItemTypeEnum(UserDefinedType):
+    cache_ok = True  # stateless, safe to use in statement cache keys
+
     def get_col_spec(self, **_kw):
         return "item_type"
 
@@ -29,6 +29,11 @@ class Trails(Base):
     )
     author: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Bumped by the trail builder when a save changes the tree; cached answer
+    # keys are checked against it.
+    content_version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
 
     sections: Mapped[List["TrailSections"]] = relationship(
         back_populates="trail", cascade="all, delete-orphan"
@@ -54,3 +59,12 @@ class Trails(Base):
             return build_media_url(self.thumbnail_path, external=True)
         except RuntimeError:
             return None
+
+    @property
+    def thumbnail_variants(self) -> Optional[dict]:
+        try:
+            from app.services.image_derivatives import image_variants
+
+            return image_variants(self.thumbnail_path, external=True)
+        except RuntimeError:
+            return None
@@ -1,15 +1,23 @@
 # app/models/user_item_progress.py
 from typing import Optional
 from datetime import datetime
-from sqlalchemy import Integer, BigInteger, ForeignKey, DateTime
+from sqlalchemy import Integer, BigInteger, ForeignKey, DateTime, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from .base import Base
 
 
 class UserItemProgress(Base):
     __tablename__ = "user_item_progress"
+    __table_args__ = (
+        UniqueConstraint("user_id", "trail_item_id", name="user_item_progress_unique"),
+    )
 
-    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # SQLite only autoincrements INTEGER primary keys; bulk upserts rely on it.
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
     user_id: Mapped[int] = mapped_column(
         ForeignKey("users.user_id", ondelete="CASCADE")
     )
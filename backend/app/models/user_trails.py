@@ -28,6 +28,9 @@ class UserTrails(Base):
     progress_percent: Mapped[Optional[float]] = mapped_column(
         Numeric(5, 2), nullable=True
     )
+    # Completed items, maintained by delta in incremental aggregation mode;
+    # NULL until the first full sync seeds it.
+    done_items: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     started_at: Mapped[Optional[datetime]] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
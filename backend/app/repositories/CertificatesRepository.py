@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import secrets
-from typing import Dict, Iterable, Optional
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-from sqlalchemy import func
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 
 from app.models.trail_certificates import TrailCertificates as TrailCertificatesORM
+from app.models.user_trails import UserTrails as UserTrailsORM
 from app.models.users import User as UserORM
 from app.models.trails import Trails as TrailsORM
 
@@ -56,6 +58,124 @@ class CertificatesRepository:
         self.db.flush()
         return cert
 
+    def _unique_tokens(self, count: int) -> list[str]:
+        tokens: set[str] = set()
+        while len(tokens) < count:
+            candidates = {
+                self._generate_token(16) for _ in range(count - len(tokens))
+            } - tokens
+            taken = {
+                row[0]
+                for row in self.db.query(TrailCertificatesORM.certificate_hash)
+                .filter(TrailCertificatesORM.certificate_hash.in_(candidates))
+                .all()
+            }
+            tokens.update(candidates - taken)
+        return list(tokens)
+
+    def ensure_certificates(
+        self, user_id: int, trail_ids: Iterable[int]
+    ) -> Dict[int, TrailCertificatesORM]:
+        # Batch variant of ensure_certificate: one lookup for the existing rows,
+        # one collision check for the new tokens and a single flush.
+        ids = sorted({int(tid) for tid in trail_ids})
+        if not ids:
+            return {}
+        cert_map = self.get_for_user_trails(user_id, ids)
+        missing = [tid for tid in ids if tid not in cert_map]
+        if not missing:
+            return cert_map
+
+        now_expr = func.now()
+        for trail_id, token in zip(missing, self._unique_tokens(len(missing))):
+            cert = TrailCertificatesORM(
+                user_id=user_id,
+                trail_id=trail_id,
+                certificate_hash=token,
+                credential_id=token,
+                issued_at=now_expr,
+                issued_at_utc=now_expr,
+            )
+            self.db.add(cert)
+            cert_map[trail_id] = cert
+        self.db.flush()
+        return cert_map
+
+    # --- bulk backfill -----------------------------------------------------
+    def _missing_for_status_query(self, status_id: int):
+        return (
+            self.db.query(
+                UserTrailsORM.id, UserTrailsORM.user_id, UserTrailsORM.trail_id
+            )
+            .outerjoin(
+                TrailCertificatesORM,
+                (TrailCertificatesORM.user_id == UserTrailsORM.user_id)
+                & (TrailCertificatesORM.trail_id == UserTrailsORM.trail_id),
+            )
+            .filter(
+                UserTrailsORM.status_id == status_id,
+                TrailCertificatesORM.id.is_(None),
+            )
+        )
+
+    def count_missing_for_status(self, status_id: int) -> int:
+        return self._missing_for_status_query(status_id).count()
+
+    def missing_for_status(
+        self, status_id: int, *, after_id: int = 0, limit: int = 1000
+    ) -> List[Tuple[int, int, int]]:
+        """Enrollments in ``status_id`` without a certificate, keyset on user_trails.id.
+
+        Returns ``(user_trail_id, user_id, trail_id)`` tuples in id order.
+        """
+
+        rows = (
+            self._missing_for_status_query(status_id)
+            .filter(UserTrailsORM.id > after_id)
+            .order_by(UserTrailsORM.id.asc())
+            .limit(limit)
+            .all()
+        )
+        return [(row.id, row.user_id, row.trail_id) for row in rows]
+
+    def insert_missing(self, pairs: Sequence[Tuple[int, int]]) -> int:
+        """Multi-row insert of certificates for ``(user_id, trail_id)`` pairs.
+
+        Rows that already exist (or, astronomically unlikely, collide on the
+        random token) are skipped by the database instead of probed one by one;
+        a later run picks up anything skipped. Returns the inserted row count.
+        """
+
+        if not pairs:
+            return 0
+        now = datetime.now(timezone.utc)
+        rows = []
+        for user_id, trail_id in pairs:
+            token = self._generate_token(16)
+            rows.append(
+                {
+                    "user_id": user_id,
+                    "trail_id": trail_id,
+                    "certificate_hash": token,
+                    "credential_id": token,
+                    "issued_at": now,
+                    "issued_at_utc": now.replace(tzinfo=None),
+                }
+            )
+
+        table = TrailCertificatesORM.__table__
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+            stmt = pg_insert(table).values(rows).on_conflict_do_nothing()
+        elif dialect == "sqlite":
+            stmt = insert(table).values(rows).prefix_with("OR IGNORE")
+        else:
+            stmt = insert(table).values(rows)
+        result = self.db.execute(stmt)
+        return max(result.rowcount or 0, 0)
+
     def get_for_user_trails(
         self, user_id: int, trail_ids: Iterable[int]
     ) -> Dict[int, TrailCertificatesORM]:
@@ -84,6 +204,22 @@ class CertificatesRepository:
             .first()
         )
 
+    def hashes_for_user(self, user_id: int) -> list[str]:
+        return [
+            value
+            for (value,) in self.db.query(TrailCertificatesORM.certificate_hash)
+            .filter(TrailCertificatesORM.user_id == user_id)
+            .all()
+        ]
+
+    def hashes_for_trail(self, trail_id: int) -> list[str]:
+        return [
+            value
+            for (value,) in self.db.query(TrailCertificatesORM.certificate_hash)
+            .filter(TrailCertificatesORM.trail_id == trail_id)
+            .all()
+        ]
+
     def get_by_hash(self, certificate_hash: str) -> Optional[TrailCertificatesORM]:
         cleaned = (certificate_hash or "").strip().lower()
         if not cleaned:
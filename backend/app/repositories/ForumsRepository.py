@@ -4,7 +4,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.orm import Session
 
 from app.models.forums import (
@@ -42,11 +42,29 @@ class PostWithAuthor:
     replies: List["PostWithAuthor"]
 
 
+# Keyset position: (timestamp, id) of the last row of the previous page.
+PageKey = Tuple[datetime, int]
+
+
+@dataclass(slots=True)
+class TopicsPage:
+    topics: List[TopicStats]
+    next_key: Optional[PageKey]
+
+
+@dataclass(slots=True)
+class PostsPage:
+    posts: List[PostWithAuthor]
+    next_key: Optional[PageKey]
+
+
 class ForumsRepository:
     def __init__(self, db: Session):
         self.db = db
 
     # --- bootstrap helpers -------------------------------------------------
+    # Trail forums are created by the Trails after_insert hook; these helpers
+    # only back the reconcile script and must not run on the request path.
     def ensure_general_forum(self) -> ForumORM:
         forum = self.db.query(ForumORM).filter(ForumORM.is_general.is_(True)).first()
         if forum:
@@ -62,7 +80,7 @@ class ForumsRepository:
         self.db.flush()
         return forum
 
-    def ensure_trail_forums(self) -> None:
+    def ensure_trail_forums(self) -> int:
         missing_trails = (
             self.db.query(TrailsORM)
             .outerjoin(ForumORM, ForumORM.trail_id == TrailsORM.id)
@@ -70,7 +88,7 @@ class ForumsRepository:
             .all()
         )
         if not missing_trails:
-            return
+            return 0
 
         for trail in missing_trails:
             forum = ForumORM(
@@ -82,6 +100,7 @@ class ForumsRepository:
             )
             self.db.add(forum)
         self.db.flush()
+        return len(missing_trails)
 
     def ensure_bootstrap(self) -> ForumORM:
         general = self.ensure_general_forum()
@@ -89,143 +108,86 @@ class ForumsRepository:
         return general
 
     # --- queries -----------------------------------------------------------
-    def list_forums_with_stats(self) -> List[ForumStats]:
-        self.ensure_bootstrap()
-
-        topics_count_sq = (
-            self.db.query(func.count(ForumTopicORM.id))
-            .filter(ForumTopicORM.forum_id == ForumORM.id)
-            .correlate(ForumORM)
-            .scalar_subquery()
-        )
-        posts_count_sq = (
-            self.db.query(func.count(ForumPostORM.id))
-            .join(ForumTopicORM, ForumTopicORM.id == ForumPostORM.topic_id)
-            .filter(ForumTopicORM.forum_id == ForumORM.id)
-            .correlate(ForumORM)
-            .scalar_subquery()
+    @staticmethod
+    def _forum_stats(forum: ForumORM, trail_name: Optional[str]) -> ForumStats:
+        return ForumStats(
+            forum=forum,
+            trail_name=trail_name,
+            topics_count=forum.topics_count or 0,
+            posts_count=forum.posts_count or 0,
+            last_activity_at=forum.last_activity_at or forum.updated_at,
         )
-        last_activity_sq = (
-            self.db.query(func.max(ForumPostORM.created_at))
-            .join(ForumTopicORM, ForumTopicORM.id == ForumPostORM.topic_id)
-            .filter(ForumTopicORM.forum_id == ForumORM.id)
-            .correlate(ForumORM)
-            .scalar_subquery()
+
+    @staticmethod
+    def _topic_stats(topic: ForumTopicORM, author: Optional[UserORM]) -> TopicStats:
+        return TopicStats(
+            topic=topic,
+            author=author,
+            posts_count=topic.posts_count or 0,
+            last_post_at=topic.last_post_at or topic.updated_at,
         )
 
+    def list_forums_with_stats(self) -> List[ForumStats]:
         rows = (
-            self.db.query(
-                ForumORM,
-                TrailsORM.name.label("trail_name"),
-                topics_count_sq.label("topics_count"),
-                posts_count_sq.label("posts_count"),
-                last_activity_sq.label("last_activity_at"),
-            )
+            self.db.query(ForumORM, TrailsORM.name.label("trail_name"))
             .outerjoin(TrailsORM, TrailsORM.id == ForumORM.trail_id)
             .order_by(ForumORM.is_general.desc(), ForumORM.title.asc())
             .all()
         )
-
-        return [
-            ForumStats(
-                forum=row[0],
-                trail_name=row[1],
-                topics_count=row[2] or 0,
-                posts_count=row[3] or 0,
-                last_activity_at=row[4] or row[0].updated_at,
-            )
-            for row in rows
-        ]
+        return [self._forum_stats(forum, trail_name) for forum, trail_name in rows]
 
     def get_forum_with_stats(self, forum_id: int) -> Optional[ForumStats]:
-        self.ensure_bootstrap()
-        topics_count_sq = (
-            self.db.query(func.count(ForumTopicORM.id))
-            .filter(ForumTopicORM.forum_id == forum_id)
-            .scalar_subquery()
-        )
-        posts_count_sq = (
-            self.db.query(func.count(ForumPostORM.id))
-            .join(ForumTopicORM, ForumTopicORM.id == ForumPostORM.topic_id)
-            .filter(ForumTopicORM.forum_id == forum_id)
-            .scalar_subquery()
-        )
-        last_activity_sq = (
-            self.db.query(func.max(ForumPostORM.created_at))
-            .join(ForumTopicORM, ForumTopicORM.id == ForumPostORM.topic_id)
-            .filter(ForumTopicORM.forum_id == forum_id)
-            .scalar_subquery()
-        )
-
         row = (
-            self.db.query(
-                ForumORM,
-                TrailsORM.name.label("trail_name"),
-                topics_count_sq.label("topics_count"),
-                posts_count_sq.label("posts_count"),
-                last_activity_sq.label("last_activity_at"),
-            )
+            self.db.query(ForumORM, TrailsORM.name.label("trail_name"))
             .outerjoin(TrailsORM, TrailsORM.id == ForumORM.trail_id)
             .filter(ForumORM.id == forum_id)
             .first()
         )
         if not row:
             return None
-        forum, trail_name, topics_count, posts_count, last_activity = row
-        return ForumStats(
-            forum=forum,
-            trail_name=trail_name,
-            topics_count=topics_count or 0,
-            posts_count=posts_count or 0,
-            last_activity_at=last_activity or forum.updated_at,
-        )
+        forum, trail_name = row
+        return self._forum_stats(forum, trail_name)
 
     def list_topics(
-        self, forum_id: int, *, offset: int, limit: int
-    ) -> Tuple[List[TopicStats], int]:
-        posts_count_sq = (
-            self.db.query(func.count(ForumPostORM.id))
-            .filter(ForumPostORM.topic_id == ForumTopicORM.id)
-            .correlate(ForumTopicORM)
-            .scalar_subquery()
-        )
-        last_post_sq = (
-            self.db.query(func.max(ForumPostORM.created_at))
-            .filter(ForumPostORM.topic_id == ForumTopicORM.id)
-            .correlate(ForumTopicORM)
-            .scalar_subquery()
-        )
-
+        self,
+        forum_id: int,
+        *,
+        limit: int,
+        offset: int = 0,
+        after: Optional[PageKey] = None,
+    ) -> TopicsPage:
         query = (
-            self.db.query(
-                ForumTopicORM,
-                UserORM,
-                posts_count_sq.label("posts_count"),
-                last_post_sq.label("last_post_at"),
-            )
+            self.db.query(ForumTopicORM, UserORM)
             .outerjoin(UserORM, UserORM.user_id == ForumTopicORM.created_by_id)
             .filter(ForumTopicORM.forum_id == forum_id)
         )
-
-        total = query.count()
-        order_clause = func.coalesce(last_post_sq, ForumTopicORM.updated_at).desc()
-        rows = (
-            query.order_by(order_clause, ForumTopicORM.created_at.desc())
-            .offset(offset)
-            .limit(limit)
-            .all()
-        )
-
-        payload = [
-            TopicStats(
-                topic=row[0],
-                author=row[1],
-                posts_count=row[2] or 0,
-                last_post_at=row[3] or row[0].updated_at,
+        if after is not None:
+            last_post_at, last_id = after
+            query = query.filter(
+                or_(
+                    ForumTopicORM.last_post_at < last_post_at,
+                    and_(
+                        ForumTopicORM.last_post_at == last_post_at,
+                        ForumTopicORM.id < last_id,
+                    ),
+                )
             )
-            for row in rows
-        ]
-        return payload, total
+        query = query.order_by(
+            ForumTopicORM.last_post_at.desc(), ForumTopicORM.id.desc()
+        )
+        if after is None and offset:
+            query = query.offset(offset)
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_key = (
+            (rows[-1][0].last_post_at, rows[-1][0].id) if has_more and rows else None
+        )
+        return TopicsPage(
+            topics=[self._topic_stats(topic, author) for topic, author in rows],
+            next_key=next_key,
+        )
 
     def get_topic_with_forum(
         self, topic_id: int
@@ -241,52 +203,50 @@ class ForumsRepository:
         return topic_row, forum_stats
 
     def get_topic_stats(self, topic_id: int) -> Optional[TopicStats]:
-        posts_count_sq = (
-            self.db.query(func.count(ForumPostORM.id))
-            .filter(ForumPostORM.topic_id == topic_id)
-            .scalar_subquery()
-        )
-        last_post_sq = (
-            self.db.query(func.max(ForumPostORM.created_at))
-            .filter(ForumPostORM.topic_id == topic_id)
-            .scalar_subquery()
-        )
-
         row = (
-            self.db.query(
-                ForumTopicORM,
-                UserORM,
-                posts_count_sq.label("posts_count"),
-                last_post_sq.label("last_post_at"),
-            )
+            self.db.query(ForumTopicORM, UserORM)
             .outerjoin(UserORM, UserORM.user_id == ForumTopicORM.created_by_id)
             .filter(ForumTopicORM.id == topic_id)
             .first()
         )
         if not row:
             return None
-        topic, author, posts_count, last_post_at = row
-        return TopicStats(
-            topic=topic,
-            author=author,
-            posts_count=posts_count or 0,
-            last_post_at=last_post_at or topic.updated_at,
-        )
+        topic, author = row
+        return self._topic_stats(topic, author)
 
     def list_posts(
-        self, topic_id: int, *, offset: int, limit: int
-    ) -> Tuple[List[PostWithAuthor], int]:
+        self,
+        topic_id: int,
+        *,
+        limit: int,
+        offset: int = 0,
+        after: Optional[PageKey] = None,
+    ) -> PostsPage:
         query = (
             self.db.query(ForumPostORM, UserORM)
             .outerjoin(UserORM, UserORM.user_id == ForumPostORM.author_id)
             .filter(ForumPostORM.topic_id == topic_id)
         )
-        total = query.count()
-        rows = (
-            query.order_by(ForumPostORM.created_at.asc(), ForumPostORM.id.asc())
-            .offset(offset)
-            .limit(limit)
-            .all()
+        if after is not None:
+            created_at, last_id = after
+            query = query.filter(
+                or_(
+                    ForumPostORM.created_at > created_at,
+                    and_(
+                        ForumPostORM.created_at == created_at,
+                        ForumPostORM.id > last_id,
+                    ),
+                )
+            )
+        query = query.order_by(ForumPostORM.created_at.asc(), ForumPostORM.id.asc())
+        if after is None and offset:
+            query = query.offset(offset)
+
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_key = (
+            (rows[-1][0].created_at, rows[-1][0].id) if has_more and rows else None
         )
 
         by_id: Dict[int, PostWithAuthor] = {}
@@ -304,16 +264,19 @@ class ForumsRepository:
             else:
                 roots.append(node)
 
-        return roots, total
+        return PostsPage(posts=roots, next_key=next_key)
 
     # --- mutations --------------------------------------------------------
     def create_topic(
         self, *, forum_id: int, title: str, content: str, author_id: Optional[int]
     ) -> ForumTopicORM:
+        now_expr = func.now()
         topic = ForumTopicORM(
             forum_id=forum_id,
             title=title,
             created_by_id=author_id,
+            posts_count=1,
+            last_post_at=now_expr,
         )
         self.db.add(topic)
         self.db.flush()
@@ -326,10 +289,15 @@ class ForumsRepository:
         self.db.add(post)
         self.db.flush()
 
-        now_expr = func.now()
         topic.updated_at = now_expr
         self.db.query(ForumORM).filter(ForumORM.id == forum_id).update(
-            {ForumORM.updated_at: now_expr}, synchronize_session=False
+            {
+                ForumORM.topics_count: ForumORM.topics_count + 1,
+                ForumORM.posts_count: ForumORM.posts_count + 1,
+                ForumORM.last_activity_at: now_expr,
+                ForumORM.updated_at: now_expr,
+            },
+            synchronize_session="fetch",
         )
         return topic
 
@@ -368,10 +336,73 @@ class ForumsRepository:
             .scalar()
         )
         self.db.query(ForumTopicORM).filter(ForumTopicORM.id == topic_id).update(
-            {ForumTopicORM.updated_at: now_expr}, synchronize_session=False
+            {
+                ForumTopicORM.posts_count: ForumTopicORM.posts_count + 1,
+                ForumTopicORM.last_post_at: now_expr,
+                ForumTopicORM.updated_at: now_expr,
+            },
+            synchronize_session="fetch",
         )
         if forum_id:
             self.db.query(ForumORM).filter(ForumORM.id == forum_id).update(
-                {ForumORM.updated_at: now_expr}, synchronize_session=False
+                {
+                    ForumORM.posts_count: ForumORM.posts_count + 1,
+                    ForumORM.last_activity_at: now_expr,
+                    ForumORM.updated_at: now_expr,
+                },
+                synchronize_session="fetch",
             )
         return post
+
+    # --- maintenance ------------------------------------------------------
+    def rebuild_counters(self) -> Tuple[int, int]:
+        """Recompute the denormalised counters from forum_posts/forum_topics."""
+
+        topic_posts = (
+            select(func.count(ForumPostORM.id))
+            .where(ForumPostORM.topic_id == ForumTopicORM.id)
+            .scalar_subquery()
+        )
+        topic_last_post = (
+            select(func.max(ForumPostORM.created_at))
+            .where(ForumPostORM.topic_id == ForumTopicORM.id)
+            .scalar_subquery()
+        )
+        topics_updated = self.db.execute(
+            update(ForumTopicORM)
+            .values(
+                posts_count=topic_posts,
+                last_post_at=func.coalesce(topic_last_post, ForumTopicORM.created_at),
+                # Keep onupdate=now() from touching updated_at during repairs.
+                updated_at=ForumTopicORM.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        forum_topics = (
+            select(func.count(ForumTopicORM.id))
+            .where(ForumTopicORM.forum_id == ForumORM.id)
+            .scalar_subquery()
+        )
+        forum_posts = (
+            select(func.coalesce(func.sum(ForumTopicORM.posts_count), 0))
+            .where(ForumTopicORM.forum_id == ForumORM.id)
+            .scalar_subquery()
+        )
+        forum_last_activity = (
+            select(func.max(ForumTopicORM.last_post_at))
+            .where(ForumTopicORM.forum_id == ForumORM.id)
+            .scalar_subquery()
+        )
+        forums_updated = self.db.execute(
+            update(ForumORM)
+            .values(
+                topics_count=forum_topics,
+                posts_count=forum_posts,
+                last_activity_at=forum_last_activity,
+                updated_at=ForumORM.updated_at,
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.expire_all()
+        return forums_updated, topics_updated
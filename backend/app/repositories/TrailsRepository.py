@@ -1,6 +1,8 @@
+from dataclasses import dataclass
 from datetime import date
 from decimal import Decimal
 from typing import List, Tuple
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session, joinedload, selectinload
 
 from app.models.trails import Trails as TrailsORM
@@ -8,6 +10,7 @@ from app.models.trail_sections import TrailSections as TrailSectionsORM
 from app.models.trail_items import TrailItems as TrailItemsORM
 from app.models.trail_included_items import TrailIncludedItems as TrailIncludedItemsORM
 from app.models.trail_requirements import TrailRequirements as TrailRequirementsORM
+from app.models.user_trails import UserTrails as UserTrailsORM
 from app.models.trail_target_audience import (
     TrailTargetAudience as TrailTargetAudienceORM,
 )
@@ -18,7 +21,52 @@ from app.models.form_question_options import (
 )
 from app.models.lk_item_type import LkItemType as LkItemTypeORM
 from app.models.lk_question_type import LkQuestionType as LkQuestionTypeORM
-from app.services.media import build_media_url, cache_document
+from app.core.settings import settings
+from app.repositories.CertificatesRepository import CertificatesRepository
+from app.services.certificate_cache import invalidate_certificates
+from app.services.form_answer_keys import invalidate_form_answer_keys
+from app.services.lookups import ITEM_TYPE, QUESTION_TYPE, lookups
+from app.services.media import build_media_url, cache_documents
+from app.services.trail_diff import New, Node, ParentRef, TreeDiff, diff_trees
+from app.services.trail_outline import invalidate_trail_outline
+
+
+@dataclass
+class _DocumentFetch:
+    item_id: int | None
+    url: str
+    title_hint: str
+
+
+# Columns compared by the builder diff, per table (parents first).
+_TREE_COLUMNS = {
+    TrailSectionsORM: ("title", "order_index"),
+    TrailItemsORM: (
+        "title",
+        "url",
+        "duration_seconds",
+        "order_index",
+        "item_type_id",
+        "legacy_type",
+        "requires_completion",
+    ),
+    FormORM: ("title", "description", "min_score_to_pass", "randomize_questions"),
+    FormQuestionORM: (
+        "prompt",
+        "question_type_id",
+        "required",
+        "order_index",
+        "points",
+    ),
+    FormQuestionOptionORM: ("option_text", "is_correct", "order_index"),
+}
+_TREE_LEVELS = (
+    (TrailSectionsORM, None),
+    (TrailItemsORM, "section_id"),
+    (FormORM, "trail_item_id"),
+    (FormQuestionORM, "form_id"),
+    (FormQuestionOptionORM, "question_id"),
+)
 
 
 class TrailsRepository:
@@ -26,29 +74,39 @@ class TrailsRepository:
         self.db = db
 
     def _build_type_maps(self) -> tuple[dict[str, int], dict[str, int]]:
-        item_type_map = {row.code.upper(): row.id for row in self.list_item_types()}
+        item_type_map = {
+            code.upper(): type_id
+            for code, type_id in lookups.ids(self.db, ITEM_TYPE).items()
+        }
         question_type_map = {
-            row.code.upper(): row.id for row in self.list_question_types()
+            code.upper(): type_id
+            for code, type_id in lookups.ids(self.db, QUESTION_TYPE).items()
         }
         return item_type_map, question_type_map
 
-    def _persist_sections(
+    def _plan_sections(
         self,
-        *,
-        trail_id: int,
         sections: list[dict],
+        *,
         item_type_map: dict[str, int],
         question_type_map: dict[str, int],
-    ) -> None:
+    ) -> tuple[list[Node], list[_DocumentFetch]]:
+        """Validate the builder payload and turn it into a row tree, without touching the DB."""
+
+        plan: list[Node] = []
+        documents: list[_DocumentFetch] = []
         for index, section_payload in enumerate(sections):
             section_order = section_payload.get("order_index")
-            section = TrailSectionsORM(
-                trail_id=trail_id,
-                title=section_payload["title"],
-                order_index=section_order if section_order is not None else index,
+            section = Node(
+                id=section_payload.get("id"),
+                row={
+                    "title": section_payload["title"],
+                    "order_index": (
+                        section_order if section_order is not None else index
+                    ),
+                },
             )
-            self.db.add(section)
-            self.db.flush()
+            plan.append(section)
 
             items_payload = section_payload.get("items") or []
             for item_index, item_payload in enumerate(items_payload):
@@ -63,102 +121,232 @@ class TrailsRepository:
                 url_value = (item_payload.get("url") or "").strip()
                 if type_code == "DOC":
                     if not url_value:
-                        raise ValueError("Itens do tipo Documento precisam de um conteúdo/URL.")
-                    try:
-                        cache_document(
-                            url_value,
-                            subdir=f"documents/trail_{trail_id}",
-                            filename_hint=f"section_{index + 1}_item_{item_index + 1}",
-                        )
-                    except ValueError as exc:
-                        title_hint = (item_payload.get("title") or "").strip() or f"Item {item_index + 1}"
                         raise ValueError(
-                            f"Não foi possível salvar o documento do item '{title_hint}': {exc}"
-                        ) from exc
-                item = TrailItemsORM(
-                    trail_id=trail_id,
-                    section_id=section.id,
-                    title=item_payload.get("title"),
-                    url=url_value,
-                    duration_seconds=duration_value,
-                    order_index=item_order if item_order is not None else item_index,
-                    item_type_id=item_type_map[type_code],
-                    legacy_type=type_code,
-                    requires_completion=bool(item_payload.get("requires_completion")),
+                            "Itens do tipo Documento precisam de um conteúdo/URL."
+                        )
+                    documents.append(
+                        _DocumentFetch(
+                            item_id=item_payload.get("id"),
+                            url=url_value,
+                            title_hint=(item_payload.get("title") or "").strip()
+                            or f"Item {item_index + 1}",
+                        )
+                    )
+                item = Node(
+                    id=item_payload.get("id"),
+                    row={
+                        "title": item_payload.get("title"),
+                        "url": url_value,
+                        "duration_seconds": duration_value,
+                        "order_index": (
+                            item_order if item_order is not None else item_index
+                        ),
+                        "item_type_id": item_type_map[type_code],
+                        "legacy_type": type_code,
+                        "requires_completion": bool(
+                            item_payload.get("requires_completion")
+                        ),
+                    },
                 )
-                self.db.add(item)
-                self.db.flush()
+                section.children.append(item)
 
                 if type_code == "FORM":
-                    form_payload = item_payload.get("form") or {}
-                    if not form_payload:
-                        raise ValueError(
-                            "Itens do tipo formulário precisam de dados do formulário."
+                    item.children.append(
+                        self._plan_form(
+                            item_payload.get("form") or {},
+                            question_type_map=question_type_map,
                         )
-                    min_score_raw = form_payload.get("min_score_to_pass")
-                    min_score_value = Decimal(str(min_score_raw or 70))
-                    randomize_value = form_payload.get("randomize_questions")
-
-                    form = FormORM(
-                        trail_item_id=item.id,
-                        title=form_payload.get("title"),
-                        description=form_payload.get("description"),
-                        min_score_to_pass=min_score_value,
-                        randomize_questions=(
-                            bool(randomize_value)
-                            if randomize_value is not None
-                            else None
-                        ),
                     )
-                    self.db.add(form)
-                    self.db.flush()
-
-                    questions_payload = form_payload.get("questions") or []
-                    if not questions_payload:
-                        raise ValueError(
-                            "Formulários precisam de pelo menos uma pergunta."
-                        )
-                    for question_index, question_payload in enumerate(
-                        questions_payload
-                    ):
-                        question_type_code = (
-                            question_payload.get("type") or ""
-                        ).upper()
-                        question_type_id = question_type_map.get(question_type_code)
-                        if question_type_id is None:
-                            raise ValueError(
-                                f"Tipo de questão '{question_type_code}' não cadastrado."
-                            )
-                        points_raw = question_payload.get("points")
-                        points_value = Decimal(str(points_raw or 0))
-                        question = FormQuestionORM(
-                            form_id=form.id,
-                            prompt=question_payload.get("prompt"),
-                            question_type_id=question_type_id,
-                            required=question_payload.get("required"),
-                            order_index=question_payload.get(
-                                "order_index", question_index
-                            ),
-                            points=points_value,
-                        )
-                        self.db.add(question)
-                        self.db.flush()
+        return plan, documents
+
+    def _plan_form(
+        self, form_payload: dict, *, question_type_map: dict[str, int]
+    ) -> Node:
+        if not form_payload:
+            raise ValueError(
+                "Itens do tipo formulário precisam de dados do formulário."
+            )
+        min_score_raw = form_payload.get("min_score_to_pass")
+        randomize_value = form_payload.get("randomize_questions")
+        form = Node(
+            id=form_payload.get("id"),
+            row={
+                "title": form_payload.get("title") or None,
+                "description": form_payload.get("description") or None,
+                "min_score_to_pass": Decimal(str(min_score_raw or 70)),
+                "randomize_questions": (
+                    bool(randomize_value) if randomize_value is not None else None
+                ),
+            },
+        )
 
-                        options_payload = question_payload.get("options") or []
-                        if question_type_code != "ESSAY" and not options_payload:
-                            raise ValueError(
-                                "Questões objetivas precisam de alternativas cadastradas."
-                            )
-                        for option_index, option_payload in enumerate(options_payload):
-                            option = FormQuestionOptionORM(
-                                question_id=question.id,
-                                option_text=option_payload.get("text"),
-                                is_correct=bool(option_payload.get("is_correct")),
-                                order_index=option_payload.get(
+        questions_payload = form_payload.get("questions") or []
+        if not questions_payload:
+            raise ValueError("Formulários precisam de pelo menos uma pergunta.")
+        for question_index, question_payload in enumerate(questions_payload):
+            question_type_code = (question_payload.get("type") or "").upper()
+            question_type_id = question_type_map.get(question_type_code)
+            if question_type_id is None:
+                raise ValueError(
+                    f"Tipo de questão '{question_type_code}' não cadastrado."
+                )
+            points_raw = question_payload.get("points")
+            options_payload = question_payload.get("options") or []
+            if question_type_code != "ESSAY" and not options_payload:
+                raise ValueError(
+                    "Questões objetivas precisam de alternativas cadastradas."
+                )
+            form.children.append(
+                Node(
+                    id=question_payload.get("id"),
+                    row={
+                        "prompt": question_payload.get("prompt"),
+                        "question_type_id": question_type_id,
+                        "required": question_payload.get("required"),
+                        "order_index": question_payload.get(
+                            "order_index", question_index
+                        ),
+                        "points": Decimal(str(points_raw or 0)),
+                    },
+                    children=[
+                        Node(
+                            id=option_payload.get("id"),
+                            row={
+                                "option_text": option_payload.get("text"),
+                                "is_correct": bool(option_payload.get("is_correct")),
+                                "order_index": option_payload.get(
                                     "order_index", option_index
                                 ),
-                            )
-                            self.db.add(option)
+                            },
+                        )
+                        for option_index, option_payload in enumerate(options_payload)
+                    ],
+                )
+            )
+        return form
+
+    def _prefetch_documents(self, documents: list[_DocumentFetch]) -> None:
+        """Cache every DOC item in parallel before the write transaction starts.
+
+        The session's read transaction (lookups, the admin loaded by the route)
+        is ended first when nothing is pending, so downloads of up to 20 MB per
+        document do not keep a pooled connection checked out.
+        """
+
+        if not documents:
+            return
+        if self.db.in_transaction() and not (
+            self.db.new or self.db.dirty or self.db.deleted
+        ):
+            self.db.commit()
+
+        results = cache_documents(
+            [document.url for document in documents],
+            max_workers=settings.trail_builder_download_workers,
+        )
+        for document in documents:
+            outcome = results[document.url]
+            if isinstance(outcome, ValueError):
+                raise ValueError(
+                    f"Não foi possível salvar o documento do item '{document.title_hint}': {outcome}"
+                ) from outcome
+
+    def _load_tree(self, trail_id: int) -> list[Node]:
+        """Stored sections/items/forms/questions/options as rows comparable to a plan."""
+
+        def rows(model, parent_column, parent_ids) -> list:
+            if not parent_ids:
+                return []
+            columns = [getattr(model, name) for name in _TREE_COLUMNS[model]]
+            return (
+                self.db.query(model.id, parent_column, *columns)
+                .filter(parent_column.in_(parent_ids))
+                .all()
+            )
+
+        def attach(parents: dict[int, Node], model, parent_column) -> dict[int, Node]:
+            nodes: dict[int, Node] = {}
+            for row in rows(model, parent_column, list(parents)):
+                node = Node(id=row[0], row=dict(zip(_TREE_COLUMNS[model], row[2:])))
+                parents[row[1]].children.append(node)
+                nodes[node.id] = node
+            return nodes
+
+        sections = {
+            row[0]: Node(
+                id=row[0], row=dict(zip(_TREE_COLUMNS[TrailSectionsORM], row[2:]))
+            )
+            for row in rows(TrailSectionsORM, TrailSectionsORM.trail_id, [trail_id])
+        }
+        items = attach(sections, TrailItemsORM, TrailItemsORM.section_id)
+        forms = attach(items, FormORM, FormORM.trail_item_id)
+        questions = attach(forms, FormQuestionORM, FormQuestionORM.form_id)
+        attach(questions, FormQuestionOptionORM, FormQuestionOptionORM.question_id)
+        return list(sections.values())
+
+    def _insert_ids(self, model, rows: list[dict]) -> list[int]:
+        if not rows:
+            return []
+        result = self.db.execute(
+            insert(model).returning(model.id, sort_by_parameter_order=True), rows
+        )
+        return list(result.scalars())
+
+    def _apply_diff(self, trail_id: int, diff: TreeDiff) -> None:
+        """Write a tree diff: one INSERT ... RETURNING per table, then updates, then deletes."""
+
+        def resolve(parent: ParentRef, inserted: list[int]) -> int:
+            return inserted[parent.index] if isinstance(parent, New) else parent
+
+        inserted: list[list[int]] = []
+        for level, (model, parent_column) in zip(diff.levels, _TREE_LEVELS):
+            rows = []
+            for pending in level.inserts:
+                row = dict(pending.row)
+                if parent_column is not None:
+                    row[parent_column] = resolve(pending.parent, inserted[-1])
+                if model in (TrailSectionsORM, TrailItemsORM):
+                    row["trail_id"] = trail_id
+                rows.append(row)
+            inserted.append(self._insert_ids(model, rows))
+
+        for depth, (level, (model, parent_column)) in enumerate(
+            zip(diff.levels, _TREE_LEVELS)
+        ):
+            rows = []
+            for change in level.updates:
+                row = {"id": change.id, **change.values}
+                if change.parent is not None:
+                    row[parent_column] = resolve(change.parent, inserted[depth - 1])
+                rows.append(row)
+            if rows:
+                self.db.execute(update(model), rows)
+
+        # Children first, so nothing relies on ON DELETE behaviour.
+        for level, (model, _parent_column) in reversed(
+            list(zip(diff.levels, _TREE_LEVELS))
+        ):
+            if level.deletes:
+                self.db.execute(
+                    delete(model)
+                    .where(model.id.in_(level.deletes))
+                    .execution_options(synchronize_session=False)
+                )
+
+        items = diff["items"]
+        if items.inserts or items.deletes:
+            # Incremental done_items counters only hold for the item set they
+            # were counted against; NULL sends the next progress write for
+            # these enrollments down the full-sync path.
+            self.db.execute(
+                update(UserTrailsORM)
+                .where(
+                    UserTrailsORM.trail_id == trail_id,
+                    UserTrailsORM.done_items.isnot(None),
+                )
+                .values(done_items=None)
+                .execution_options(synchronize_session=False)
+            )
 
     def list_showcase(self, limit: int = 6) -> List[TrailsORM]:
         return (
@@ -272,18 +460,21 @@ class TrailsRepository:
             created_by=created_by,
             created_date=date.today(),
         )
-        self.db.add(trail)
-        self.db.flush()
-
         item_type_map, question_type_map = self._build_type_maps()
-        self._persist_sections(
-            trail_id=trail.id,
-            sections=sections,
+        plan, documents = self._plan_sections(
+            sections,
             item_type_map=item_type_map,
             question_type_map=question_type_map,
         )
+        self._prefetch_documents(documents)
+
+        self.db.add(trail)
+        self.db.flush()
+        self._apply_diff(trail.id, diff_trees([], plan))
 
         self.db.commit()
+        invalidate_trail_outline(trail.id)
+        invalidate_form_answer_keys(trail.id)
         self.db.refresh(trail)
         return trail
 
@@ -297,37 +488,56 @@ class TrailsRepository:
         author: str | None,
         sections: list[dict],
     ) -> tuple[TrailsORM, str | None]:
-        trail = (
-            self.db.query(TrailsORM)
-            .options(selectinload(TrailsORM.sections))
-            .filter(TrailsORM.id == trail_id)
-            .first()
+        item_type_map, question_type_map = self._build_type_maps()
+        plan, documents = self._plan_sections(
+            sections,
+            item_type_map=item_type_map,
+            question_type_map=question_type_map,
+        )
+        # Only documents that are new or whose URL changed are fetched again.
+        stored_urls = dict(
+            self.db.query(TrailItemsORM.id, TrailItemsORM.url).filter(
+                TrailItemsORM.trail_id == trail_id,
+                TrailItemsORM.legacy_type == "DOC",
+            )
+        )
+        self._prefetch_documents(
+            [
+                document
+                for document in documents
+                if stored_urls.get(document.item_id) != document.url
+            ]
         )
+
+        trail = self.db.query(TrailsORM).filter(TrailsORM.id == trail_id).first()
         if not trail:
             raise LookupError("Trail not found")
 
         previous_path = trail.thumbnail_path
+        renamed = trail.name != name
         trail.name = name
         trail.thumbnail_path = thumbnail_path
         trail.description = description
         trail.author = author
 
-        for section in list(trail.sections):
-            self.db.delete(section)
-        self.db.flush()
-
-        item_type_map, question_type_map = self._build_type_maps()
-        self._persist_sections(
-            trail_id=trail.id,
-            sections=sections,
-            item_type_map=item_type_map,
-            question_type_map=question_type_map,
-        )
+        diff = diff_trees(self._load_tree(trail.id), plan)
+        if diff:
+            # Tells every worker its cached answer keys are out of date.
+            trail.content_version = TrailsORM.content_version + 1
+        self._apply_diff(trail.id, diff)
 
         self.db.commit()
+        invalidate_trail_outline(trail.id)
+        invalidate_form_answer_keys(trail.id)
+        if renamed:
+            invalidate_certificates(
+                CertificatesRepository(self.db).hashes_for_trail(trail.id)
+            )
         self.db.refresh(trail)
         removed_path = (
-            previous_path if previous_path and previous_path != trail.thumbnail_path else None
+            previous_path
+            if previous_path and previous_path != trail.thumbnail_path
+            else None
         )
         return trail, removed_path
 
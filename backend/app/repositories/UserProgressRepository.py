@@ -1,35 +1,42 @@
+from collections import defaultdict
+from datetime import datetime, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import Optional
+from sqlalchemy import case, func, text
+from typing import Dict, Iterable, Optional, Set
 
-from app.models.lk_progress_status import LkProgressStatus
-from app.models.lk_progress_status import LkProgressStatus as LkProgressStatusORM
 from app.models.trail_items import TrailItems as TrailItemsORM
 from app.models.user_item_progress import UserItemProgress as UserItemProgressORM
 from app.repositories.UserTrailsRepository import UserTrailsRepository
+from app.core.settings import settings
+from app.services.lookups import PROGRESS_STATUS, lookups
+from app.services.progress_buffer import ProgressEvent, coalesce
 
 
 class UserProgressRepository:
-    _STATUS_ID_CACHE: dict[str, int] = {}
-
     def __init__(self, db: Session):
         self.db = db
 
     def _status_id(self, code: str) -> int:
-        cached = self._STATUS_ID_CACHE.get(code)
-        if cached is not None:
-            return cached
-
-        status_id = (
-            self.db.query(LkProgressStatus.id)
-            .filter(LkProgressStatusORM.code == code)
-            .scalar()
-        )
+        status_id = lookups.id_for(self.db, PROGRESS_STATUS, code)
         if status_id is None:
             raise LookupError(f"Progress status '{code}' not found.")
-        self._STATUS_ID_CACHE[code] = status_id
         return status_id
 
+    def _aggregate(
+        self, user_id: int, trail_ids: Iterable[int], completed: Dict[int, int]
+    ) -> None:
+        """Bring enrollments up to date after item writes.
+
+        ``completed`` counts the items per trail that just became COMPLETED; it
+        is all the incremental mode needs, while the sync mode recounts.
+        """
+
+        repo = UserTrailsRepository(self.db)
+        if settings.progress_aggregation_mode == "incremental":
+            repo.apply_completion_deltas(user_id, completed)
+        else:
+            repo.sync_progress_for_trails(user_id, trail_ids)
+
     def upsert_item_progress(
         self,
         user_id: int,
@@ -39,10 +46,13 @@ class UserProgressRepository:
         *,
         trail_id: int | None = None,
         last_passed_submission_id: Optional[int] = None,
+        commit: bool = True,
     ):
         status_id = self._status_id(status_code)
         completed_status_id = self._status_id("COMPLETED")
-        sanitized_progress = max(0, progress_value) if progress_value is not None else None
+        sanitized_progress = (
+            max(0, progress_value) if progress_value is not None else None
+        )
 
         now_sql = text("SELECT now(), now()")
         now_result = self.db.execute(now_sql).one()
@@ -89,7 +99,7 @@ class UserProgressRepository:
                 END
             WHERE user_item_progress.user_id = :user_id
               AND user_item_progress.trail_item_id = :trail_item_id
-            RETURNING id
+            RETURNING id, completed_at
             """
         )
 
@@ -108,10 +118,9 @@ class UserProgressRepository:
             "current_now_utc": current_now_utc,
         }
 
-        result = self.db.execute(update_sql, update_params)
-        uip_id = result.scalar_one_or_none()
+        returned = self.db.execute(update_sql, update_params).first()
 
-        if uip_id is None:
+        if returned is None:
             insert_sql = text(
                 """
                 INSERT INTO user_item_progress (
@@ -137,7 +146,7 @@ class UserProgressRepository:
                     :insert_last_passed_submission_id
                 )
                 ON CONFLICT (user_id, trail_item_id) DO NOTHING
-                RETURNING id
+                RETURNING id, completed_at
                 """
             )
 
@@ -154,13 +163,17 @@ class UserProgressRepository:
                 "current_now_utc": current_now_utc,
             }
 
-            insert_result = self.db.execute(insert_sql, insert_params)
-            uip_id = insert_result.scalar_one_or_none()
+            returned = self.db.execute(insert_sql, insert_params).first()
 
-            if uip_id is None:
-                result = self.db.execute(update_sql, update_params)
-                uip_id = result.scalar_one()
+            if returned is None:
+                returned = self.db.execute(update_sql, update_params).one()
 
+        uip_id, completed_at = returned
+        # completed_at only takes this statement's timestamp on the transition
+        # into COMPLETED; later writes keep the original value.
+        newly_completed = (
+            status_id == completed_status_id and completed_at == current_now
+        )
         uip = self.db.get(UserItemProgressORM, uip_id)
 
         resolved_trail_id = trail_id
@@ -171,7 +184,119 @@ class UserProgressRepository:
                 .scalar()
             )
         if resolved_trail_id is not None:
-            UserTrailsRepository(self.db).sync_user_trail_progress(user_id, resolved_trail_id)
+            self._aggregate(
+                user_id,
+                [resolved_trail_id],
+                {resolved_trail_id: 1} if newly_completed else {},
+            )
 
-        self.db.commit()
+        if commit:
+            self.db.commit()
         return uip
+
+    def upsert_progress_batch(
+        self, events: Iterable[ProgressEvent], *, commit: bool = True
+    ) -> int:
+        """Apply many progress events with a single multi-row upsert.
+
+        Same rules as ``upsert_item_progress`` (COMPLETED is sticky, progress
+        only grows), but events are first collapsed per ``(user, item)`` and
+        trail progress is updated once per user over every affected trail.
+        Returns the number of rows written.
+        """
+
+        merged = coalesce(events)
+        if not merged:
+            return 0
+
+        completed_status_id = self._status_id("COMPLETED")
+        status_ids = {
+            code: self._status_id(code) for code in {e.status for e in merged}
+        }
+        now = datetime.now(timezone.utc)
+        now_utc = now.replace(tzinfo=None)
+        rows = []
+        for event in merged:
+            done = event.status == "COMPLETED"
+            rows.append(
+                {
+                    "user_id": event.user_id,
+                    "trail_item_id": event.item_id,
+                    "status_id": status_ids[event.status],
+                    "progress_value": (
+                        max(0, event.progress_value)
+                        if event.progress_value is not None
+                        else None
+                    ),
+                    "last_interaction": now,
+                    "last_interaction_utc": now_utc,
+                    "completed_at": now if done else None,
+                    "completed_at_utc": now_utc if done else None,
+                }
+            )
+
+        table = UserItemProgressORM.__table__
+        if self.db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert_insert
+
+            greatest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert_insert
+
+            greatest = func.max  # scalar max() with two arguments
+
+        stmt = upsert_insert(table).values(rows)
+        excluded = stmt.excluded
+        was_completed = table.c.status_id == completed_status_id
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.trail_item_id],
+            set_={
+                "status_id": case(
+                    (was_completed, table.c.status_id), else_=excluded.status_id
+                ),
+                "progress_value": case(
+                    (excluded.progress_value.is_(None), table.c.progress_value),
+                    else_=greatest(
+                        func.coalesce(table.c.progress_value, 0),
+                        excluded.progress_value,
+                    ),
+                ),
+                "last_interaction": excluded.last_interaction,
+                "last_interaction_utc": excluded.last_interaction_utc,
+                "completed_at": case(
+                    (was_completed, table.c.completed_at),
+                    else_=excluded.completed_at,
+                ),
+                "completed_at_utc": case(
+                    (was_completed, table.c.completed_at_utc),
+                    else_=excluded.completed_at_utc,
+                ),
+            },
+        )
+        # As in upsert_item_progress, only rows entering COMPLETED carry this
+        # call's timestamp.
+        written = self.db.execute(
+            stmt.returning(
+                table.c.user_id, table.c.trail_item_id, table.c.completed_at_utc
+            )
+        ).all()
+        newly_completed = {
+            (user_id, item_id)
+            for user_id, item_id, completed_at_utc in written
+            if completed_at_utc == now_utc
+        }
+
+        trails_by_user: Dict[int, Set[int]] = defaultdict(set)
+        completed_by_user: Dict[int, Dict[int, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        for event in merged:
+            trails_by_user[event.user_id].add(event.trail_id)
+            if (event.user_id, event.item_id) in newly_completed:
+                completed_by_user[event.user_id][event.trail_id] += 1
+        for user_id, trail_ids in trails_by_user.items():
+            self._aggregate(user_id, trail_ids, completed_by_user.get(user_id, {}))
+
+        if commit:
+            self.db.commit()
+        return len(rows)
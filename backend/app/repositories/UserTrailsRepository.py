@@ -1,37 +1,46 @@
-from typing import Optional, Dict, Any, List, Iterable
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func, case
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import Numeric, func, case, cast, false, literal, update
 
 from app.models.user_trails import UserTrails as UserTrailsORM
 from app.models.user_item_progress import UserItemProgress as UserItemProgressORM
 from app.models.trail_items import TrailItems as TrailItemsORM
 from app.models.trail_sections import TrailSections as TrailSectionsORM
-from app.models.lk_progress_status import LkProgressStatus as LkProgressStatusORM
-from app.models.lk_enrollment_status import LkEnrollmentStatus as LkEnrollmentStatusORM
 from app.models.trails import Trails as TrailsORM
 
+from app.core.settings import settings
+from app.services.image_derivatives import image_variants
+from app.services.lookups import ENROLLMENT_STATUS, PROGRESS_STATUS, lookups
 from app.services.media import build_media_url
+from app.services.trail_outline import get_trail_outline
 from app.services.security import get_current_user_id
 from app.repositories.CertificatesRepository import CertificatesRepository
 
 
+def progress_percent_expr(done, total: int):
+    """SQL for ``round(100 * done / total, 2)``.
+
+    ``round(x, n)`` only exists for numeric on PostgreSQL, while the float
+    literal makes ``x`` double precision, hence the cast.
+    """
+
+    if total <= 0:
+        return literal(0)
+    return func.round(cast(100.0 * done / total, Numeric), 2)
+
+
 class UserTrailsRepository:
     def __init__(self, db: Session):
         self.db = db
 
     def _progress_status_id(self, code: str) -> Optional[int]:
-        return (
-            self.db.query(LkProgressStatusORM.id)
-            .filter(LkProgressStatusORM.code == code)
-            .scalar()
-        )
+        return lookups.id_for(self.db, PROGRESS_STATUS, code)
 
     def _enrollment_status_id(self, code: str) -> Optional[int]:
-        return (
-            self.db.query(LkEnrollmentStatusORM.id)
-            .filter(LkEnrollmentStatusORM.code == code)
-            .scalar()
-        )
+        return lookups.id_for(self.db, ENROLLMENT_STATUS, code)
+
+    def _enrollment_status_code(self, status_id: Optional[int]) -> Optional[str]:
+        return lookups.code_for(self.db, ENROLLMENT_STATUS, status_id)
 
     def count_items_in_trail(self, trail_id: int) -> int:
         return (
@@ -81,107 +90,161 @@ class UserTrailsRepository:
             created = True
         return ut, created
 
-    def _done_items(self, user_id: int, trail_id: int) -> int:
-        return (
-            self.db.query(func.count(UserItemProgressORM.id))
-            .join(TrailItemsORM, TrailItemsORM.id == UserItemProgressORM.trail_item_id)
-            .join(
-                LkProgressStatusORM,
-                LkProgressStatusORM.id == UserItemProgressORM.status_id,
-            )
-            .filter(
-                UserItemProgressORM.user_id == user_id,
-                TrailItemsORM.trail_id == trail_id,
-                LkProgressStatusORM.code == "COMPLETED",
-            )
-            .scalar()
-            or 0
-        )
-
     def sync_user_trail_progress(self, user_id: int, trail_id: int):
-        ut = (
-            self.db.query(UserTrailsORM)
-            .filter(
-                UserTrailsORM.user_id == user_id, UserTrailsORM.trail_id == trail_id
-            )
-            .first()
-        )
-        if not ut:
-            return
-
-        total = self.count_items_in_trail(trail_id)
-        done = self._done_items(user_id, trail_id)
-        pct = round(100.0 * done / total, 2) if total > 0 else 0.0
+        self.sync_progress_for_trails(user_id, [trail_id])
 
-        ut.progress_percent = pct
-
-        completed_status_id = self._enrollment_status_id("COMPLETED")
-        in_progress_status_id = self._enrollment_status_id("IN_PROGRESS")
-        enrolled_status_id = self._enrollment_status_id("ENROLLED")
-        if total > 0 and done >= total:
-            if completed_status_id:
-                ut.status_id = completed_status_id
-            ut.completed_at = func.now()
-            ut.completed_at_utc = None
-        elif done > 0:
-            if in_progress_status_id:
-                ut.status_id = in_progress_status_id
-            ut.completed_at = None
-            ut.completed_at_utc = None
-        else:
-            if enrolled_status_id:
-                ut.status_id = enrolled_status_id
-            ut.completed_at = None
-            ut.completed_at_utc = None
-
-        self.db.flush()
-
-        if total > 0 and done >= total:
-            CertificatesRepository(self.db).ensure_certificate(user_id, trail_id)
-
-    def _count_items_for_trails(self, trail_ids: Iterable[int]) -> Dict[int, int]:
+    def _item_counts_for_trails(
+        self, user_id: int, trail_ids: Iterable[int]
+    ) -> Dict[int, Tuple[int, int]]:
         ids = list({int(tid) for tid in trail_ids})
         if not ids:
             return {}
+        completed_status_id = self._progress_status_id("COMPLETED")
+        completed_filter = (
+            UserItemProgressORM.status_id == completed_status_id
+            if completed_status_id
+            else false()
+        )
+
+        # Totals and completed items for every trail in a single grouped query.
         rows = (
             self.db.query(
                 TrailItemsORM.trail_id,
                 func.count(TrailItemsORM.id).label("total"),
+                func.count(UserItemProgressORM.id).label("done"),
+            )
+            .outerjoin(
+                UserItemProgressORM,
+                (UserItemProgressORM.trail_item_id == TrailItemsORM.id)
+                & (UserItemProgressORM.user_id == user_id)
+                & completed_filter,
             )
             .filter(TrailItemsORM.trail_id.in_(ids))
             .group_by(TrailItemsORM.trail_id)
             .all()
         )
-        return {trail_id: total for trail_id, total in rows}
+        return {
+            trail_id: (int(total or 0), int(done or 0))
+            for trail_id, total, done in rows
+        }
 
-    def _done_items_for_trails(
+    def sync_progress_for_trails(
         self, user_id: int, trail_ids: Iterable[int]
-    ) -> Dict[int, int]:
+    ) -> Dict[int, Tuple[int, int]]:
+        # Set-based sync: the statement count does not grow with the number of
+        # trails (grouped counts, one enrollment read, one flush, batched
+        # certificate issuance).
         ids = list({int(tid) for tid in trail_ids})
         if not ids:
             return {}
-        completed_status_id = self._progress_status_id("COMPLETED")
-        if not completed_status_id:
-            return {}
 
-        rows = (
-            self.db.query(
-                TrailItemsORM.trail_id,
-                func.count(UserItemProgressORM.id).label("done"),
-            )
-            .join(
-                UserItemProgressORM,
-                (UserItemProgressORM.trail_item_id == TrailItemsORM.id)
-                & (UserItemProgressORM.user_id == user_id),
-            )
+        counts = self._item_counts_for_trails(user_id, ids)
+        enrollments = (
+            self.db.query(UserTrailsORM)
             .filter(
-                TrailItemsORM.trail_id.in_(ids),
-                UserItemProgressORM.status_id == completed_status_id,
+                UserTrailsORM.user_id == user_id,
+                UserTrailsORM.trail_id.in_(ids),
             )
-            .group_by(TrailItemsORM.trail_id)
             .all()
         )
-        return {trail_id: done for trail_id, done in rows}
+        if not enrollments:
+            return counts
+
+        status_ids = lookups.ids(self.db, ENROLLMENT_STATUS)
+        completed_status_id = status_ids.get("COMPLETED")
+        completed_trail_ids: List[int] = []
+
+        for ut in enrollments:
+            total, done = counts.get(ut.trail_id, (0, 0))
+            if ut.done_items != done:
+                ut.done_items = done
+            pct = round(100.0 * done / total, 2) if total > 0 else 0.0
+            if (
+                ut.progress_percent is None
+                or abs(float(ut.progress_percent) - pct) >= 0.005
+            ):
+                ut.progress_percent = pct
+
+            if total > 0 and done >= total:
+                completed_trail_ids.append(ut.trail_id)
+                # Only stamp completed_at on the transition so repeated syncs
+                # of a finished trail do not rewrite the row.
+                if ut.completed_at is None or ut.status_id != completed_status_id:
+                    ut.completed_at = func.now()
+                    ut.completed_at_utc = None
+                target_status_id = completed_status_id
+            else:
+                if ut.completed_at is not None:
+                    ut.completed_at = None
+                if ut.completed_at_utc is not None:
+                    ut.completed_at_utc = None
+                target_status_id = status_ids.get(
+                    "IN_PROGRESS" if done > 0 else "ENROLLED"
+                )
+
+            if target_status_id and ut.status_id != target_status_id:
+                ut.status_id = target_status_id
+
+        self.db.flush()
+
+        if completed_trail_ids:
+            CertificatesRepository(self.db).ensure_certificates(
+                user_id, completed_trail_ids
+            )
+        return counts
+
+    def apply_completion_deltas(self, user_id: int, deltas: Dict[int, int]) -> None:
+        """Incremental counterpart of ``sync_progress_for_trails``.
+
+        ``deltas`` maps trail ids to the number of items that just became
+        COMPLETED. Each enrollment's ``done_items`` counter is bumped in place
+        against an indexed count of the trail's items, so the cost does not
+        depend on how many items the learner has done. Enrollments whose
+        counter was never seeded, or that would reach the total, go through a
+        full sync instead, so completion and certificates always rest on an
+        exact recount (at most once per enrollment); ``reconcile_progress``
+        repairs any other drift.
+        """
+
+        table = UserTrailsORM.__table__
+        status_ids = lookups.ids(self.db, ENROLLMENT_STATUS)
+        completed_status_id = status_ids.get("COMPLETED")
+        to_sync: List[int] = []
+
+        for trail_id, delta in deltas.items():
+            if not delta:
+                continue
+            total = self.count_items_in_trail(trail_id)
+            bumped = table.c.done_items + delta
+            done_expr = case((bumped < 0, 0), else_=bumped)
+            pct_expr = progress_percent_expr(done_expr, total)
+            row = self.db.execute(
+                update(table)
+                .where(
+                    table.c.user_id == user_id,
+                    table.c.trail_id == trail_id,
+                    table.c.done_items.isnot(None),
+                )
+                .values(done_items=done_expr, progress_percent=pct_expr)
+                .returning(table.c.id, table.c.done_items, table.c.status_id)
+            ).first()
+            if row is None or (total > 0 and row.done_items >= total):
+                to_sync.append(trail_id)
+                continue
+
+            target_status_id = status_ids.get(
+                "IN_PROGRESS" if row.done_items > 0 else "ENROLLED"
+            )
+            if not target_status_id or row.status_id == target_status_id:
+                continue
+
+            values: Dict[str, Any] = {"status_id": target_status_id}
+            if row.status_id == completed_status_id:
+                values.update(completed_at=None, completed_at_utc=None)
+            self.db.execute(update(table).where(table.c.id == row.id).values(**values))
+
+        if to_sync:
+            self.sync_progress_for_trails(user_id, to_sync)
 
     def get_progress_map_for_user(
         self, user_id: int, trail_ids: Iterable[int], *, sync: bool = False
@@ -190,18 +253,20 @@ class UserTrailsRepository:
         if not ids:
             return {}
 
+        if sync and settings.progress_aggregation_mode == "incremental":
+            # Writes keep the enrollments current; reads stay read-only.
+            sync = False
+
         if sync:
-            for trail_id in ids:
-                self.sync_user_trail_progress(user_id, trail_id)
+            counts = self.sync_progress_for_trails(user_id, ids)
             # Persist any updates (including newly issued certificates) triggered by
             # the synchronization before returning progress information. Without an
             # explicit commit the session would roll back at the end of the request
             # lifecycle, causing the emitted certificate data to be lost if the
             # process crashes.
             self.db.commit()
-
-        totals = self._count_items_for_trails(ids)
-        done_map = self._done_items_for_trails(user_id, ids)
+        else:
+            counts = self._item_counts_for_trails(user_id, ids)
 
         progress_rows = (
             self.db.query(
@@ -211,11 +276,7 @@ class UserTrailsRepository:
                 UserTrailsORM.completed_at,
                 UserTrailsORM.review_rating,
                 UserTrailsORM.review_comment,
-                LkEnrollmentStatusORM.code.label("status_code"),
-            )
-            .outerjoin(
-                LkEnrollmentStatusORM,
-                LkEnrollmentStatusORM.id == UserTrailsORM.status_id,
+                UserTrailsORM.status_id,
             )
             .filter(
                 UserTrailsORM.user_id == user_id,
@@ -230,8 +291,7 @@ class UserTrailsRepository:
         progress_map: Dict[int, Dict[str, Any]] = {}
 
         for trail_id in ids:
-            total = int(totals.get(trail_id, 0))
-            done = int(done_map.get(trail_id, 0))
+            total, done = counts.get(trail_id, (0, 0))
             row = row_map.get(trail_id)
 
             if total > 0:
@@ -259,7 +319,7 @@ class UserTrailsRepository:
                 "enrolledAt": (
                     row.started_at.isoformat() if row and row.started_at else None
                 ),
-                "status": row.status_code if row else None,
+                "status": self._enrollment_status_code(row.status_id) if row else None,
                 "completed_at": (
                     row.completed_at.isoformat() if row and row.completed_at else None
                 ),
@@ -288,13 +348,9 @@ class UserTrailsRepository:
                 TrailsORM.name,
                 TrailsORM.thumbnail_path,
                 TrailsORM.author,
-                LkEnrollmentStatusORM.code.label("status_code"),
+                UserTrailsORM.status_id,
             )
             .join(TrailsORM, TrailsORM.id == UserTrailsORM.trail_id)
-            .outerjoin(
-                LkEnrollmentStatusORM,
-                LkEnrollmentStatusORM.id == UserTrailsORM.status_id,
-            )
             .filter(UserTrailsORM.user_id == user_id)
             .all()
         )
@@ -308,6 +364,7 @@ class UserTrailsRepository:
 
         overview: List[Dict[str, Any]] = []
         for row in rows:
+            status_code = self._enrollment_status_code(row.status_id)
             progress = progress_map.get(
                 row.trail_id,
                 {
@@ -316,7 +373,7 @@ class UserTrailsRepository:
                     "computed_progress_percent": 0.0,
                     "nextAction": "Começar",
                     "enrolledAt": None,
-                    "status": row.status_code,
+                    "status": status_code,
                     "completed_at": None,
                     "certificate": None,
                 },
@@ -328,8 +385,11 @@ class UserTrailsRepository:
                     "thumbnail_url": build_media_url(
                         getattr(row, "thumbnail_path", None), external=True
                     ),
+                    "thumbnail_variants": image_variants(
+                        getattr(row, "thumbnail_path", None), external=True
+                    ),
                     "author": row.author,
-                    "status": progress.get("status") or row.status_code,
+                    "status": progress.get("status") or status_code,
                     "progress": progress,
                 }
             )
@@ -406,133 +466,108 @@ class UserTrailsRepository:
         self.db.flush()
         return avg_value, count_value
 
-    def find_blocking_item(
-        self, user_id: int, trail_id: int, target_item_id: int
-    ) -> Optional[Dict[str, Any]]:
-        section_alias = aliased(TrailSectionsORM)
-        rows = (
-            self.db.query(
-                TrailItemsORM.id.label("item_id"),
-                TrailItemsORM.title.label("title"),
-                TrailItemsORM.requires_completion,
-                TrailItemsORM.requires_completion_yn,
-                LkProgressStatusORM.code.label("status_code"),
-            )
-            .outerjoin(
-                UserItemProgressORM,
-                (UserItemProgressORM.trail_item_id == TrailItemsORM.id)
-                & (UserItemProgressORM.user_id == user_id),
-            )
-            .outerjoin(
-                LkProgressStatusORM,
-                LkProgressStatusORM.id == UserItemProgressORM.status_id,
-            )
-            .outerjoin(section_alias, section_alias.id == TrailItemsORM.section_id)
-            .filter(TrailItemsORM.trail_id == trail_id)
-            .order_by(
-                case((TrailItemsORM.section_id.is_(None), 0), else_=1),
-                section_alias.order_index.asc().nullsfirst(),
-                TrailItemsORM.order_index.asc().nullsfirst(),
-                TrailItemsORM.id.asc(),
+    def completed_item_ids(self, user_id: int, item_ids: Iterable[int]) -> set[int]:
+        ids = list({int(item_id) for item_id in item_ids})
+        completed_status_id = self._progress_status_id("COMPLETED")
+        if not ids or not completed_status_id:
+            return set()
+        return {
+            item_id
+            for (item_id,) in self.db.query(UserItemProgressORM.trail_item_id)
+            .filter(
+                UserItemProgressORM.user_id == user_id,
+                UserItemProgressORM.trail_item_id.in_(ids),
+                UserItemProgressORM.status_id == completed_status_id,
             )
             .all()
-        )
-
-        blocker: Optional[Dict[str, Any]] = None
-
-        def _requires_completion(row) -> bool:
-            if getattr(row, "requires_completion", None) is not None:
-                return bool(row.requires_completion)
-            flag = getattr(row, "requires_completion_yn", None)
-            if flag is not None:
-                return str(flag).upper() == "S"
-            return False
-
-        for row in rows:
-            if row.item_id == target_item_id:
-                return blocker
-
-            if not _requires_completion(row):
-                continue
+        }
 
-            status_code = row.status_code or ""
-            if status_code == "COMPLETED":
-                if blocker and blocker.get("id") == row.item_id:
-                    blocker = None
-                continue
+    def find_blocking_item(
+        self,
+        user_id: int,
+        trail_id: int,
+        target_item_id: int,
+        *,
+        completed_ids: Optional[set[int]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        # Callers checking several items pass ``completed_ids`` to skip the
+        # per-item lookup.
+        required = get_trail_outline(self.db, trail_id).required_before(target_item_id)
+        if not required:
+            return None
 
-            if blocker is None:
-                blocker = {
-                    "id": row.item_id,
-                    "title": row.title or "",
-                }
+        if completed_ids is None:
+            completed_ids = self.completed_item_ids(
+                user_id, [item.id for item in required]
+            )
 
-        return blocker
+        for item in required:
+            if item.id not in completed_ids:
+                return {"id": item.id, "title": item.title}
+        return None
 
     def get_items_progress(self, user_id: int, trail_id: int) -> List[Dict[str, Any]]:
-        section_alias = aliased(TrailSectionsORM)
+        outline = get_trail_outline(self.db, trail_id)
+        if not outline.items:
+            return []
+
         rows = (
             self.db.query(
-                TrailItemsORM.id.label("item_id"),
-                LkProgressStatusORM.code.label("status"),
+                UserItemProgressORM.trail_item_id,
+                UserItemProgressORM.status_id,
                 UserItemProgressORM.progress_value,
                 UserItemProgressORM.completed_at,
             )
-            .outerjoin(
-                UserItemProgressORM,
-                (UserItemProgressORM.trail_item_id == TrailItemsORM.id)
-                & (UserItemProgressORM.user_id == user_id),
-            )
-            .outerjoin(
-                LkProgressStatusORM,
-                LkProgressStatusORM.id == UserItemProgressORM.status_id,
-            )
-            .outerjoin(section_alias, section_alias.id == TrailItemsORM.section_id)
-            .filter(TrailItemsORM.trail_id == trail_id)
-            .order_by(
-                case((TrailItemsORM.section_id.is_(None), 0), else_=1),
-                section_alias.order_index.asc().nullsfirst(),
-                TrailItemsORM.order_index,
-                TrailItemsORM.id,
+            .join(TrailItemsORM, TrailItemsORM.id == UserItemProgressORM.trail_item_id)
+            .filter(
+                UserItemProgressORM.user_id == user_id,
+                TrailItemsORM.trail_id == trail_id,
             )
             .all()
         )
+        progress_by_item = {row.trail_item_id: row for row in rows}
 
-        return [
-            {
-                "item_id": row.item_id,
-                "status": row.status,
-                "progress_value": row.progress_value,
-                "completed_at": (
-                    row.completed_at.isoformat() if row.completed_at else None
-                ),
-            }
-            for row in rows
-        ]
+        items_progress: List[Dict[str, Any]] = []
+        for item_id in outline.item_ids:
+            row = progress_by_item.get(item_id)
+            items_progress.append(
+                {
+                    "item_id": item_id,
+                    "status": (
+                        lookups.code_for(self.db, PROGRESS_STATUS, row.status_id)
+                        if row
+                        else None
+                    ),
+                    "progress_value": row.progress_value if row else None,
+                    "completed_at": (
+                        row.completed_at.isoformat()
+                        if row and row.completed_at
+                        else None
+                    ),
+                }
+            )
+        return items_progress
 
     def get_sections_progress(
         self, user_id: int, trail_id: int
     ) -> List[Dict[str, Any]]:
+        completed_status_id = self._progress_status_id("COMPLETED")
+        completed_case = (
+            case((UserItemProgressORM.status_id == completed_status_id, 1), else_=0)
+            if completed_status_id
+            else literal(0)
+        )
         subquery = (
             self.db.query(
                 TrailItemsORM.section_id.label("section_id"),
                 func.count(TrailItemsORM.id).label("total"),
-                func.sum(
-                    case(
-                        (LkProgressStatusORM.code == "COMPLETED", 1),
-                        else_=0,
-                    )
-                ).label("done"),
+                func.sum(completed_case).label("done"),
             )
             .outerjoin(
                 UserItemProgressORM,
                 (UserItemProgressORM.trail_item_id == TrailItemsORM.id)
                 & (UserItemProgressORM.user_id == user_id),
             )
-            .outerjoin(
-                LkProgressStatusORM,
-                LkProgressStatusORM.id == UserItemProgressORM.status_id,
-            )
             .filter(
                 TrailItemsORM.trail_id == trail_id, TrailItemsORM.section_id.isnot(None)
             )
@@ -569,17 +604,4 @@ class UserTrailsRepository:
         ]
 
     def get_first_trail_item_id(self, trail_id: int) -> Optional[int]:
-        section_alias = aliased(TrailSectionsORM)
-        row = (
-            self.db.query(TrailItemsORM.id)
-            .outerjoin(section_alias, section_alias.id == TrailItemsORM.section_id)
-            .filter(TrailItemsORM.trail_id == trail_id)
-            .order_by(
-                case((TrailItemsORM.section_id.is_(None), 0), else_=1),
-                section_alias.order_index.asc().nullsfirst(),
-                TrailItemsORM.order_index.asc(),
-                TrailItemsORM.id.asc(),
-            )
-            .first()
-        )
-        return row[0] if row else None
+        return get_trail_outline(self.db, trail_id).first_item_id()
@@ -4,13 +4,15 @@ from __future__ import annotations
 from datetime import date
 from typing import Optional, Tuple
 
-from sqlalchemy import select
 from sqlalchemy.orm import Session, selectinload
 
 from app.models.users import User, SkinColor
-from app.models.lookups import LkRole, LkSex, LkColor
 from app.models.roles import RolesEnum
 from app.models.users import Sex  # seu Enum de API (M/F/O/N)
+from app.repositories.CertificatesRepository import CertificatesRepository
+from app.services.certificate_cache import invalidate_certificates
+from app.services.lookups import COLOR, ROLE, SEX, lookups
+from app.services.session_cache import invalidate_user_sessions
 
 
 class UsersRepository:
@@ -19,23 +21,19 @@ class UsersRepository:
 
     # ---------- Helpers de lookup (code -> id) ----------
     def _sex_id(self, sex: Sex) -> int:
-        sid = self.db.scalars(select(LkSex.id).where(LkSex.code == sex.value)).first()
+        sid = lookups.id_for(self.db, SEX, sex.value)
         if sid is None:
             raise ValueError(f"lk_sex não possui code '{sex.value}'")
         return sid
 
     def _color_id(self, color: SkinColor) -> int:
-        cid = self.db.scalars(
-            select(LkColor.id).where(LkColor.code == color.value)
-        ).first()
+        cid = lookups.id_for(self.db, COLOR, color.value)
         if cid is None:
             raise ValueError(f"lk_color não possui code '{color.value}'")
         return cid
 
     def _role_id(self, role: RolesEnum) -> int:
-        rid = self.db.scalars(
-            select(LkRole.id).where(LkRole.code == role.value)
-        ).first()
+        rid = lookups.id_for(self.db, ROLE, role.value)
         if rid is None:
             raise ValueError(f"lk_role não possui code '{role.value}'")
         return rid
@@ -140,6 +138,7 @@ class UsersRepository:
         self.db.commit()
         self.db.refresh(user)
         self.db.refresh(user, attribute_names=["role"])
+        invalidate_user_sessions(user.user_id)
         return user
 
     def UpdateUserSex(self, user: User, new_sex: Sex) -> User:
@@ -155,11 +154,24 @@ class UsersRepository:
         self.db.add(user)
         self.db.commit()
         self.db.refresh(user)
+        invalidate_user_sessions(user.user_id)
+        return user
+
+    def RehashPassword(self, user: User, new_password_hash: str) -> User:
+        # Same password with a stronger hash: sessions stay valid.
+        user.password_hash = new_password_hash
+        self.db.add(user)
+        self.db.commit()
         return user
 
     def UpdateCertificateName(self, user: User, *, name_for_certificate: str) -> User:
+        changed = user.name_for_certificate != name_for_certificate
         user.name_for_certificate = name_for_certificate
         self.db.add(user)
         self.db.commit()
         self.db.refresh(user)
+        if changed:
+            invalidate_certificates(
+                CertificatesRepository(self.db).hashes_for_user(user.user_id)
+            )
         return user
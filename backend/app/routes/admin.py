@@ -3,7 +3,7 @@ from __future__ import annotations
 from typing import List
 from flask import Blueprint, jsonify, request, g
 from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
-from sqlalchemy import case, func
+from sqlalchemy import case, func, literal
 
 from app.core.db import get_db
 from app.models.users import User
@@ -12,8 +12,8 @@ from app.models.trail_sections import TrailSections as TrailSectionsORM
 from app.models.trail_items import TrailItems as TrailItemsORM
 from app.models.trail_certificates import TrailCertificates as TrailCertificatesORM
 from app.models.user_trails import UserTrails as UserTrailsORM
-from app.models.lk_enrollment_status import LkEnrollmentStatus as LkEnrollmentStatusORM
 from app.repositories.TrailsRepository import TrailsRepository
+from app.services.lookups import ENROLLMENT_STATUS, lookups
 from app.services.media import delete_media
 from app.services.security import enforce_csrf, require_roles
 from app.routes import format_validation_error
@@ -23,6 +23,7 @@ bp = Blueprint("admin", __name__, url_prefix="/admin")
 
 
 class AdminFormOptionIn(BaseModel):
+    id: int | None = Field(default=None, ge=1)
     text: str = Field(..., min_length=1)
     is_correct: bool = False
     order_index: int | None = Field(default=None, ge=0)
@@ -37,6 +38,7 @@ class AdminFormOptionIn(BaseModel):
 
 
 class AdminFormQuestionIn(BaseModel):
+    id: int | None = Field(default=None, ge=1)
     prompt: str = Field(..., min_length=1)
     type: str = Field(..., min_length=1)
     required: bool = True
@@ -78,6 +80,7 @@ class AdminFormQuestionIn(BaseModel):
 
 
 class AdminFormIn(BaseModel):
+    id: int | None = Field(default=None, ge=1)
     title: str | None = None
     description: str | None = None
     min_score_to_pass: float = Field(default=70, ge=0)
@@ -100,6 +103,7 @@ class AdminFormIn(BaseModel):
 
 
 class AdminTrailItemIn(BaseModel):
+    id: int | None = Field(default=None, ge=1)
     title: str = Field(..., min_length=1, max_length=255)
     type: str = Field(..., min_length=1, max_length=32)
     url: str = Field(..., min_length=1)
@@ -134,6 +138,7 @@ class AdminTrailItemIn(BaseModel):
 
 
 class AdminTrailSectionIn(BaseModel):
+    id: int | None = Field(default=None, ge=1)
     title: str = Field(..., min_length=1, max_length=255)
     order_index: int | None = Field(default=None, ge=0)
     items: List[AdminTrailItemIn] = Field(default_factory=list)
@@ -247,22 +252,17 @@ def dashboard():
     total_certificates = db.query(func.count(TrailCertificatesORM.id)).scalar() or 0
 
     enrollment_rows = (
-        db.query(LkEnrollmentStatusORM.code, func.count(UserTrailsORM.id))
-        .join(UserTrailsORM, UserTrailsORM.status_id == LkEnrollmentStatusORM.id)
-        .group_by(LkEnrollmentStatusORM.code)
+        db.query(UserTrailsORM.status_id, func.count(UserTrailsORM.id))
+        .group_by(UserTrailsORM.status_id)
         .all()
     )
-    enrollment_by_status = {
-        (code or "UNKNOWN"): int(count or 0) for code, count in enrollment_rows
-    }
-    unknown_enrollments = (
-        db.query(func.count(UserTrailsORM.id))
-        .filter(UserTrailsORM.status_id.is_(None))
-        .scalar()
-        or 0
-    )
-    if unknown_enrollments:
-        enrollment_by_status["UNDEFINED"] = int(unknown_enrollments)
+    enrollment_by_status: dict[str, int] = {}
+    for status_id, count in enrollment_rows:
+        if status_id is None:
+            key = "UNDEFINED"
+        else:
+            key = lookups.code_for(db, ENROLLMENT_STATUS, status_id) or "UNKNOWN"
+        enrollment_by_status[key] = enrollment_by_status.get(key, 0) + int(count or 0)
 
     section_counts = {
         trail_id: count
@@ -324,25 +324,20 @@ def dashboard():
         for cert in recent_certificates
     ]
 
+    completed_status_id = lookups.id_for(db, ENROLLMENT_STATUS, "COMPLETED")
+    completed_case = (
+        case((UserTrailsORM.status_id == completed_status_id, 1), else_=0)
+        if completed_status_id
+        else literal(0)
+    )
     top_trails = (
         db.query(
             TrailsORM.id,
             TrailsORM.name,
             func.count(UserTrailsORM.id).label("enrollments"),
-            func.coalesce(
-                func.sum(
-                    case(
-                        (LkEnrollmentStatusORM.code == "COMPLETED", 1),
-                        else_=0,
-                    )
-                ),
-                0,
-            ).label("completed"),
+            func.coalesce(func.sum(completed_case), 0).label("completed"),
         )
         .outerjoin(UserTrailsORM, UserTrailsORM.trail_id == TrailsORM.id)
-        .outerjoin(
-            LkEnrollmentStatusORM, UserTrailsORM.status_id == LkEnrollmentStatusORM.id
-        )
         .group_by(TrailsORM.id, TrailsORM.name)
         .order_by(func.count(UserTrailsORM.id).desc(), TrailsORM.name)
         .limit(5)
@@ -17,7 +17,7 @@ from app.models.users import (
 )
 from app.services.security import (
     hash_password,
-    verify_password,
+    verify_and_update_password,
     sign_session,
     set_session_cookie,
     set_csrf_cookie,
@@ -28,7 +28,9 @@ from app.services.security import (
     decode_password_reset_token,
 )
 from app.repositories.UsersRepository import UsersRepository
+from app.services.password_hasher import PasswordHasherBusy
 from app.services.rate_limiter import check_auth_rate_limit
+from app.services.request_limits import client_ip
 from app.services.email import (
     send_welcome_email,
     send_password_reset_email,
@@ -40,19 +42,11 @@ from app.routes import format_validation_error
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 
-def _client_identifier() -> str:
-    forwarded_for = request.headers.get("X-Forwarded-For", "")
-    ip = forwarded_for.split(",", 1)[0].strip() if forwarded_for else ""
-    if not ip:
-        ip = request.remote_addr or "unknown"
-    return ip
-
-
 def _rate_limited_response(scope: str, *, identifier: str | None = None):
     parts = [scope]
     if identifier:
         parts.append(identifier.lower())
-    parts.append(_client_identifier())
+    parts.append(client_ip())
     retry_after = check_auth_rate_limit(":".join(parts))
     if retry_after is None:
         return None
@@ -64,6 +58,16 @@ def _rate_limited_response(scope: str, *, identifier: str | None = None):
     return response
 
 
+@bp.errorhandler(PasswordHasherBusy)
+def _password_hasher_busy(exc: PasswordHasherBusy):
+    response = jsonify(
+        {"detail": "Serviço temporariamente sobrecarregado. Tente novamente."}
+    )
+    response.status_code = 503
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response
+
+
 def _validate_payload(model_cls):
     data = request.get_json(silent=True) or {}
     return model_cls.model_validate(data)
@@ -184,8 +188,15 @@ def login():
     repo = UsersRepository(db)
     user: User | None = repo.GetUserByEmail(payload.email)
 
-    if not user or not verify_password(payload.password, user.password_hash):
+    valid, new_hash = (
+        verify_and_update_password(payload.password, user.password_hash)
+        if user
+        else (False, None)
+    )
+    if not valid:
         return jsonify({"detail": "Credenciais inválidas. Verifique seu email e senha."}), 401
+    if new_hash:
+        repo.RehashPassword(user, new_hash)
 
     token = sign_session(
         {
@@ -1,18 +1,20 @@
 from __future__ import annotations
 
-import base64
-import io
 from datetime import datetime
-from functools import lru_cache
+from urllib.parse import urlsplit
 
 from flask import Blueprint, jsonify, abort, request
 from pydantic import BaseModel
 
-import segno
-
 from app.core.db import get_db
+from app.core.settings import settings
 from app.repositories.CertificatesRepository import CertificatesRepository
 from app.repositories.UserTrailsRepository import UserTrailsRepository
+from app.services.certificate_cache import (
+    get_certificate_payload,
+    qr_data_uri,
+    store_certificate_payload,
+)
 from app.services.security import get_current_user
 
 
@@ -27,19 +29,6 @@ def _format_datetime(dt: datetime | None) -> str | None:
     return dt.isoformat()
 
 
-@lru_cache(maxsize=256)
-def _cached_qr_data_uri(payload: str) -> str:
-    qr = segno.make(payload, error="m")
-    buf = io.BytesIO()
-    qr.save(buf, kind="png", scale=6)
-    encoded = base64.b64encode(buf.getvalue()).decode("ascii")
-    return f"data:image/png;base64,{encoded}"
-
-
-def _qr_data_uri(payload: str) -> str:
-    return _cached_qr_data_uri(payload)
-
-
 class CertificateResponse(BaseModel):
     trail_id: int
     trail_title: str
@@ -51,30 +40,56 @@ class CertificateResponse(BaseModel):
     qr_code_data_uri: str
 
 
-@bp.get("/<string:certificate_hash>")
-def get_certificate(certificate_hash: str):
-    db = get_db()
-    repo = CertificatesRepository(db)
-    row = repo.get_details_by_hash(certificate_hash)
-    if not row:
-        abort(404, description="Certificado não encontrado")
-
-    cert, user, trail = row
-    verify_base = request.args.get("verify_base") or request.url_root
-    verify_base = verify_base.rstrip("/")
-    verification_url = f"{verify_base}/certificados/?cert_hash={cert.certificate_hash}"
-
+def _certificate_fields(cert, user, trail) -> dict:
+    return {
+        "trail_id": trail.id,
+        "trail_title": trail.name,
+        "student_name": user.name_for_certificate,
+        "credential_id": cert.credential_id,
+        "certificate_hash": cert.certificate_hash,
+        "issued_at": _format_datetime(cert.issued_at),
+    }
+
+
+def _verify_base() -> str:
+    # The public endpoint takes verify_base from the caller; only trusted
+    # frontend origins are honoured, so QR cache keys stay bounded.
+    requested = urlsplit(request.args.get("verify_base") or "")
+    if requested.scheme in ("http", "https") and requested.netloc:
+        origin = f"{requested.scheme}://{requested.netloc}".lower()
+        allowed = {
+            value.rstrip("/").lower()
+            for value in (*settings.cors_allowed_origins_list(), settings.API_ORIGIN)
+        }
+        if origin in allowed:
+            return origin
+    return request.url_root.rstrip("/")
+
+
+def _certificate_response(fields: dict) -> dict:
+    verify_base = _verify_base()
+    verification_url = (
+        f"{verify_base}/certificados/?cert_hash={fields['certificate_hash']}"
+    )
     payload = CertificateResponse(
-        trail_id=trail.id,
-        trail_title=trail.name,
-        student_name=user.name_for_certificate,
-        credential_id=cert.credential_id,
-        certificate_hash=cert.certificate_hash,
-        issued_at=_format_datetime(cert.issued_at),
+        **fields,
         verification_url=verification_url,
-        qr_code_data_uri=_qr_data_uri(verification_url),
+        qr_code_data_uri=qr_data_uri(verification_url),
     )
-    return jsonify(payload.model_dump(mode="json"))
+    return payload.model_dump(mode="json")
+
+
+@bp.get("/<string:certificate_hash>")
+def get_certificate(certificate_hash: str):
+    fields = get_certificate_payload(certificate_hash)
+    if fields is None:
+        repo = CertificatesRepository(get_db())
+        row = repo.get_details_by_hash(certificate_hash)
+        if not row:
+            abort(404, description="Certificado não encontrado")
+        fields = _certificate_fields(*row)
+        store_certificate_payload(fields["certificate_hash"], fields)
+    return jsonify(_certificate_response(fields))
 
 
 @bp.route("/me/trails/<int:trail_id>", methods=["GET", "OPTIONS"])
@@ -91,20 +106,4 @@ def get_certificate_for_my_trail(trail_id: int):
         if not row:
             abort(404, description="Certificado não encontrado para esta trilha")
 
-    cert, user_model, trail = row
-
-    verify_base = request.args.get("verify_base") or request.url_root
-    verify_base = verify_base.rstrip("/")
-    verification_url = f"{verify_base}/certificados/?cert_hash={cert.certificate_hash}"
-
-    payload = CertificateResponse(
-        trail_id=trail.id,
-        trail_title=trail.name,
-        student_name=user_model.name_for_certificate,
-        credential_id=cert.credential_id,
-        certificate_hash=cert.certificate_hash,
-        issued_at=_format_datetime(cert.issued_at),
-        verification_url=verification_url,
-        qr_code_data_uri=_qr_data_uri(verification_url),
-    )
-    return jsonify(payload.model_dump(mode="json"))
+    return jsonify(_certificate_response(_certificate_fields(*row)))
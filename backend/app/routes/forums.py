@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import json
 from datetime import datetime
 from typing import Optional
 
@@ -7,7 +10,9 @@ from flask import Blueprint, abort, jsonify, request
 from pydantic import BaseModel, ValidationError, field_validator, Field
 
 from app.core.db import get_db
-from app.repositories.ForumsRepository import ForumsRepository
+from app.core.query_budget import route_query_budget
+from app.repositories.ForumsRepository import ForumsRepository, PageKey
+from app.services.request_limits import rate_limit
 from app.services.security import enforce_csrf, get_current_user
 from app.services.sanitizer import sanitize_user_html
 
@@ -207,18 +212,62 @@ class CreatePostIn(BaseModel):
 PostOut.model_rebuild()
 
 
-def _pagination_payload(page: int, page_size: int, total: int) -> dict:
-    pages = (total + page_size - 1) // page_size if page_size else 0
-    return {"page": page, "page_size": page_size, "total": total, "pages": pages}
+def _encode_cursor(key: Optional[PageKey]) -> Optional[str]:
+    if key is None:
+        return None
+    timestamp, row_id = key
+    raw = json.dumps([timestamp.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(value: str) -> PageKey:
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        abort(400, description="Cursor de paginação inválido")
+
+
+def _page_args() -> tuple[int, int, Optional[PageKey], bool]:
+    """Parse page/page_size (offset mode) or cursor (keyset mode) arguments."""
+
+    page = _parse_positive_int(request.args.get("page"), 1)
+    page_size = min(_parse_positive_int(request.args.get("page_size"), 20), 100)
+    cursor_mode = "cursor" in request.args
+    raw_cursor = (request.args.get("cursor") or "").strip()
+    after = _decode_cursor(raw_cursor) if raw_cursor else None
+    return page, page_size, after, cursor_mode
+
+
+def _pagination_payload(
+    page: int,
+    page_size: int,
+    total: int,
+    next_key: Optional[PageKey] = None,
+    *,
+    cursor_mode: bool = False,
+) -> dict:
+    # Totals come from the denormalised counters, so no COUNT(*) per page.
+    payload = {
+        "page_size": page_size,
+        "total": total,
+        "next_cursor": _encode_cursor(next_key),
+        "has_more": next_key is not None,
+    }
+    if not cursor_mode:
+        payload["page"] = page
+        payload["pages"] = (total + page_size - 1) // page_size if page_size else 0
+    return payload
 
 
 @bp.get("/")
+@route_query_budget(2)
 def list_forums():
     db = get_db()
     repo = ForumsRepository(db)
     stats = repo.list_forums_with_stats()
     payload = [ForumSummary.from_stats(item).model_dump(mode="json") for item in stats]
-    db.commit()
     return jsonify({"forums": payload})
 
 
@@ -229,7 +278,6 @@ def get_forum(forum_id: int):
     stats = repo.get_forum_with_stats(forum_id)
     if not stats:
         abort(404, description="Fórum não encontrado")
-    db.commit()
     return jsonify(ForumSummary.from_stats(stats).model_dump(mode="json"))
 
 
@@ -241,23 +289,33 @@ def list_topics(forum_id: int):
     if not forum_stats:
         abort(404, description="Fórum não encontrado")
 
-    page = _parse_positive_int(request.args.get("page"), 1)
-    page_size = min(_parse_positive_int(request.args.get("page_size"), 20), 100)
-    offset = (page - 1) * page_size
-
-    rows, total = repo.list_topics(forum_id, offset=offset, limit=page_size)
-    payload = [TopicSummary.from_stats(row).model_dump(mode="json") for row in rows]
-    db.commit()
+    page, page_size, after, cursor_mode = _page_args()
+    result = repo.list_topics(
+        forum_id,
+        limit=page_size,
+        offset=0 if cursor_mode else (page - 1) * page_size,
+        after=after,
+    )
+    payload = [
+        TopicSummary.from_stats(row).model_dump(mode="json") for row in result.topics
+    ]
     return jsonify(
         {
             "forum": ForumSummary.from_stats(forum_stats).model_dump(mode="json"),
             "topics": payload,
-            "pagination": _pagination_payload(page, page_size, total),
+            "pagination": _pagination_payload(
+                page,
+                page_size,
+                forum_stats.topics_count,
+                result.next_key,
+                cursor_mode=cursor_mode,
+            ),
         }
     )
 
 
 @bp.post("/<int:forum_id>/topics")
+@rate_limit(10, 60)
 def create_topic(forum_id: int):
     db = get_db()
     repo = ForumsRepository(db)
@@ -306,7 +364,6 @@ def get_topic(topic_id: int):
     topic_stats = repo.get_topic_stats(topic_id)
     if not topic_stats:
         abort(404, description="Tópico não encontrado")
-    db.commit()
     return jsonify(
         TopicDetail.from_stats(topic_stats, forum_stats).model_dump(mode="json")
     )
@@ -324,25 +381,33 @@ def list_posts(topic_id: int):
     if not topic_stats:
         abort(404, description="Tópico não encontrado")
 
-    page = _parse_positive_int(request.args.get("page"), 1)
-    page_size = min(_parse_positive_int(request.args.get("page_size"), 20), 100)
-    offset = (page - 1) * page_size
-
-    rows, total = repo.list_posts(topic_id, offset=offset, limit=page_size)
-    payload = [PostOut.from_row(row).model_dump(mode="json") for row in rows]
-    db.commit()
+    page, page_size, after, cursor_mode = _page_args()
+    result = repo.list_posts(
+        topic_id,
+        limit=page_size,
+        offset=0 if cursor_mode else (page - 1) * page_size,
+        after=after,
+    )
+    payload = [PostOut.from_row(row).model_dump(mode="json") for row in result.posts]
     return jsonify(
         {
             "topic": TopicDetail.from_stats(topic_stats, forum_stats).model_dump(
                 mode="json"
             ),
             "posts": payload,
-            "pagination": _pagination_payload(page, page_size, total),
+            "pagination": _pagination_payload(
+                page,
+                page_size,
+                topic_stats.posts_count,
+                result.next_key,
+                cursor_mode=cursor_mode,
+            ),
         }
     )
 
 
 @bp.post("/topics/<int:topic_id>/posts")
+@rate_limit(30, 60)
 def create_post(topic_id: int):
     db = get_db()
     repo = ForumsRepository(db)
@@ -380,7 +445,7 @@ def create_post(topic_id: int):
     return (
         jsonify(
             {
-                "post": PostOut.from_model(post, user).model_dump(mode="json"),
+                "post": PostOut.from_model(post, post.author).model_dump(mode="json"),
                 "topic": TopicDetail.from_stats(topic_stats, forum_stats).model_dump(
                     mode="json"
                 ),
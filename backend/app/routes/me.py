@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import jwt
 from flask import Blueprint, jsonify, request, abort
 from sqlalchemy.orm import joinedload, load_only
 from pydantic import BaseModel, ValidationError, field_validator
@@ -11,6 +10,7 @@ from app.models.users import User, UserOut
 from app.models.lookups import LkRole, LkSex, LkColor
 from app.repositories.UsersRepository import UsersRepository
 from app.routes import format_validation_error
+from app.services.security import get_current_user_id
 
 
 bp = Blueprint("me", __name__)
@@ -33,23 +33,6 @@ class ProfileUpdateIn(BaseModel):
         return value.strip()
 
 
-def get_current_user_id(req=None) -> str:
-    req = req or request
-    token = req.cookies.get(settings.COOKIE_NAME)
-    if not token:
-        abort(401, description="Não autenticado")
-    try:
-        decoded = jwt.decode(
-            token,
-            settings.JWT_SECRET,
-            algorithms=["HS256"],
-            options={"require": ["exp"]},
-        )
-        return decoded["id"]
-    except jwt.PyJWTError:
-        abort(401, description="Sessão inválida")
-
-
 @bp.get("/me")
 def me():
     user_id = get_current_user_id()
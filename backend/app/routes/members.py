@@ -8,6 +8,7 @@ from pydantic import BaseModel, Field, ValidationError, field_validator
 from app.core.db import get_db
 from app.repositories.MembersRepository import MembersRepository
 from app.routes import format_validation_error
+from app.services.image_derivatives import image_variants
 from app.services.media import build_media_url, delete_media
 from app.services.security import enforce_csrf, require_roles
 
@@ -53,6 +54,7 @@ def _serialize_member(
         "bio": member.bio,
         "order_index": member.order_index,
         "photo_url": build_media_url(member.photo_path, external=external),
+        "photo_variants": image_variants(member.photo_path, external=external),
         "created_at": member.created_at.isoformat() if member.created_at else None,
         "updated_at": member.updated_at.isoformat() if member.updated_at else None,
     }
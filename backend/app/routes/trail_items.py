@@ -4,26 +4,28 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from decimal import Decimal
 from pathlib import Path
-from typing import Dict, Literal, Optional, Tuple
+from typing import Literal, Optional, Tuple
 from urllib.parse import urlparse
 
-from flask import Blueprint, abort, jsonify, request
+from flask import Blueprint, abort, current_app, jsonify, request
 from pydantic import BaseModel, ValidationError, field_validator
+from sqlalchemy import insert
 from sqlalchemy.orm import selectinload
 
 from app.core.db import get_db
 from app.models.form_answers import FormAnswer as FormAnswerORM
-from app.models.form_question_options import (
-    FormQuestionOption as FormQuestionOptionORM,
-)
 from app.models.form_questions import FormQuestion as FormQuestionORM
 from app.models.form_submissions import FormSubmission as FormSubmissionORM
 from app.models.forms import Form as FormORM
 from app.models.trail_items import TrailItems as TrailItemsORM
 from app.repositories.UserTrailsRepository import UserTrailsRepository
 from app.repositories.UserProgressRepository import UserProgressRepository
+from app.services.form_answer_keys import QuestionKey, get_form_answer_key
+from app.services.item_detail_cache import get_item_detail_body
 from app.services.media import build_media_url, cache_document
+from app.services.request_limits import rate_limit
 from app.services.security import enforce_csrf, get_current_user
+from app.services.trail_outline import get_trail_outline
 from app.routes import format_validation_error
 
 
@@ -130,14 +132,6 @@ def _question_type_code(question: FormQuestionORM) -> QuestionKind:
     return "UNKNOWN"
 
 
-def _option_is_correct(option: FormQuestionOptionORM) -> Optional[bool]:
-    if option.is_correct is not None:
-        return option.is_correct
-    if option.is_correct_yn is not None:
-        return option.is_correct_yn.upper() == "Y"
-    return None
-
-
 def _resource_kind_from_extension(ext: str) -> Optional[ResourceKind]:
     if not ext:
         return None
@@ -178,17 +172,15 @@ def _classify_resource(url: str) -> Tuple[Optional[str], Optional[ResourceKind]]
     return url_out, _resource_kind_from_extension(ext)
 
 
-def _resolve_document_resource(item: TrailItemsORM) -> Tuple[Optional[str], Optional[ResourceKind]]:
+def _resolve_document_resource(
+    item: TrailItemsORM,
+) -> Tuple[Optional[str], Optional[ResourceKind]]:
     raw_url = (item.url or "").strip()
     if not raw_url:
         return None, None
 
     try:
-        cached_path = cache_document(
-            raw_url,
-            subdir=f"documents/trail_{item.trail_id}",
-            filename_hint=f"item_{item.id}",
-        )
+        cached_path = cache_document(raw_url)
     except ValueError:
         return _classify_resource(raw_url)
 
@@ -239,64 +231,7 @@ def _load_form(db, trail_item_id: int) -> FormORM:
 
 
 def _compute_prev_next(db, item: TrailItemsORM) -> tuple[Optional[int], Optional[int]]:
-    trail_id = item.trail_id
-    prev_id: Optional[int] = None
-    next_id: Optional[int] = None
-
-    if item.section_id is not None:
-        prev_row = (
-            db.query(TrailItemsORM.id)
-            .filter(
-                TrailItemsORM.trail_id == trail_id,
-                TrailItemsORM.section_id == item.section_id,
-                TrailItemsORM.order_index < (item.order_index or 0),
-            )
-            .order_by(TrailItemsORM.order_index.desc(), TrailItemsORM.id.desc())
-            .first()
-        )
-        if prev_row:
-            prev_id = prev_row[0]
-
-        next_row = (
-            db.query(TrailItemsORM.id)
-            .filter(
-                TrailItemsORM.trail_id == trail_id,
-                TrailItemsORM.section_id == item.section_id,
-                TrailItemsORM.order_index > (item.order_index or 0),
-            )
-            .order_by(TrailItemsORM.order_index.asc(), TrailItemsORM.id.asc())
-            .first()
-        )
-        if next_row:
-            next_id = next_row[0]
-    else:
-        prev_row = (
-            db.query(TrailItemsORM.id)
-            .filter(
-                TrailItemsORM.trail_id == trail_id,
-                TrailItemsORM.section_id.is_(None),
-                TrailItemsORM.order_index < (item.order_index or 0),
-            )
-            .order_by(TrailItemsORM.order_index.desc(), TrailItemsORM.id.desc())
-            .first()
-        )
-        if prev_row:
-            prev_id = prev_row[0]
-
-        next_row = (
-            db.query(TrailItemsORM.id)
-            .filter(
-                TrailItemsORM.trail_id == trail_id,
-                TrailItemsORM.section_id.is_(None),
-                TrailItemsORM.order_index > (item.order_index or 0),
-            )
-            .order_by(TrailItemsORM.order_index.asc(), TrailItemsORM.id.asc())
-            .first()
-        )
-        if next_row:
-            next_id = next_row[0]
-
-    return prev_id, next_id
+    return get_trail_outline(db, item.trail_id).neighbors(item.id)
 
 
 def _build_locked_response(blocked_item: dict):
@@ -320,13 +255,27 @@ def _build_locked_response(blocked_item: dict):
 def get_item_detail(trail_id: int, item_id: int):
     db = get_db()
     user = get_current_user()
-    item = _load_item(db, trail_id, item_id)
+    outline = get_trail_outline(db, trail_id)
+    if item_id not in outline:
+        abort(404, description="Item não encontrado")
 
     user_trail_repo = UserTrailsRepository(db)
     blocker = user_trail_repo.find_blocking_item(user.user_id, trail_id, item_id)
     if blocker:
         return _build_locked_response(blocker)
 
+    # Everything below the lock check is the same for every learner, so the
+    # serialized payload is cached per outline version (and host, since media
+    # URLs are absolute).
+    body = get_item_detail_body(
+        (trail_id, item_id, outline.version, request.host_url),
+        lambda: _render_item_detail(db, trail_id, item_id),
+    )
+    return current_app.response_class(body, mimetype="application/json")
+
+
+def _render_item_detail(db, trail_id: int, item_id: int) -> bytes:
+    item = _load_item(db, trail_id, item_id)
     item_type = item.type.code if item.type is not None else "DOC"
     youtube_id = _extract_youtube_id(item.url or "") if item_type == "VIDEO" else ""
     prev_id, next_id = _compute_prev_next(db, item)
@@ -393,10 +342,11 @@ def get_item_detail(trail_id: int, item_id: int):
         resource_url=resource_url,
         resource_kind=resource_kind,
     ).model_dump(mode="json")
-    return jsonify(data)
+    return current_app.json.dumps(data).encode("utf-8")
 
 
 @bp.post("/<int:trail_id>/items/<int:item_id>/form-submissions")
+@rate_limit(20, 60)
 def submit_form(trail_id: int, item_id: int):
     db = get_db()
     payload_raw = request.get_json(silent=True) or {}
@@ -418,22 +368,19 @@ def submit_form(trail_id: int, item_id: int):
     if blocker:
         return _build_locked_response(blocker)
 
-    form = _load_form(db, item.id)
+    answer_key = get_form_answer_key(db, trail_id, item.id)
+    if answer_key is None:
+        abort(404, description="Formulário não encontrado para este item")
 
     # garante matrícula
     user_trail_repo.ensure_enrollment(user.user_id, trail_id)
 
-    question_map: Dict[int, FormQuestionORM] = {
-        question.id: question
-        for question in sorted(form.questions, key=lambda q: (q.order_index, q.id))
-    }
-
     provided_answers = {answer.question_id: answer for answer in payload.answers}
 
     invalid_questions = [
         answer.question_id
         for answer in payload.answers
-        if answer.question_id not in question_map
+        if answer_key.get(answer.question_id) is None
     ]
     if invalid_questions:
         return (
@@ -448,8 +395,8 @@ def submit_form(trail_id: int, item_id: int):
 
     missing_required = [
         q.id
-        for q in question_map.values()
-        if _question_is_required(q)
+        for q in answer_key.questions
+        if q.required
         and (
             q.id not in provided_answers or not _has_response(provided_answers[q.id], q)
         )
@@ -469,27 +416,27 @@ def submit_form(trail_id: int, item_id: int):
     auto_scored_points = Decimal("0")
     requires_manual_review = False
     answer_outputs: list[FormSubmissionAnswerOut] = []
-    answer_entities: list[FormAnswerORM] = []
+    answer_rows: list[dict] = []
 
-    for question in question_map.values():
-        q_type = _question_type_code(question)
+    for question in answer_key.questions:
         answer_in = provided_answers.get(question.id)
 
-        if q_type == "ESSAY":
+        if question.kind == "ESSAY":
             response_text = (
                 answer_in.answer_text.strip()
                 if answer_in and answer_in.answer_text
                 else None
             )
-            if _question_is_required(question) or response_text:
+            if question.required or response_text:
                 requires_manual_review = True
-            answer_entities.append(
-                FormAnswerORM(
-                    question_id=question.id,
-                    answer_text=response_text,
-                    is_correct=None,
-                    points_awarded=None,
-                )
+            answer_rows.append(
+                {
+                    "question_id": question.id,
+                    "selected_option_id": None,
+                    "answer_text": response_text,
+                    "is_correct": None,
+                    "points_awarded": None,
+                }
             )
             answer_outputs.append(
                 FormSubmissionAnswerOut(
@@ -501,53 +448,41 @@ def submit_form(trail_id: int, item_id: int):
             continue
 
         # perguntas objetivas
-        points_value = question.points if question.points is not None else Decimal("0")
-        auto_total_points += points_value
+        auto_total_points += question.points
         selected_option_id = answer_in.selected_option_id if answer_in else None
-
-        selected_option: Optional[FormQuestionOptionORM] = None
-        if selected_option_id is not None:
-            selected_option = next(
-                (opt for opt in question.options if opt.id == selected_option_id),
-                None,
+        if (
+            selected_option_id is not None
+            and selected_option_id not in question.option_ids
+        ):
+            return (
+                jsonify(
+                    {
+                        "detail": f"Opção inválida para a questão {question.id}",
+                        "question_id": question.id,
+                    }
+                ),
+                422,
             )
-            if not selected_option:
-                return (
-                    jsonify(
-                        {
-                            "detail": f"Opção inválida para a questão {question.id}",
-                            "question_id": question.id,
-                        }
-                    ),
-                    422,
-                )
 
-        is_correct = False
-        points_awarded: Decimal | None = Decimal("0")
-        if selected_option is not None:
-            option_correct = _option_is_correct(selected_option)
-            is_correct = option_correct is True
-            if option_correct is True:
-                auto_scored_points += points_value
-                points_awarded = points_value
-        else:
-            is_correct = False
-
-        answer_entities.append(
-            FormAnswerORM(
-                question_id=question.id,
-                selected_option_id=selected_option.id if selected_option else None,
-                is_correct=is_correct,
-                points_awarded=points_awarded,
-            )
+        is_correct = selected_option_id in question.correct_option_ids
+        points_awarded = question.points if is_correct else Decimal("0")
+        if is_correct:
+            auto_scored_points += question.points
+
+        answer_rows.append(
+            {
+                "question_id": question.id,
+                "selected_option_id": selected_option_id,
+                "answer_text": None,
+                "is_correct": is_correct,
+                "points_awarded": points_awarded,
+            }
         )
         answer_outputs.append(
             FormSubmissionAnswerOut(
                 question_id=question.id,
                 is_correct=is_correct,
-                points_awarded=(
-                    float(points_awarded) if points_awarded is not None else None
-                ),
+                points_awarded=float(points_awarded),
             )
         )
 
@@ -559,25 +494,33 @@ def submit_form(trail_id: int, item_id: int):
         else 0.0
     )
 
-    min_score = float(form.min_score_to_pass or Decimal("0"))
+    min_score = float(answer_key.min_score_to_pass)
     passed: Optional[bool]
     if requires_manual_review:
         passed = None
     else:
         passed = score_percent >= min_score
 
-    submission = FormSubmissionORM(
-        form_id=form.id,
-        user_id=user.user_id,
-        submitted_at=datetime.now(timezone.utc),
-        score=Decimal(str(round(score_percent, 2))),
-        passed=passed,
-        duration_seconds=payload.duration_seconds,
-    )
-    submission.answers = answer_entities
-    db.add(submission)
-    db.flush()
-    db.commit()
+    # Submission, answers and item progress are written in one transaction:
+    # one INSERT for the submission and one multi-row INSERT for its answers.
+    submission_id = db.execute(
+        insert(FormSubmissionORM)
+        .values(
+            form_id=answer_key.form_id,
+            user_id=user.user_id,
+            submitted_at=datetime.now(timezone.utc),
+            score=Decimal(str(round(score_percent, 2))),
+            passed=passed,
+            duration_seconds=payload.duration_seconds,
+        )
+        .returning(FormSubmissionORM.id)
+    ).scalar_one()
+    if answer_rows:
+        db.execute(
+            insert(FormAnswerORM).values(
+                [dict(row, submission_id=submission_id) for row in answer_rows]
+            )
+        )
 
     if passed is True:
         UserProgressRepository(db).upsert_item_progress(
@@ -585,11 +528,13 @@ def submit_form(trail_id: int, item_id: int):
             item.id,
             "COMPLETED",
             trail_id=item.trail_id,
-            last_passed_submission_id=submission.id,
+            last_passed_submission_id=submission_id,
+            commit=False,
         )
+    db.commit()
 
     response_body = FormSubmissionOut(
-        submission_id=submission.id,
+        submission_id=submission_id,
         score=round(score_percent, 2),
         score_points=round(score_points, 2),
         max_points=round(max_points, 2),
@@ -601,8 +546,7 @@ def submit_form(trail_id: int, item_id: int):
     return jsonify(response_body.model_dump(mode="json"))
 
 
-def _has_response(answer: FormAnswerIn, question: FormQuestionORM) -> bool:
-    q_type = _question_type_code(question)
-    if q_type == "ESSAY":
+def _has_response(answer: FormAnswerIn, question: QuestionKey) -> bool:
+    if question.kind == "ESSAY":
         return bool(answer.answer_text and answer.answer_text.strip())
     return answer.selected_option_id is not None
@@ -4,18 +4,26 @@ from typing import List, Optional, Literal
 import math
 
 from flask import Blueprint, jsonify, abort, request
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy.orm import selectinload
 
 from werkzeug.exceptions import Unauthorized
 
 from app.core.db import get_db
+from app.core.query_budget import route_query_budget
 from app.models.trail_items import TrailItems as TrailItemsORM
 from app.models.user_item_progress import UserItemProgress as UserItemProgressORM
 from app.repositories.TrailsRepository import TrailsRepository
 from app.repositories.UserProgressRepository import UserProgressRepository
 from app.repositories.UserTrailsRepository import UserTrailsRepository
+from app.services.progress_buffer import (
+    ProgressEvent,
+    get_progress_coalescer,
+    max_buffer_lag,
+)
+from app.services.request_limits import rate_limit
 from app.services.security import get_current_user, enforce_csrf, get_current_user_id
+from app.services.trail_outline import get_trail_outline
 from app.routes import format_validation_error
 
 
@@ -28,6 +36,7 @@ class TrailOut(BaseModel):
     id: int
     name: str
     thumbnail_url: Optional[str] = None
+    thumbnail_variants: Optional[dict] = None
     author: Optional[str] = None
     review: Optional[float] = None
     review_count: Optional[int] = None
@@ -73,21 +82,20 @@ class TextValOut(BaseModel):
     text_val: str
 
 
-def _build_locked_response(blocked_item: dict):
+def _locked_payload(blocked_item: dict) -> dict:
     title = (blocked_item.get("title") or "").strip()
-    return (
-        jsonify(
-            {
-                "detail": "Conclua o item obrigatório antes de prosseguir.",
-                "reason": "item_locked",
-                "blocked_item": {
-                    "id": blocked_item.get("id"),
-                    "title": title,
-                },
-            }
-        ),
-        423,
-    )
+    return {
+        "detail": "Conclua o item obrigatório antes de prosseguir.",
+        "reason": "item_locked",
+        "blocked_item": {
+            "id": blocked_item.get("id"),
+            "title": title,
+        },
+    }
+
+
+def _build_locked_response(blocked_item: dict):
+    return jsonify(_locked_payload(blocked_item)), 423
 
 
 def _parse_positive_int(value: str | None, default: int, *, minimum: int = 1) -> int:
@@ -148,6 +156,7 @@ def get_trails_showcase():
 
 
 @bp.get("/")
+@route_query_budget(8)
 def get_trails():
     db = get_db()
     repo = TrailsRepository(db)
@@ -191,6 +200,7 @@ class ReviewPayload(BaseModel):
 
 
 @bp.post("/<int:trail_id>/reviews")
+@rate_limit(10, 60)
 def submit_trail_review(trail_id: int):
     enforce_csrf()
     user = get_current_user()
@@ -347,7 +357,68 @@ class ItemProgressIn(BaseModel):
     progress_value: int | None = None  # % ou segundos, escolha um padrão
 
 
+def _check_item_progress(
+    item: TrailItemsORM,
+    status: str,
+    progress_value: int | None,
+    existing_seconds: int,
+    *,
+    is_privileged: bool,
+    lag_allowance: int = 0,
+) -> tuple[int | None, tuple[dict, int] | None]:
+    """Apply the watch-time rules to one report.
+
+    ``lag_allowance`` widens the skip-ahead window by how far ``existing_seconds``
+    may trail the learner while heartbeats sit in another worker's buffer.
+    Returns the value to persist and, when the report is refused, the error
+    payload with its HTTP status.
+    """
+
+    item_type = item.type.code if item.type is not None else "DOC"
+    if item_type != "VIDEO":
+        return progress_value, None
+
+    duration_seconds = item.duration_seconds or 0
+    required_percentage = getattr(item, "required_percentage", None) or 70
+
+    reported_seconds = max(0, progress_value or 0)
+    effective_seconds = max(existing_seconds, reported_seconds)
+    if duration_seconds:
+        effective_seconds = min(effective_seconds, duration_seconds)
+
+    if not is_privileged:
+        skip_ahead_window = (
+            max(30, int(duration_seconds * 0.1)) if duration_seconds else 30
+        ) + lag_allowance
+        if reported_seconds > existing_seconds:
+            delta = reported_seconds - existing_seconds
+            if delta > skip_ahead_window and status != "COMPLETED":
+                return None, (
+                    {
+                        "detail": "Você não pode adiantar o vídeo. Assista na ordem para registrar o progresso.",
+                        "reason": "skip_ahead_blocked",
+                    },
+                    403,
+                )
+
+        if status == "COMPLETED" and duration_seconds:
+            required_seconds = math.ceil(duration_seconds * (required_percentage / 100))
+            tolerance = max(5, int(duration_seconds * 0.05))
+            target = min(required_seconds, duration_seconds)
+            if effective_seconds + tolerance < target:
+                return None, (
+                    {
+                        "detail": "Finalize o vídeo antes de marcar como concluído.",
+                        "reason": "insufficient_watch_time",
+                    },
+                    422,
+                )
+
+    return effective_seconds, None
+
+
 @bp.put("/<int:trail_id>/items/<int:item_id>/progress")
+@rate_limit(120, 60)
 def set_item_progress(trail_id: int, item_id: int):
     data = request.get_json(silent=True) or {}
     try:
@@ -373,10 +444,6 @@ def set_item_progress(trail_id: int, item_id: int):
     if blocker:
         return _build_locked_response(blocker)
 
-    item_type = item.type.code if item.type is not None else "DOC"
-    duration_seconds = item.duration_seconds or 0
-    required_percentage = getattr(item, "required_percentage", None) or 70
-
     # progresso anterior registrado
     existing_progress = (
         db.query(UserItemProgressORM)
@@ -389,45 +456,23 @@ def set_item_progress(trail_id: int, item_id: int):
     existing_seconds = 0
     if existing_progress and existing_progress.progress_value is not None:
         existing_seconds = max(0, existing_progress.progress_value)
-
-    reported_seconds = max(0, body.progress_value or 0)
-    effective_seconds = max(existing_seconds, reported_seconds)
-    if duration_seconds:
-        effective_seconds = min(effective_seconds, duration_seconds)
-
-    is_privileged = user.role_code in {"Admin", "Manager"}
-
-    if item_type == "VIDEO" and not is_privileged:
-        skip_ahead_window = (
-            max(30, int(duration_seconds * 0.1)) if duration_seconds else 30
-        )
-        if reported_seconds > existing_seconds:
-            delta = reported_seconds - existing_seconds
-            if delta > skip_ahead_window and body.status != "COMPLETED":
-                return (
-                    jsonify(
-                        {
-                            "detail": "Você não pode adiantar o vídeo. Assista na ordem para registrar o progresso.",
-                            "reason": "skip_ahead_blocked",
-                        }
-                    ),
-                    403,
-                )
-
-        if body.status == "COMPLETED" and duration_seconds:
-            required_seconds = math.ceil(duration_seconds * (required_percentage / 100))
-            tolerance = max(5, int(duration_seconds * 0.05))
-            target = min(required_seconds, duration_seconds)
-            if effective_seconds + tolerance < target:
-                return (
-                    jsonify(
-                        {
-                            "detail": "Finalize o vídeo antes de marcar como concluído.",
-                            "reason": "insufficient_watch_time",
-                        }
-                    ),
-                    422,
-                )
+    coalescer = get_progress_coalescer()
+    if coalescer is not None:
+        buffered = coalescer.buffered_value(user.user_id, item_id)
+        if buffered is not None:
+            existing_seconds = max(existing_seconds, buffered)
+
+    stored_value, rejection = _check_item_progress(
+        item,
+        body.status,
+        body.progress_value,
+        existing_seconds,
+        is_privileged=user.role_code in {"Admin", "Manager"},
+        lag_allowance=math.ceil(max_buffer_lag()),
+    )
+    if rejection:
+        payload, status_code = rejection
+        return jsonify(payload), status_code
 
     user_trails_repo.ensure_enrollment(user.user_id, trail_id)
     progress_repo = UserProgressRepository(db)
@@ -435,9 +480,7 @@ def set_item_progress(trail_id: int, item_id: int):
         user.user_id,
         item_id,
         body.status,
-        progress_value=(
-            effective_seconds if item_type == "VIDEO" else body.progress_value
-        ),
+        progress_value=stored_value,
         trail_id=trail_id,
     )
     progress_snapshot = (
@@ -469,3 +512,162 @@ def set_item_progress(trail_id: int, item_id: int):
             "sections_progress": sections_snapshot,
         }
     )
+
+
+PROGRESS_BATCH_MAX_EVENTS = 200
+
+
+class ProgressEventIn(ItemProgressIn):
+    item_id: int
+
+
+class ProgressBatchIn(BaseModel):
+    events: List[ProgressEventIn] = Field(
+        ..., min_length=1, max_length=PROGRESS_BATCH_MAX_EVENTS
+    )
+
+
+@bp.post("/progress/batch")
+@rate_limit(60, 60)
+def set_items_progress_batch():
+    """Ingest many progress reports (e.g. video heartbeats) in one call.
+
+    Events are validated in order with the same rules as the single-item
+    endpoint; refused events are reported back instead of failing the batch.
+    Accepted events are written with one multi-row upsert and trail progress
+    is recomputed once per affected trail. When ``PROGRESS_COALESCE_SECONDS``
+    is set, IN_PROGRESS heartbeats are buffered and merged in memory first.
+    """
+
+    data = request.get_json(silent=True) or {}
+    try:
+        body = ProgressBatchIn.model_validate(data)
+    except ValidationError as exc:
+        return jsonify({"detail": format_validation_error(exc)}), 422
+
+    enforce_csrf()
+    user = get_current_user()
+    db = get_db()
+    user_trails_repo = UserTrailsRepository(db)
+    coalescer = get_progress_coalescer()
+
+    item_ids = {event.item_id for event in body.events}
+    items = {
+        item.id: item
+        for item in db.query(TrailItemsORM)
+        .options(selectinload(TrailItemsORM.type))
+        .filter(TrailItemsORM.id.in_(item_ids))
+        .all()
+    }
+    seconds = {
+        item_id: max(0, value or 0)
+        for item_id, value in db.query(
+            UserItemProgressORM.trail_item_id, UserItemProgressORM.progress_value
+        )
+        .filter(
+            UserItemProgressORM.user_id == user.user_id,
+            UserItemProgressORM.trail_item_id.in_(item_ids),
+        )
+        .all()
+    }
+    if coalescer is not None:
+        for item_id in item_ids:
+            buffered = coalescer.buffered_value(user.user_id, item_id)
+            if buffered is not None:
+                seconds[item_id] = max(seconds.get(item_id, 0), buffered)
+
+    trail_ids = {item.trail_id for item in items.values()}
+    required_ids = {
+        outline_item.id
+        for trail_id in trail_ids
+        for outline_item in get_trail_outline(db, trail_id).items
+        if outline_item.requires_completion
+    }
+    completed_ids = user_trails_repo.completed_item_ids(user.user_id, required_ids)
+    is_privileged = user.role_code in {"Admin", "Manager"}
+    lag_allowance = math.ceil(max_buffer_lag())
+
+    accepted: List[ProgressEvent] = []
+    rejected: List[dict] = []
+    for index, event in enumerate(body.events):
+        item = items.get(event.item_id)
+        if item is None:
+            rejected.append(
+                {
+                    "index": index,
+                    "item_id": event.item_id,
+                    "detail": "Item não encontrado na trilha",
+                    "reason": "not_found",
+                }
+            )
+            continue
+
+        blocker = user_trails_repo.find_blocking_item(
+            user.user_id, item.trail_id, item.id, completed_ids=completed_ids
+        )
+        if blocker:
+            rejected.append(
+                {"index": index, "item_id": item.id, **_locked_payload(blocker)}
+            )
+            continue
+
+        stored_value, rejection = _check_item_progress(
+            item,
+            event.status,
+            event.progress_value,
+            seconds.get(item.id, 0),
+            is_privileged=is_privileged,
+            lag_allowance=lag_allowance,
+        )
+        if rejection:
+            payload, _status_code = rejection
+            rejected.append({"index": index, "item_id": item.id, **payload})
+            continue
+
+        if stored_value is not None:
+            seconds[item.id] = max(seconds.get(item.id, 0), stored_value)
+        if event.status == "COMPLETED":
+            completed_ids.add(item.id)
+        accepted.append(
+            ProgressEvent(
+                user_id=user.user_id,
+                trail_id=item.trail_id,
+                item_id=item.id,
+                status=event.status,
+                progress_value=stored_value,
+            )
+        )
+
+    buffered = 0
+    to_write = accepted
+    if coalescer is not None:
+        to_write = [event for event in accepted if event.status == "COMPLETED"]
+        for event in accepted:
+            if event.status != "COMPLETED":
+                coalescer.add(event)
+                buffered += 1
+        if to_write:
+            # A completion changes trail progress, so release everything the
+            # learner has pending together with it.
+            to_write = coalescer.drain_user(user.user_id) + to_write
+        to_write += coalescer.drain_due()
+
+    affected_trails = {event.trail_id for event in accepted}
+    for trail_id in sorted(affected_trails):
+        user_trails_repo.ensure_enrollment(user.user_id, trail_id)
+
+    written = UserProgressRepository(db).upsert_progress_batch(to_write)
+    progress = user_trails_repo.get_progress_map_for_user(user.user_id, affected_trails)
+
+    return jsonify(
+        {
+            "ok": True,
+            "accepted": len(accepted),
+            "buffered": buffered,
+            "written": written,
+            "rejected": rejected,
+            "progress": {
+                str(trail_id): snapshot for trail_id, snapshot in progress.items()
+            },
+        }
+    )
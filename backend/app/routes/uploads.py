@@ -1,12 +1,26 @@
 from __future__ import annotations
 
 from flask import Blueprint, g, jsonify, request
-
-from app.services.media import build_media_url, save_document_file, save_image
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.services.media import (
+    DOCUMENT_TOO_LARGE_MESSAGE,
+    IMAGE_TOO_LARGE_MESSAGE,
+    MAX_DOCUMENT_UPLOAD_BYTES,
+    MAX_IMAGE_UPLOAD_BYTES,
+    build_media_url,
+    discard_pending_uploads,
+    expect_upload,
+    save_document_file,
+    save_image,
+)
+from app.services.image_derivatives import schedule_image_derivatives
+from app.services.request_limits import limit_blueprint
 from app.services.security import enforce_csrf, require_roles
 
 
 uploads_bp = Blueprint("uploads", __name__, url_prefix="/admin/uploads")
+limit_blueprint(uploads_bp, 60, 60)
 
 
 @uploads_bp.before_request
@@ -17,22 +31,42 @@ def ensure_admin():
     return None
 
 
+# Spools not moved into place by the handler are removed at the end of the request.
+uploads_bp.teardown_request(discard_pending_uploads)
+
+
+def _too_large(message: str):
+    return jsonify({"detail": message}), 413
+
+
 def _handle_image_upload(subdir: str):
     enforce_csrf()
-    file = request.files.get("file")
+    if not expect_upload(MAX_IMAGE_UPLOAD_BYTES):
+        return _too_large(IMAGE_TOO_LARGE_MESSAGE)
+    try:
+        file = request.files.get("file")
+    except RequestEntityTooLarge:
+        return _too_large(IMAGE_TOO_LARGE_MESSAGE)
     if not file:
         return jsonify({"detail": "Envie um arquivo de imagem."}), 400
     try:
         relative_path = save_image(file, subdir)
     except ValueError as exc:
         return jsonify({"detail": str(exc)}), 400
+    schedule_image_derivatives(relative_path)
     url = build_media_url(relative_path, external=True)
     return jsonify({"path": relative_path, "url": url}), 201
 
 
-def _handle_document_upload(subdir: str):
+def _handle_document_upload():
     enforce_csrf()
-    file = request.files.get("file")
+    if not expect_upload(MAX_DOCUMENT_UPLOAD_BYTES):
+        return _too_large(DOCUMENT_TOO_LARGE_MESSAGE)
+    try:
+        file = request.files.get("file")
+    except RequestEntityTooLarge:
+        return _too_large(DOCUMENT_TOO_LARGE_MESSAGE)
+    subdir = request.form.get("subdir", "documents")
     if not file:
         return jsonify({"detail": "Envie um arquivo de documento."}), 400
     try:
@@ -55,5 +89,4 @@ def upload_trail_thumbnail():
 
 @uploads_bp.post("/documents")
 def upload_document():
-    subdir = request.form.get("subdir", "documents")
-    return _handle_document_upload(subdir)
+    return _handle_document_upload()
@@ -6,7 +6,10 @@ from flask import Blueprint, jsonify
 from pydantic import BaseModel
 
 from app.core.db import get_db
+from app.core.query_budget import route_query_budget
+from app.models.users import User
 from app.repositories.UserTrailsRepository import UserTrailsRepository
+from app.services.request_limits import rate_limit
 from app.services.security import get_current_user, enforce_csrf
 from app.services.security import get_current_user_id
 from app.services.email import send_trail_enrollment_email
@@ -52,6 +55,7 @@ class TrailOverviewOut(BaseModel):
     trail_id: int
     name: str
     thumbnail_url: Optional[str] = None
+    thumbnail_variants: Optional[dict] = None
     author: Optional[str] = None
     status: Optional[str] = None
     progress: ProgressOut
@@ -63,6 +67,7 @@ class OverviewOut(BaseModel):
 
 
 @bp.get("/me/overview")
+@route_query_budget(9)
 def get_user_overview():
     user_id = get_current_user_id()
     db = get_db()
@@ -90,6 +95,7 @@ def get_user_overview():
                 trail_id=item["trail_id"],
                 name=item["name"],
                 thumbnail_url=item["thumbnail_url"],
+                thumbnail_variants=item.get("thumbnail_variants"),
                 author=item.get("author"),
                 status=progress_model.status or raw_status or None,
                 progress=progress_model,
@@ -168,6 +174,7 @@ def get_sections_progress(trail_id: int):
 
 
 @bp.post("/<int:trail_id>/enroll")
+@rate_limit(30, 60)
 def enroll_in_trail(trail_id: int):
     enforce_csrf()
     user = get_current_user()
@@ -176,10 +183,12 @@ def enroll_in_trail(trail_id: int):
     _, created = repo.ensure_enrollment(user.user_id, trail_id)
     if created:
         trail = TrailsRepository(db).get_trail(trail_id)
-        if trail:
+        # CurrentUser is a slim projection; the greeting needs the full row.
+        profile = db.get(User, user.user_id)
+        if trail and profile:
             send_trail_enrollment_email(
-                email=user.email,
-                name=user.name_for_certificate,
+                email=profile.email,
+                name=profile.name_for_certificate,
                 trail_name=trail.name,
             )
     progress = repo.get_progress_for_user(user.user_id, trail_id) or {
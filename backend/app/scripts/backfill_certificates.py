@@ -1,51 +1,137 @@
 """Backfill certificates for trails já concluídas.
 
 Executar após deploy da feature de certificados para gerar hashes para estudantes
-que terminaram cursos no passado.
+que terminaram cursos no passado. Processa as matrículas concluídas sem certificado
+em lotes (ordenados por ``user_trails.id``), com um ``INSERT`` multi-linha e um
+commit por lote. Se for interrompido, retome com ``--resume-from <último id>``
+exibido no progresso.
+
+Uso:
+    python -m app.scripts.backfill_certificates [--batch-size 1000] [--dry-run]
+        [--resume-from ID]
 """
 
-from sqlalchemy import select
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
 
 # Importa modelos que têm relationships declaradas por string (TrailItems -> LkItemType).
 # Sem esses imports, o SQLAlchemy não encontra as classes durante o mapeamento.
 import app.models  # noqa: F401  # load all models for relationship resolution
 
+from sqlalchemy.orm import Session
+
 from app.core.db import session_scope
-from app.models.user_trails import UserTrails
-from app.models.lk_enrollment_status import LkEnrollmentStatus
-from app.repositories.UserTrailsRepository import UserTrailsRepository
+from app.repositories.CertificatesRepository import CertificatesRepository
+from app.services.lookups import ENROLLMENT_STATUS, lookups
 
 
-def main() -> None:
-    with session_scope() as session:
-        repo = UserTrailsRepository(session)
-
-        completed_status_id = session.execute(
-            select(LkEnrollmentStatus.id).where(LkEnrollmentStatus.code == "COMPLETED")
-        ).scalar_one_or_none()
-        if completed_status_id is None:
-            print("Nenhum status COMPLETED encontrado; nada para fazer.")
-            return
-
-        completeds = (
-            session.query(UserTrails)
-            .filter(UserTrails.status_id == completed_status_id)
-            .all()
-        )
+@dataclass
+class BackfillStats:
+    scanned: int = 0
+    inserted: int = 0
+    batches: int = 0
+    last_id: int = 0
+    elapsed: float = 0.0
 
-        if not completeds:
-            print("Nenhuma trilha concluída pendente de certificado.")
-            return
+    @property
+    def rate(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed else 0.0
 
-        processed = 0
-        for ut in completeds:
-            repo.sync_user_trail_progress(ut.user_id, ut.trail_id)
-            processed += 1
 
+def backfill(
+    session: Session,
+    *,
+    batch_size: int = 1000,
+    resume_from: int = 0,
+    dry_run: bool = False,
+    log=print,
+) -> BackfillStats:
+    repo = CertificatesRepository(session)
+    stats = BackfillStats(last_id=resume_from)
+
+    completed_status_id = lookups.id_for(session, ENROLLMENT_STATUS, "COMPLETED")
+    if completed_status_id is None:
+        log("Nenhum status COMPLETED encontrado; nada para fazer.")
+        return stats
+
+    if dry_run:
+        stats.scanned = repo.count_missing_for_status(completed_status_id)
+        log(f"[dry-run] {stats.scanned} matrículas concluídas sem certificado.")
+        return stats
+
+    started = time.perf_counter()
+    while True:
+        batch = repo.missing_for_status(
+            completed_status_id, after_id=stats.last_id, limit=batch_size
+        )
+        if not batch:
+            break
+        stats.inserted += repo.insert_missing(
+            [(user_id, trail_id) for _ut_id, user_id, trail_id in batch]
+        )
         session.commit()
-        print(
-            f"Certificados verificados/gerados para {processed} matrículas concluídas."
+
+        stats.scanned += len(batch)
+        stats.batches += 1
+        stats.last_id = batch[-1][0]
+        stats.elapsed = time.perf_counter() - started
+        log(
+            f"Lote {stats.batches}: {stats.inserted} certificados gerados, "
+            f"último user_trails.id={stats.last_id} ({stats.rate:.0f} matrículas/s)"
+        )
+        if len(batch) < batch_size:
+            break
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Matrículas por lote/commit (default: 1000).",
+    )
+    parser.add_argument(
+        "--resume-from",
+        type=int,
+        default=0,
+        help="Continua a partir deste user_trails.id (exclusivo).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Apenas conta as matrículas pendentes, sem gravar nada.",
+    )
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size deve ser >= 1")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    with session_scope() as session:
+        stats = backfill(
+            session,
+            batch_size=args.batch_size,
+            resume_from=args.resume_from,
+            dry_run=args.dry_run,
         )
+    if args.dry_run:
+        return
+    if not stats.scanned:
+        print("Nenhuma trilha concluída pendente de certificado.")
+        return
+    print(
+        f"Certificados gerados para {stats.inserted} de {stats.scanned} matrículas "
+        f"concluídas em {stats.elapsed:.1f}s ({stats.rate:.0f} matrículas/s)."
+    )
 
 
 if __name__ == "__main__":
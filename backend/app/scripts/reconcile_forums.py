@@ -0,0 +1,28 @@
+"""Garante a infraestrutura dos fóruns fora do caminho das requisições.
+
+Cria as tabelas de fórum caso ainda não existam, o fórum geral e os fóruns das
+trilhas que ficaram sem fórum (ex.: trilhas inseridas direto no banco). Novas
+trilhas já ganham fórum automaticamente na criação; rode este comando uma vez
+após o deploy ou quando suspeitar de divergência.
+"""
+
+# Importa modelos que têm relationships declaradas por string.
+import app.models  # noqa: F401  # load all models for relationship resolution
+
+from app.core.db import session_scope
+from app.repositories.ForumsRepository import ForumsRepository
+from app.services.forum_bootstrap import ensure_forum_tables
+
+
+def main() -> None:
+    ensure_forum_tables()
+    with session_scope() as session:
+        repo = ForumsRepository(session)
+        repo.ensure_general_forum()
+        created = repo.ensure_trail_forums()
+        session.commit()
+        print(f"Fórum geral verificado; {created} fóruns de trilha criados.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Recalcula o progresso das matrículas a partir dos itens concluídos.
+
+Com ``PROGRESS_AGGREGATION_MODE=incremental`` cada conclusão de item apenas soma
+no contador ``user_trails.done_items``; este script corrige qualquer divergência
+(itens adicionados ou removidos da trilha, escritas concorrentes, alterações
+feitas direto no banco) e semeia o contador em matrículas antigas. Agende-o
+periodicamente (ex.: cron a cada hora). Processa os alunos em lotes ordenados
+por ``user_id``, com um commit por lote.
+
+Uso:
+    python -m app.scripts.reconcile_progress [--batch-size 500]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+# Importa modelos que têm relationships declaradas por string (TrailItems -> LkItemType).
+import app.models  # noqa: F401  # load all models for relationship resolution
+
+from sqlalchemy.orm import Session
+
+from app.core.db import session_scope
+from app.models.user_trails import UserTrails as UserTrailsORM
+from app.repositories.UserTrailsRepository import UserTrailsRepository
+
+
+@dataclass
+class ReconcileStats:
+    users: int = 0
+    enrollments: int = 0
+    repaired: int = 0
+    elapsed: float = 0.0
+
+
+def reconcile(session: Session, *, batch_size: int = 500, log=print) -> ReconcileStats:
+    repo = UserTrailsRepository(session)
+    stats = ReconcileStats()
+    started = time.perf_counter()
+    last_user_id = 0
+
+    while True:
+        user_ids = [
+            user_id
+            for (user_id,) in session.query(UserTrailsORM.user_id)
+            .filter(UserTrailsORM.user_id > last_user_id)
+            .group_by(UserTrailsORM.user_id)
+            .order_by(UserTrailsORM.user_id)
+            .limit(batch_size)
+            .all()
+        ]
+        if not user_ids:
+            break
+
+        before = {}
+        trails_by_user: dict[int, list[int]] = defaultdict(list)
+        for user_id, trail_id, done_items in session.query(
+            UserTrailsORM.user_id, UserTrailsORM.trail_id, UserTrailsORM.done_items
+        ).filter(UserTrailsORM.user_id.in_(user_ids)):
+            before[(user_id, trail_id)] = done_items
+            trails_by_user[user_id].append(trail_id)
+
+        for user_id, trail_ids in trails_by_user.items():
+            counts = repo.sync_progress_for_trails(user_id, trail_ids)
+            for trail_id in trail_ids:
+                _total, done = counts.get(trail_id, (0, 0))
+                if before[(user_id, trail_id)] != done:
+                    stats.repaired += 1
+        session.commit()
+
+        stats.users += len(user_ids)
+        stats.enrollments += len(before)
+        last_user_id = user_ids[-1]
+        stats.elapsed = time.perf_counter() - started
+        log(
+            f"{stats.users} alunos / {stats.enrollments} matrículas verificadas, "
+            f"{stats.repaired} corrigidas (último user_id={last_user_id})"
+        )
+        if len(user_ids) < batch_size:
+            break
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Alunos por lote/commit (default: 500).",
+    )
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error("--batch-size deve ser >= 1")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    with session_scope() as session:
+        stats = reconcile(session, batch_size=args.batch_size)
+    print(
+        f"Progresso reconciliado: {stats.repaired} de {stats.enrollments} matrículas "
+        f"corrigidas em {stats.elapsed:.1f}s."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""Recalcula os contadores desnormalizados dos fóruns.
+
+Executar após aplicar as colunas ``topics_count``/``posts_count``/``last_*`` em um
+banco existente, ou sempre que houver suspeita de divergência (ex.: exclusões
+feitas direto no banco).
+"""
+
+# Importa modelos que têm relationships declaradas por string.
+import app.models  # noqa: F401  # load all models for relationship resolution
+
+from app.core.db import session_scope
+from app.repositories.ForumsRepository import ForumsRepository
+
+
+def main() -> None:
+    with session_scope() as session:
+        forums_updated, topics_updated = ForumsRepository(session).rebuild_counters()
+        session.commit()
+        print(
+            f"Contadores recalculados para {forums_updated} fóruns e "
+            f"{topics_updated} tópicos."
+        )
+
+
+if __name__ == "__main__":
+    main()
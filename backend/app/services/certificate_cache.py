@@ -0,0 +1,284 @@
+"""Shared render cache for public certificate payloads and QR code images."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Protocol
+
+import segno
+
+from app.core.settings import settings
+from app.services.local_cache import LocalCache
+
+try:  # pragma: no cover - redis é opcional
+    from redis import from_url
+    from redis.exceptions import RedisError
+except ModuleNotFoundError:  # pragma: no cover - redis é opcional
+    from_url = None  # type: ignore[assignment]
+
+    class RedisError(Exception):
+        """Fallback exception when redis is unavailable."""
+
+
+LOGGER = logging.getLogger(__name__)
+
+_PAYLOAD_PREFIX = "cert:payload:"
+_QR_PREFIX = "cert:qr:"
+
+
+class CertificateCacheBackend(Protocol):
+    def get(self, key: str) -> Optional[str]: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+    def delete_many(self, keys: Iterable[str]) -> None: ...
+
+
+class MemoryCertificateCache:
+    """Per-process LRU; the default when no shared store is configured."""
+
+    def __init__(self, *, max_entries: int, ttl_seconds: float) -> None:
+        self._cache: LocalCache[str, str] = LocalCache(
+            max_entries=max_entries, ttl_seconds=ttl_seconds
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        self._cache.set(key, value)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._cache.pop(key)
+
+
+class DiskCertificateCache:
+    """Content-addressed files shared by every worker on the same host.
+
+    Every few writes the store is swept: expired files are removed and, past
+    ``max_entries``, the least recently written ones go first.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        *,
+        ttl_seconds: float,
+        max_entries: Optional[int] = None,
+    ) -> None:
+        self._root = Path(directory)
+        self._ttl = float(ttl_seconds)
+        self._max_entries = max_entries
+        self._sweep_every = max(1, max_entries // 8) if max_entries else 256
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self._root / digest[:2] / digest
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            if self._ttl and path.stat().st_mtime + self._ttl <= time.time():
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a sibling temp file and rename so readers never see a
+            # partially written entry.
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                handle.write(value)
+            os.replace(tmp_name, path)
+        except OSError as exc:
+            LOGGER.warning("Falha ao gravar cache de certificado em disco: %s", exc)
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes >= self._sweep_every
+            if due:
+                self._writes = 0
+        if due:
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Remove expired entries and the oldest ones beyond ``max_entries``."""
+
+        now = time.time()
+        removed = 0
+        live: list[tuple[float, Path]] = []
+        for path in self._root.glob("??/*"):
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            if path.name.startswith(".tmp-"):
+                # Leftovers of interrupted writes.
+                if mtime + 3600 <= now:
+                    path.unlink(missing_ok=True)
+                continue
+            if self._ttl and mtime + self._ttl <= now:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                live.append((mtime, path))
+        if self._max_entries and len(live) > self._max_entries:
+            live.sort()
+            for _, path in live[: len(live) - self._max_entries]:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._path(key).unlink(missing_ok=True)
+
+
+class RedisCertificateCache:
+    """Redis-backed cache shared across hosts; errors degrade to cache misses."""
+
+    def __init__(self, client, *, ttl_seconds: int) -> None:
+        self._client = client
+        self._ttl = int(ttl_seconds)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self._client.get(key)
+        except RedisError as exc:
+            LOGGER.warning("Falha ao ler cache de certificado no Redis: %s", exc)
+            return None
+        if value is None:
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str) -> None:
+        try:
+            self._client.set(key, value, ex=self._ttl or None)
+        except RedisError as exc:
+            LOGGER.warning("Falha ao gravar cache de certificado no Redis: %s", exc)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        try:
+            self._client.delete(*keys)
+        except RedisError as exc:
+            LOGGER.warning("Falha ao invalidar cache de certificado no Redis: %s", exc)
+
+
+def build_certificate_cache() -> CertificateCacheBackend:
+    backend = settings.certificate_cache_backend
+    ttl = settings.certificate_cache_ttl_seconds
+    if backend == "redis":
+        if settings.redis_url and from_url is not None:
+            try:
+                client = from_url(settings.redis_url, decode_responses=False)
+                return RedisCertificateCache(client, ttl_seconds=ttl)
+            except RedisError as exc:
+                LOGGER.warning(
+                    "Falha ao inicializar Redis para cache de certificados; "
+                    "usando memória local",
+                    exc_info=exc,
+                )
+        else:
+            LOGGER.warning(
+                "CERTIFICATE_CACHE_BACKEND=redis sem Redis disponível; "
+                "usando cache em memória"
+            )
+    elif backend == "disk":
+        return DiskCertificateCache(
+            settings.certificate_cache_dir,
+            ttl_seconds=ttl,
+            max_entries=settings.certificate_cache_max_entries,
+        )
+    return MemoryCertificateCache(
+        max_entries=settings.certificate_cache_max_entries, ttl_seconds=ttl
+    )
+
+
+_backend: CertificateCacheBackend = build_certificate_cache()
+
+
+def set_certificate_cache(backend: CertificateCacheBackend) -> None:
+    global _backend
+    _backend = backend
+
+
+def reset_certificate_cache() -> None:
+    set_certificate_cache(build_certificate_cache())
+
+
+def _payload_key(certificate_hash: str) -> str:
+    return _PAYLOAD_PREFIX + certificate_hash.strip().lower()
+
+
+def get_certificate_payload(certificate_hash: str) -> Optional[dict]:
+    """User-facing certificate fields (everything except request-bound URLs)."""
+
+    raw = _backend.get(_payload_key(certificate_hash))
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def store_certificate_payload(certificate_hash: str, payload: dict) -> None:
+    _backend.set(_payload_key(certificate_hash), json.dumps(payload))
+
+
+def invalidate_certificates(certificate_hashes: Iterable[str]) -> None:
+    _backend.delete_many(_payload_key(value) for value in certificate_hashes)
+
+
+def _render_qr(payload: str) -> str:
+    qr = segno.make(payload, error="m")
+    buf = io.BytesIO()
+    qr.save(buf, kind="png", scale=6)
+    encoded = base64.b64encode(buf.getvalue()).decode("ascii")
+    return f"data:image/png;base64,{encoded}"
+
+
+def qr_data_uri(payload: str) -> str:
+    # The QR only encodes the verification URL, so it is addressed by content
+    # and never needs invalidation.
+    key = _QR_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    cached = _backend.get(key)
+    if cached is not None:
+        return cached
+    data_uri = _render_qr(payload)
+    _backend.set(key, data_uri)
+    return data_uri
+
+
+__all__ = [
+    "DiskCertificateCache",
+    "MemoryCertificateCache",
+    "RedisCertificateCache",
+    "build_certificate_cache",
+    "get_certificate_payload",
+    "invalidate_certificates",
+    "qr_data_uri",
+    "reset_certificate_cache",
+    "set_certificate_cache",
+    "store_certificate_payload",
+]
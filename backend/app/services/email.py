@@ -1,13 +1,13 @@
 from __future__ import annotations
 
 import logging
-import smtplib
 from email.message import EmailMessage
 from email.utils import formataddr
 from typing import Iterable
 from urllib.parse import urljoin
 
 from app.core.settings import settings
+from app.services.email_queue import get_email_queue, smtp_connection
 
 
 logger = logging.getLogger(__name__)
@@ -130,14 +130,18 @@ def send_email(
     message.set_content(text_version)
     message.add_alternative(html_body, subtype="html")
 
+    if settings.email_queue_workers > 0:
+        # Delivery happens on background workers; the request only pays for
+        # writing the message to the spool.
+        try:
+            get_email_queue().enqueue(message)
+        except OSError as exc:
+            logger.exception("Falha ao enfileirar email '%s': %s", subject, exc)
+            return False
+        return True
+
     try:
-        with smtplib.SMTP(
-            settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout
-        ) as server:
-            if settings.smtp_starttls:
-                server.starttls()
-            if settings.smtp_user:
-                server.login(settings.smtp_user, settings.smtp_password or "")
+        with smtp_connection() as server:
             server.send_message(message)
             logger.info("Email '%s' enviado para %s", subject, ", ".join(recipients))
             return True
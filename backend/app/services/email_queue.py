@@ -0,0 +1,366 @@
+"""Background SMTP delivery: spooled queue, pooled connections and retries."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import re
+import smtplib
+import tempfile
+import threading
+import time
+import uuid
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+INFLIGHT = "inflight"
+FAILED = "failed"
+
+# ``<job id>.<attempt>.eml``; anything else in pending/ is not ours to send.
+_PENDING_NAME = re.compile(r"^[0-9a-f]{32}\.[1-9][0-9]*\.eml$")
+
+
+def smtp_connection() -> smtplib.SMTP:
+    """Open an authenticated connection using the ``SMTP_*`` settings."""
+
+    server = smtplib.SMTP(
+        settings.smtp_host, settings.smtp_port, timeout=settings.smtp_timeout
+    )
+    try:
+        if settings.smtp_starttls:
+            server.starttls()
+        if settings.smtp_user:
+            server.login(settings.smtp_user, settings.smtp_password or "")
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _is_connection_error(exc: BaseException) -> bool:
+    # SMTPException subclasses OSError; only transport failures and dropped
+    # sessions mean the pooled connection is unusable.
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EmailQueue:
+    """Deliver spooled messages from worker threads.
+
+    Each message is written to ``<spool>/pending`` before ``enqueue`` returns,
+    so queued mail survives restarts. Workers claim a file by renaming it into
+    ``inflight`` (atomic, so several processes can share one spool), send it
+    over a connection they keep open between messages, and either delete it,
+    schedule a retry by moving it back to ``pending`` with a future mtime, or
+    park it in ``failed`` after ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str | os.PathLike[str],
+        *,
+        connection_factory: Callable[[], smtplib.SMTP] = smtp_connection,
+        workers: int = 2,
+        max_size: int = 1000,
+        max_attempts: int = 5,
+        retry_backoff: float = 30.0,
+        poll_interval: float = 1.0,
+        idle_timeout: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._root = Path(spool_dir)
+        for name in (PENDING, INFLIGHT, FAILED):
+            (self._root / name).mkdir(parents=True, exist_ok=True)
+        self._connection_factory = connection_factory
+        self._workers = max(1, int(workers))
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max(1, int(max_size)))
+        self._max_attempts = max(1, int(max_attempts))
+        self._retry_backoff = float(retry_backoff)
+        self._poll_interval = float(poll_interval)
+        self._idle_timeout = float(idle_timeout)
+        self._clock = clock
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    # --- lifecycle ---------------------------------------------------------
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._recover_inflight()
+            self._threads.append(
+                threading.Thread(
+                    target=self._dispatch_loop, name="email-dispatch", daemon=True
+                )
+            )
+            for index in range(self._workers):
+                self._threads.append(
+                    threading.Thread(
+                        target=self._worker_loop,
+                        name=f"email-worker-{index}",
+                        daemon=True,
+                    )
+                )
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    # --- producer side -----------------------------------------------------
+    def enqueue(self, message: EmailMessage) -> str:
+        job_id = uuid.uuid4().hex
+        name = f"{job_id}.1.eml"
+        self._write_atomic(self._root / PENDING / name, message.as_bytes())
+        try:
+            self._queue.put_nowait(name)
+        except queue.Full:
+            # Still durable: the dispatcher picks it up from the spool later.
+            logger.warning("Fila de emails cheia; mensagem %s aguardará no spool", name)
+        return job_id
+
+    def pending_count(self) -> int:
+        return sum(1 for _ in (self._root / PENDING).glob("*.eml"))
+
+    def failed_count(self) -> int:
+        return sum(1 for _ in (self._root / FAILED).glob("*.eml"))
+
+    # --- internals ---------------------------------------------------------
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_name, path)
+
+    @staticmethod
+    def _parse_name(name: str) -> tuple[str, int]:
+        job_id, attempt, _ext = name.split(".", 2)
+        return job_id, int(attempt)
+
+    def _recover_inflight(self) -> None:
+        # Inflight files are tagged with the claiming pid; only reclaim those
+        # whose process is gone so live workers elsewhere are left alone.
+        for path in (self._root / INFLIGHT).glob("*.eml"):
+            try:
+                job_id, attempt, pid = path.stem.split(".")
+                if _pid_alive(int(pid)) and int(pid) != os.getpid():
+                    continue
+                os.replace(path, self._root / PENDING / f"{job_id}.{attempt}.eml")
+            except (ValueError, OSError):
+                continue
+
+    def _due_pending(self) -> list[str]:
+        now = self._clock()
+        due = []
+        for path in (self._root / PENDING).glob("*.eml"):
+            if not _PENDING_NAME.match(path.name):
+                logger.warning("Arquivo inesperado no spool de emails: %s", path.name)
+                self._park(path, path.name)
+                continue
+            try:
+                if path.stat().st_mtime <= now:
+                    due.append(path.name)
+            except FileNotFoundError:
+                continue
+        return due
+
+    def _dispatch_loop(self) -> None:
+        while not self._stop.is_set():
+            if self._queue.empty():
+                for name in self._due_pending():
+                    try:
+                        self._queue.put(name, timeout=self._poll_interval)
+                    except queue.Full:
+                        break
+            self._stop.wait(self._poll_interval)
+
+    def _park(self, path: Path, name: str) -> None:
+        """Move ``path`` into ``failed`` so it is kept but never retried."""
+
+        try:
+            os.replace(path, self._root / FAILED / name)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception("Não foi possível mover %s para failed/", path)
+
+    def _claim(self, name: str) -> Optional[Path]:
+        job_id, attempt = self._parse_name(name)
+        source = self._root / PENDING / name
+        try:
+            if source.stat().st_mtime > self._clock():
+                return None  # retry not due yet
+            target = self._root / INFLIGHT / f"{job_id}.{attempt}.{os.getpid()}.eml"
+            os.rename(source, target)
+        except FileNotFoundError:
+            return None  # already delivered or claimed by another worker
+        return target
+
+    def _worker_loop(self) -> None:
+        connection: Optional[smtplib.SMTP] = None
+        last_used = 0.0
+        while not self._stop.is_set():
+            try:
+                name = self._queue.get(timeout=self._poll_interval)
+            except queue.Empty:
+                if connection is not None and (
+                    time.monotonic() - last_used > self._idle_timeout
+                ):
+                    connection = self._close(connection)
+                continue
+            claimed: Optional[Path] = None
+            try:
+                claimed = self._claim(name)
+                if claimed is None:
+                    continue
+                connection = self._deliver(claimed, connection)
+                last_used = time.monotonic()
+            except Exception:
+                # One bad job must not take the worker down with it.
+                logger.exception("Erro inesperado ao processar email %s", name)
+                if claimed is not None:
+                    self._park(claimed, f"{claimed.stem.rsplit('.', 1)[0]}.eml")
+            finally:
+                self._queue.task_done()
+        if connection is not None:
+            self._close(connection)
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP) -> None:
+        """Close quietly; returns ``None`` so callers can reset their handle."""
+
+        try:
+            connection.quit()
+        except Exception:  # pragma: no cover - best effort
+            try:
+                connection.close()
+            except Exception:
+                pass
+        return None
+
+    def _deliver(
+        self, path: Path, connection: Optional[smtplib.SMTP]
+    ) -> Optional[smtplib.SMTP]:
+        job_id, attempt, _pid = path.stem.split(".")
+        attempt_no = int(attempt)
+        try:
+            with path.open("rb") as handle:
+                message = BytesParser(policy=policy.default).parse(handle)
+        except Exception:
+            logger.exception("Email %s ilegível; movido para failed/", job_id)
+            self._park(path, f"{job_id}.{attempt}.eml")
+            return connection
+        try:
+            reused = connection is not None
+            if connection is None:
+                connection = self._connection_factory()
+            try:
+                connection.send_message(message)
+            except Exception as exc:
+                if not (reused and _is_connection_error(exc)):
+                    raise
+                # Stale pooled connection: reconnect once before counting an
+                # attempt against the message.
+                connection = self._close(connection)
+                connection = self._connection_factory()
+                connection.send_message(message)
+        except Exception as exc:
+            permanent = (
+                isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+            ) or isinstance(exc, smtplib.SMTPRecipientsRefused)
+            if connection is not None and _is_connection_error(exc):
+                connection = self._close(connection)
+            if permanent or attempt_no >= self._max_attempts:
+                os.replace(path, self._root / FAILED / f"{job_id}.{attempt}.eml")
+                logger.error(
+                    "Falha definitiva ao enviar email '%s' (tentativa %s): %s",
+                    message["Subject"],
+                    attempt_no,
+                    exc,
+                )
+                return connection
+            retry_path = self._root / PENDING / f"{job_id}.{attempt_no + 1}.eml"
+            not_before = self._clock() + self._retry_backoff * 2 ** (attempt_no - 1)
+            os.utime(path, (not_before, not_before))
+            os.replace(path, retry_path)
+            logger.warning(
+                "Falha ao enviar email '%s' (tentativa %s); nova tentativa em %.0fs: %s",
+                message["Subject"],
+                attempt_no,
+                not_before - self._clock(),
+                exc,
+            )
+            return connection
+        path.unlink(missing_ok=True)
+        logger.info("Email '%s' enviado para %s", message["Subject"], message["To"])
+        return connection
+
+    def join(self, timeout: float = 5.0) -> bool:
+        """Wait until nothing is queued or in flight (used by tests/scripts)."""
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if (
+                self._queue.unfinished_tasks == 0
+                and not any((self._root / INFLIGHT).glob("*.eml"))
+                and not self._due_pending()
+            ):
+                return True
+            time.sleep(0.01)
+        return False
+
+
+_queue: Optional[EmailQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_email_queue() -> EmailQueue:
+    """Process-wide queue, started on first use and drained at exit."""
+
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = EmailQueue(
+                settings.email_spool_dir,
+                workers=settings.email_queue_workers,
+                max_size=settings.email_queue_max_size,
+                max_attempts=settings.email_max_attempts,
+                retry_backoff=settings.email_retry_backoff_seconds,
+            )
+            _queue.start()
+            atexit.register(_queue.stop)
+        return _queue
+
+
+__all__ = ["EmailQueue", "get_email_queue", "smtp_connection"]
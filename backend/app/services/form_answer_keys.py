@@ -0,0 +1,178 @@
+"""Compiled, cached answer keys used to grade form submissions."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.models.form_question_options import (
+    FormQuestionOption as FormQuestionOptionORM,
+)
+from app.models.form_questions import FormQuestion as FormQuestionORM
+from app.models.forms import Form as FormORM
+from app.models.lk_question_type import LkQuestionType as LkQuestionTypeORM
+from app.models.trails import Trails as TrailsORM
+from app.services.local_cache import LocalCache
+
+GRADED_KINDS = {"ESSAY", "TRUE_OR_FALSE", "SINGLE_CHOICE"}
+
+
+@dataclass(frozen=True, slots=True)
+class QuestionKey:
+    id: int
+    kind: str  # ESSAY | TRUE_OR_FALSE | SINGLE_CHOICE | UNKNOWN
+    required: bool
+    points: Decimal
+    option_ids: FrozenSet[int]
+    correct_option_ids: FrozenSet[int]
+
+
+@dataclass(frozen=True)
+class FormAnswerKey:
+    form_id: int
+    trail_item_id: int
+    version: int
+    min_score_to_pass: Decimal
+    questions: Tuple[QuestionKey, ...]  # in display order
+    _by_id: Dict[int, QuestionKey] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(
+        cls,
+        form_id: int,
+        trail_item_id: int,
+        version: int,
+        min_score_to_pass: Decimal,
+        questions: List[QuestionKey],
+    ) -> "FormAnswerKey":
+        by_id = {question.id: question for question in questions}
+        return cls(
+            form_id, trail_item_id, version, min_score_to_pass, tuple(questions), by_id
+        )
+
+    def get(self, question_id: int) -> Optional[QuestionKey]:
+        return self._by_id.get(question_id)
+
+
+def _flag(value: Optional[bool], legacy: Optional[str]) -> Optional[bool]:
+    if value is not None:
+        return bool(value)
+    if legacy is not None:
+        return legacy.upper() == "Y"
+    return None
+
+
+def _load(db: Session, trail_item_id: int, version: int) -> Optional[FormAnswerKey]:
+    form = (
+        db.query(FormORM.id, FormORM.min_score_to_pass)
+        .filter(FormORM.trail_item_id == trail_item_id)
+        .first()
+    )
+    if form is None:
+        return None
+
+    question_rows = (
+        db.query(
+            FormQuestionORM.id,
+            FormQuestionORM.required,
+            FormQuestionORM.required_yn,
+            FormQuestionORM.points,
+            LkQuestionTypeORM.code,
+        )
+        .outerjoin(
+            LkQuestionTypeORM, LkQuestionTypeORM.id == FormQuestionORM.question_type_id
+        )
+        .filter(FormQuestionORM.form_id == form.id)
+        .order_by(FormQuestionORM.order_index, FormQuestionORM.id)
+        .all()
+    )
+    options: Dict[int, List[int]] = defaultdict(list)
+    correct: Dict[int, List[int]] = defaultdict(list)
+    if question_rows:
+        for option_id, question_id, is_correct, is_correct_yn in (
+            db.query(
+                FormQuestionOptionORM.id,
+                FormQuestionOptionORM.question_id,
+                FormQuestionOptionORM.is_correct,
+                FormQuestionOptionORM.is_correct_yn,
+            )
+            .filter(
+                FormQuestionOptionORM.question_id.in_([row.id for row in question_rows])
+            )
+            .all()
+        ):
+            options[question_id].append(option_id)
+            if _flag(is_correct, is_correct_yn) is True:
+                correct[question_id].append(option_id)
+
+    questions = [
+        QuestionKey(
+            id=row.id,
+            kind=row.code if row.code in GRADED_KINDS else "UNKNOWN",
+            required=bool(_flag(row.required, row.required_yn)),
+            points=row.points if row.points is not None else Decimal("0"),
+            option_ids=frozenset(options[row.id]),
+            correct_option_ids=frozenset(correct[row.id]),
+        )
+        for row in question_rows
+    ]
+    return FormAnswerKey.build(
+        form.id,
+        trail_item_id,
+        version,
+        form.min_score_to_pass or Decimal("0"),
+        questions,
+    )
+
+
+# Forms are only edited through the trail builder, which bumps
+# ``trails.content_version`` on every save. Each lookup reads that column
+# (one primary-key query) so a key cached by any worker is never used after
+# an edit committed elsewhere.
+_cache: LocalCache[Tuple[int, int], FormAnswerKey] = LocalCache(
+    max_entries=settings.trail_outline_cache_size,
+    ttl_seconds=settings.trail_outline_ttl_seconds,
+)
+
+
+def get_form_answer_key(
+    db: Session, trail_id: int, trail_item_id: int
+) -> Optional[FormAnswerKey]:
+    """Answer key of the form attached to ``trail_item_id`` (``None`` if absent)."""
+
+    version = (
+        db.query(TrailsORM.content_version).filter(TrailsORM.id == trail_id).scalar()
+    )
+    if version is None:
+        return None
+    key = (trail_id, trail_item_id)
+    answer_key = _cache.get(key)
+    if answer_key is not None and answer_key.version == version:
+        return answer_key
+
+    answer_key = _load(db, trail_item_id, version)
+    if answer_key is not None:
+        _cache.set(key, answer_key)
+    return answer_key
+
+
+def invalidate_form_answer_keys(trail_id: int) -> None:
+    _cache.pop_where(lambda key: key[0] == trail_id)
+
+
+def clear_form_answer_keys() -> None:
+    _cache.clear()
+
+
+__all__ = [
+    "FormAnswerKey",
+    "QuestionKey",
+    "clear_form_answer_keys",
+    "get_form_answer_key",
+    "invalidate_form_answer_keys",
+]
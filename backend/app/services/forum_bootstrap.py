@@ -1,4 +1,4 @@
-"""Helpers to ensure forum infrastructure exists before serving requests."""
+"""Forum table provisioning, used by the reconcile script (not at app startup)."""
 
 from __future__ import annotations
 
@@ -0,0 +1,209 @@
+"""Resized WebP/AVIF derivatives and blur placeholders for uploaded images."""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:  # pragma: no cover - handled by runtime detection
+    from PIL import Image, ImageFilter, ImageOps, features
+except ModuleNotFoundError:  # pragma: no cover - Pillow is opcional
+    Image = None  # type: ignore
+    ImageFilter = ImageOps = features = None  # type: ignore
+
+from flask import current_app
+
+from app.core.settings import settings
+from app.services.local_cache import LocalCache
+from app.services.media import IMAGE_VARIANTS_SUFFIX, build_media_url
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS: Tuple[int, ...] = (160, 320, 640, 1280)
+PLACEHOLDER_WIDTH = 16
+MANIFEST_NAME = "manifest.json"
+_QUALITY = {"webp": 80, "avif": 55}
+
+# Manifests never change once written (uploads get unique names); the TTL only
+# bounds how long a "not generated yet" answer is remembered.
+_manifests: LocalCache[str, Dict[str, Any]] = LocalCache(
+    max_entries=4096, ttl_seconds=60
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def derivatives_available() -> bool:
+    return Image is not None and settings.image_derivative_workers > 0
+
+
+def _formats() -> List[str]:
+    formats = ["webp"]
+    with suppress(Exception):
+        if features.check("avif"):
+            formats.append("avif")
+    return formats
+
+
+def _save_atomic(image, destination: Path, fmt: str) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=destination.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            image.save(handle, fmt.upper(), quality=_QUALITY.get(fmt, 80))
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, destination)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+
+def _placeholder(image) -> str:
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, "WEBP", quality=30)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def generate_image_derivatives(source: Path, relative_path: str) -> Dict[str, Any]:
+    """Write the derivatives of ``source`` and return its manifest.
+
+    ``relative_path`` is the static-relative path of the original; derivative
+    paths in the manifest are built from it. Widths wider than the original
+    are skipped (the original width is used when it is below all of them).
+    """
+
+    if Image is None:
+        raise RuntimeError("Pillow não está instalado.")
+
+    with Image.open(source) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    width, height = image.size
+
+    target_dir = source.with_name(source.name + IMAGE_VARIANTS_SUFFIX)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    prefix = f"{relative_path}{IMAGE_VARIANTS_SUFFIX}"
+
+    widths = sorted((w for w in DERIVATIVE_WIDTHS if w < width), reverse=True)
+    formats: Dict[str, List[List[Any]]] = {fmt: [] for fmt in _formats()}
+    # Largest first: each step resizes the previous result, not the original.
+    current = image
+    for target_width in widths or [width]:
+        if target_width != current.width:
+            target_height = max(1, round(height * target_width / width))
+            current = current.resize((target_width, target_height), Image.LANCZOS)
+        for fmt, entries in formats.items():
+            name = f"w{target_width}.{fmt}"
+            _save_atomic(current, target_dir / name, fmt)
+            entries.append([target_width, f"{prefix}/{name}"])
+
+    manifest = {
+        "width": width,
+        "height": height,
+        "placeholder": _placeholder(current),
+        "formats": {fmt: sorted(entries) for fmt, entries in formats.items()},
+    }
+    fd, tmp_name = tempfile.mkstemp(dir=target_dir, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle)
+    os.replace(tmp_name, target_dir / MANIFEST_NAME)
+    _manifests.pop(relative_path)
+    return manifest
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.image_derivative_workers,
+                thread_name_prefix="image-derivatives",
+            )
+        return _executor
+
+
+def _generate_logged(source: Path, relative_path: str) -> None:
+    try:
+        generate_image_derivatives(source, relative_path)
+    except Exception:
+        logger.exception("Falha ao gerar derivados de %s", relative_path)
+
+
+def schedule_image_derivatives(relative_path: str) -> Optional[Future]:
+    """Queue derivative generation for a saved upload (no-op without Pillow)."""
+
+    if not derivatives_available():
+        return None
+    source = Path(current_app.static_folder) / relative_path
+    return _get_executor().submit(_generate_logged, source, relative_path)
+
+
+def _load_manifest(relative_path: str) -> Dict[str, Any]:
+    cached = _manifests.get(relative_path)
+    if cached is not None:
+        return cached
+    static_root = current_app.static_folder
+    manifest: Dict[str, Any] = {}
+    if static_root:
+        path = (
+            Path(static_root)
+            / f"{relative_path}{IMAGE_VARIANTS_SUFFIX}"
+            / MANIFEST_NAME
+        )
+        with suppress(FileNotFoundError, ValueError):
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+    _manifests.set(relative_path, manifest)
+    return manifest
+
+
+def image_variants(
+    relative_path: Optional[str], *, external: bool = False
+) -> Optional[Dict[str, Any]]:
+    """``srcset`` strings per format plus the blur placeholder, when generated."""
+
+    if not relative_path or relative_path.startswith(("http://", "https://")):
+        return None
+    manifest = _load_manifest(relative_path.strip().lstrip("/"))
+    if not manifest:
+        return None
+    return {
+        "width": manifest["width"],
+        "height": manifest["height"],
+        "placeholder": manifest["placeholder"],
+        "srcset": {
+            fmt: ", ".join(
+                f"{build_media_url(path, external=external)} {width}w"
+                for width, path in entries
+            )
+            for fmt, entries in manifest["formats"].items()
+        },
+    }
+
+
+def clear_image_variants() -> None:
+    _manifests.clear()
+
+
+__all__ = [
+    "DERIVATIVE_WIDTHS",
+    "clear_image_variants",
+    "derivatives_available",
+    "generate_image_derivatives",
+    "image_variants",
+    "schedule_image_derivatives",
+]
@@ -0,0 +1,37 @@
+"""Pre-rendered JSON for the user-independent part of trail item details."""
+
+from __future__ import annotations
+
+from typing import Callable, Hashable, Tuple
+
+from app.core.settings import settings
+from app.services.local_cache import LocalCache
+
+
+# Keys carry the trail outline version, which trail edits bump, so stale
+# renders are simply never looked up again; the TTL bounds how long an edit
+# made by another process can go unnoticed.
+_cache: LocalCache[Tuple[Hashable, ...], bytes] = LocalCache(
+    max_entries=settings.item_detail_cache_size,
+    ttl_seconds=settings.item_detail_cache_ttl_seconds,
+)
+
+
+def get_item_detail_body(
+    key: Tuple[Hashable, ...], render: Callable[[], bytes]
+) -> bytes:
+    """Return the cached body for ``key``, rendering and storing it on a miss."""
+
+    body = _cache.get(key)
+    if body is None:
+        body = render()
+        if settings.item_detail_cache_ttl_seconds > 0:
+            _cache.set(key, body)
+    return body
+
+
+def clear_item_details() -> None:
+    _cache.clear()
+
+
+__all__ = ["clear_item_details", "get_item_detail_body"]
@@ -0,0 +1,122 @@
+"""Process-wide cache for the small ``lk_*`` lookup tables (code <-> id)."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.db import session_scope
+from app.models.lk_enrollment_status import LkEnrollmentStatus
+from app.models.lk_item_type import LkItemType
+from app.models.lk_progress_status import LkProgressStatus
+from app.models.lk_question_type import LkQuestionType
+from app.models.lookups import LkColor, LkRole, LkSex
+
+LOGGER = logging.getLogger(__name__)
+
+PROGRESS_STATUS = "progress_status"
+ENROLLMENT_STATUS = "enrollment_status"
+ITEM_TYPE = "item_type"
+QUESTION_TYPE = "question_type"
+ROLE = "role"
+SEX = "sex"
+COLOR = "color"
+
+_LOOKUP_MODELS = {
+    PROGRESS_STATUS: LkProgressStatus,
+    ENROLLMENT_STATUS: LkEnrollmentStatus,
+    ITEM_TYPE: LkItemType,
+    QUESTION_TYPE: LkQuestionType,
+    ROLE: LkRole,
+    SEX: LkSex,
+    COLOR: LkColor,
+}
+
+
+class LookupRegistry:
+    """Keep lookup rows in memory; a miss reloads the table from the database."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids: Dict[str, Dict[str, int]] = {}
+        self._codes: Dict[str, Dict[int, str]] = {}
+
+    def load(self, db: Session, tables: Optional[Iterable[str]] = None) -> None:
+        names = list(tables) if tables is not None else list(_LOOKUP_MODELS)
+        loaded: Dict[str, Dict[str, int]] = {}
+        for name in names:
+            model = _LOOKUP_MODELS[name]
+            rows = db.query(model.code, model.id).all()
+            loaded[name] = {code: lookup_id for code, lookup_id in rows}
+        with self._lock:
+            for name, mapping in loaded.items():
+                self._ids[name] = mapping
+                self._codes[name] = {
+                    lookup_id: code for code, lookup_id in mapping.items()
+                }
+
+    def refresh(self, db: Session) -> None:
+        self.load(db)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self._codes.clear()
+
+    def ids(self, db: Session, table: str) -> Dict[str, int]:
+        mapping = self._ids.get(table)
+        if not mapping:
+            self.load(db, [table])
+            mapping = self._ids.get(table, {})
+        return dict(mapping)
+
+    def id_for(self, db: Session, table: str, code: str) -> Optional[int]:
+        mapping = self._ids.get(table)
+        if mapping is not None and code in mapping:
+            return mapping[code]
+        # Lookup rows are append-only in practice; a miss means the cache is
+        # cold or a new code was seeded after startup.
+        self.load(db, [table])
+        return self._ids.get(table, {}).get(code)
+
+    def code_for(
+        self, db: Session, table: str, lookup_id: Optional[int]
+    ) -> Optional[str]:
+        if lookup_id is None:
+            return None
+        mapping = self._codes.get(table)
+        if mapping is not None and lookup_id in mapping:
+            return mapping[lookup_id]
+        self.load(db, [table])
+        return self._codes.get(table, {}).get(lookup_id)
+
+
+lookups = LookupRegistry()
+
+
+def warm_lookups() -> None:
+    """Load every lookup table at startup; failures fall back to lazy loading."""
+
+    try:
+        with session_scope() as session:
+            lookups.load(session)
+    except SQLAlchemyError as exc:
+        LOGGER.warning("Lookup cache not warmed at startup: %s", exc)
+
+
+__all__ = [
+    "COLOR",
+    "ENROLLMENT_STATUS",
+    "ITEM_TYPE",
+    "LookupRegistry",
+    "PROGRESS_STATUS",
+    "QUESTION_TYPE",
+    "ROLE",
+    "SEX",
+    "lookups",
+    "warm_lookups",
+]
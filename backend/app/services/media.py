@@ -1,17 +1,31 @@
 from __future__ import annotations
 
 import hashlib
+import json
+import logging
 import mimetypes
 import os
-from contextlib import closing
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, suppress
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import IO, Dict, Iterable, Optional, Union
+from urllib.error import HTTPError
 from urllib.parse import urlparse
 from urllib.request import Request, urlopen
 from uuid import uuid4
 
-from flask import current_app, url_for
+from flask import current_app, g, request, url_for
+from flask.wrappers import Request as FlaskRequest
 from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 ALLOWED_DOCUMENT_EXTENSIONS = {
@@ -29,7 +43,22 @@ ALLOWED_DOCUMENT_EXTENSIONS = {
 MAX_IMAGE_UPLOAD_BYTES = 512 * 1024  # 512 KB
 MAX_DOCUMENT_DOWNLOAD_BYTES = 20 * 1024 * 1024  # 20 MB
 MAX_DOCUMENT_UPLOAD_BYTES = MAX_DOCUMENT_DOWNLOAD_BYTES
-_DOCUMENT_CHUNK_SIZE = 8192
+# Folga para o envelope multipart (boundary, cabeçalhos e campos de texto).
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+# Teto global do corpo da requisição (MAX_CONTENT_LENGTH).
+MAX_REQUEST_BYTES = MAX_DOCUMENT_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES
+IMAGE_TOO_LARGE_MESSAGE = "A imagem deve ter no máximo 512 KB."
+DOCUMENT_TOO_LARGE_MESSAGE = "O documento deve ter no máximo 20 MB."
+_UPLOAD_COPY_BUFFER = 1024 * 1024
+# Pasta com as versões redimensionadas de uma imagem: "<arquivo>.variants/".
+IMAGE_VARIANTS_SUFFIX = ".variants"
+_UPLOAD_SPOOL_DIR = ".incoming"
+_DOCUMENT_CHUNK_SIZE = 64 * 1024
+# Documentos remotos ficam em uploads/documents/sha256/<2 primeiros>/<sha256><ext>;
+# o índice guarda, por URL, o caminho do conteúdo já baixado e os validadores
+# HTTP (ETag/Last-Modified) usados para conferir se o documento mudou.
+_DOCUMENT_STORE = "documents/sha256"
+_DOCUMENT_URL_INDEX = "documents/urls"
 _DOCUMENT_USER_AGENT = "ROTA-Backend/1.0"
 
 
@@ -53,6 +82,114 @@ def _ensure_subdir(subdir: str) -> Path:
     return target
 
 
+class UploadSpool:
+    """
+    Arquivo temporário onde o parser multipart grava o upload diretamente.
+
+    Fica em ``uploads/.incoming`` (mesmo sistema de arquivos do destino), conta
+    os bytes recebidos e interrompe o parsing com 413 assim que o limite da
+    rota é ultrapassado. Ao salvar, o arquivo é apenas renomeado.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.size = 0
+        fd, self.path = tempfile.mkstemp(
+            dir=_ensure_subdir(_UPLOAD_SPOOL_DIR), prefix=".upload-"
+        )
+        self._file = os.fdopen(fd, "w+b")
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.limit:
+            self.discard()
+            raise RequestEntityTooLarge()
+        return self._file.write(data)
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+    def commit(self, destination: Path) -> None:
+        self._file.close()
+        os.chmod(self.path, 0o644)
+        os.replace(self.path, destination)
+
+    def discard(self) -> None:
+        self._file.close()
+        with suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+
+class MediaRequest(FlaskRequest):
+    """Request que grava uploads esperados (``expect_upload``) direto em disco."""
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None,
+    ) -> IO[bytes]:
+        limit = g.get("upload_limit")
+        if filename and limit is not None:
+            spool = UploadSpool(limit)
+            g.setdefault("upload_spools", []).append(spool)
+            return spool  # type: ignore[return-value]
+        return super()._get_file_stream(
+            total_content_length, content_type, filename, content_length
+        )
+
+
+def expect_upload(limit: int) -> bool:
+    """
+    Prepara a requisição atual para receber um arquivo de até ``limit`` bytes.
+
+    Deve ser chamada antes de acessar ``request.files``/``request.form``.
+    Retorna ``False`` quando o Content-Length declarado já excede o limite
+    (mais a folga do envelope multipart), sem ler o corpo.
+    """
+    declared = request.content_length
+    if declared is not None and declared > limit + UPLOAD_OVERHEAD_BYTES:
+        return False
+    g.upload_limit = limit
+    return True
+
+
+def discard_pending_uploads(_exc: Optional[BaseException] = None) -> None:
+    """Remove spools que não foram salvos (erro de validação, conexão caída...)."""
+
+    for spool in g.pop("upload_spools", []):
+        spool.discard()
+
+
+def _store_upload(
+    file: FileStorage, destination: Path, *, limit: int, message: str
+) -> None:
+    stream = file.stream
+    if isinstance(stream, UploadSpool):
+        if stream.size > limit:
+            raise ValueError(message)
+        stream.commit(destination)
+        return
+
+    # Fora de uma requisição com expect_upload: cópia em streaming com limite.
+    copied = 0
+    try:
+        with open(destination, "wb") as handle:
+            while True:
+                chunk = stream.read(_UPLOAD_COPY_BUFFER)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if copied > limit:
+                    raise ValueError(message)
+                handle.write(chunk)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            destination.unlink()
+        raise
+
+
 def save_image(file: FileStorage, subdir: str) -> str:
     if not file or not file.filename:
         raise ValueError("Nenhum arquivo foi enviado.")
@@ -61,19 +198,15 @@ def save_image(file: FileStorage, subdir: str) -> str:
     if extension not in ALLOWED_IMAGE_EXTENSIONS:
         raise ValueError("Formato de imagem não suportado.")
 
-    stream = file.stream
-    position = stream.tell()
-    stream.seek(0, os.SEEK_END)
-    size = stream.tell()
-    stream.seek(position, os.SEEK_SET)
-    if size > MAX_IMAGE_UPLOAD_BYTES:
-        raise ValueError("A imagem deve ter no máximo 512 KB.")
-    stream.seek(0)
-
     destination_dir = _ensure_subdir(subdir)
     filename = f"{uuid4().hex}{extension}"
     destination_path = destination_dir / filename
-    file.save(destination_path)
+    _store_upload(
+        file,
+        destination_path,
+        limit=MAX_IMAGE_UPLOAD_BYTES,
+        message=IMAGE_TOO_LARGE_MESSAGE,
+    )
 
     relative_path = f"uploads/{subdir.strip().strip('/')}/{filename}"
     return relative_path
@@ -87,20 +220,16 @@ def save_document_file(file: FileStorage, subdir: str = "documents") -> str:
     if extension not in ALLOWED_DOCUMENT_EXTENSIONS:
         raise ValueError("Formato de documento não suportado.")
 
-    stream = file.stream
-    position = stream.tell()
-    stream.seek(0, os.SEEK_END)
-    size = stream.tell()
-    stream.seek(position, os.SEEK_SET)
-    if size > MAX_DOCUMENT_UPLOAD_BYTES:
-        raise ValueError("O documento deve ter no máximo 20 MB.")
-    stream.seek(0)
-
     clean_subdir = subdir.strip().strip("/") or "documents"
     destination_dir = _ensure_subdir(clean_subdir)
     filename = f"{uuid4().hex}{extension}"
     destination_path = destination_dir / filename
-    file.save(destination_path)
+    _store_upload(
+        file,
+        destination_path,
+        limit=MAX_DOCUMENT_UPLOAD_BYTES,
+        message=DOCUMENT_TOO_LARGE_MESSAGE,
+    )
 
     relative_path = f"uploads/{clean_subdir}/{filename}"
     return relative_path
@@ -119,6 +248,11 @@ def delete_media(path: Optional[str]) -> None:
         full_path.unlink()
     except FileNotFoundError:
         pass
+    # Derivados gerados para imagens (ver app.services.image_derivatives).
+    shutil.rmtree(
+        full_path.with_name(full_path.name + IMAGE_VARIANTS_SUFFIX),
+        ignore_errors=True,
+    )
 
 
 def build_media_url(
@@ -144,28 +278,34 @@ def _normalize_static_relative(path: str) -> str:
     return normalized
 
 
-def cache_document(
-    url: str,
-    *,
-    subdir: str = "documents",
-    filename_hint: Optional[str] = None,
-) -> str:
+def cache_document(url: str) -> str:
     """
     Garante que um documento esteja disponível localmente.
 
+    Documentos remotos são gravados uma única vez por conteúdo (SHA-256), de
+    modo que o mesmo arquivo usado em várias trilhas ocupa um só lugar no disco.
+    Passados ``DOCUMENT_REVALIDATE_SECONDS`` desde a última conferência, a URL é
+    consultada de novo com uma requisição condicional; se o servidor remoto
+    estiver fora do ar, a cópia local continua sendo usada.
+
     Retorna o caminho relativo ao diretório estático (por exemplo,
-    'uploads/documents/abc123.pdf').
+    'uploads/documents/sha256/ab/ab12....pdf').
     """
     normalized = (url or "").strip()
     if not normalized:
         raise ValueError("Informe o endereço do documento.")
 
     if normalized.startswith(("http://", "https://")):
-        return _download_document(
-            normalized,
-            subdir=subdir,
-            filename_hint=filename_hint,
-        )
+        cached = _lookup_document_url(normalized)
+        if cached is None:
+            return _download_document(normalized)
+        if time.time() - cached.checked_at < settings.document_revalidate_seconds:
+            return cached.path
+        try:
+            return _download_document(normalized, cached)
+        except ValueError as exc:
+            logger.warning("Mantendo cópia local de %s: %s", normalized, exc)
+            return cached.path
 
     relative = _normalize_static_relative(normalized)
     if not relative:
@@ -182,53 +322,170 @@ def cache_document(
     return str(candidate.relative_to(static_root))
 
 
-def _download_document(
-    url: str,
-    *,
-    subdir: str,
-    filename_hint: Optional[str],
-) -> str:
-    subdir_clean = subdir.strip().strip("/") or "documents"
-    try:
-        request = Request(
-            url,
-            headers={
-                "User-Agent": _DOCUMENT_USER_AGENT,
-                "Accept": "*/*",
-            },
-        )
-        with closing(urlopen(request, timeout=30)) as response:
-            total = 0
-            chunks: list[bytes] = []
-            while True:
-                chunk = response.read(_DOCUMENT_CHUNK_SIZE)
-                if not chunk:
-                    break
-                total += len(chunk)
-                if total > MAX_DOCUMENT_DOWNLOAD_BYTES:
-                    raise ValueError("O documento deve ter no máximo 20 MB.")
-                chunks.append(chunk)
+def cache_documents(
+    urls: Iterable[str], *, max_workers: int = 4
+) -> Dict[str, Union[str, ValueError]]:
+    """
+    Versão concorrente de ``cache_document`` para vários endereços.
+
+    Cada endereço é processado uma vez, com no máximo ``max_workers`` downloads
+    simultâneos. Devolve, por endereço, o caminho relativo ou o ``ValueError``
+    que ``cache_document`` levantaria.
+    """
+    unique = list(dict.fromkeys(url for url in urls))
+    if not unique:
+        return {}
+
+    app = current_app._get_current_object()
+
+    def fetch(url: str) -> Union[str, ValueError]:
+        with app.app_context():
+            try:
+                return cache_document(url)
+            except ValueError as exc:
+                return exc
+
+    workers = max(1, min(max_workers, len(unique)))
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="documents"
+    ) as pool:
+        return dict(zip(unique, pool.map(fetch, unique)))
+
+
+def _url_index_path(url: str) -> Path:
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return _ensure_subdir(_DOCUMENT_URL_INDEX) / f"{digest}.txt"
+
+
+@dataclass(frozen=True, slots=True)
+class _CachedDocument:
+    path: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    checked_at: float
 
-            if not chunks:
-                raise ValueError("O documento enviado está vazio.")
 
-            content = b"".join(chunks)
-            content_type = response.headers.get("Content-Type", "")
+def _lookup_document_url(url: str) -> Optional[_CachedDocument]:
+    index_path = _url_index_path(url)
+    try:
+        raw = index_path.read_text(encoding="utf-8").strip()
+        checked_at = index_path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    try:
+        entry = json.loads(raw)
     except ValueError:
+        # Índice antigo: só o caminho, sem validadores; confere já na próxima vez.
+        entry, checked_at = {"path": raw}, 0.0
+    relative = entry.get("path") if isinstance(entry, dict) else None
+    if not relative or not (_static_root() / relative).is_file():
+        return None
+    return _CachedDocument(
+        relative, entry.get("etag"), entry.get("last_modified"), checked_at
+    )
+
+
+def _record_document_url(
+    url: str, relative: str, etag: Optional[str], last_modified: Optional[str]
+) -> None:
+    entry = {"path": relative, "etag": etag, "last_modified": last_modified}
+    _write_atomic(_url_index_path(url), json.dumps(entry).encode("utf-8"))
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_name)
         raise
-    except Exception as exc:
-        raise ValueError("Não foi possível baixar o documento.") from exc
 
-    extension = _resolve_document_extension(url, content_type)
-    filename = _build_document_filename(url, filename_hint, extension)
 
-    destination_dir = _ensure_subdir(subdir_clean)
-    destination_path = destination_dir / filename
+def _download_document(url: str, cached: Optional[_CachedDocument] = None) -> str:
+    """Baixa em streaming para um temporário, calculando o SHA-256 no caminho.
 
-    if not destination_path.exists():
-        destination_path.write_bytes(content)
+    Com ``cached``, a requisição é condicional e um ``304`` só renova a data da
+    última conferência no índice.
+    """
+
+    headers = {"User-Agent": _DOCUMENT_USER_AGENT, "Accept": "*/*"}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    store_dir = _ensure_subdir(_DOCUMENT_STORE)
+    fd, tmp_name = tempfile.mkstemp(dir=store_dir, prefix=".download-")
+    try:
+        digest = hashlib.sha256()
+        total = 0
+        not_modified = False
+        with os.fdopen(fd, "wb") as handle:
+            try:
+                request = Request(url, headers=headers)
+                with closing(urlopen(request, timeout=30)) as response:
+                    declared = response.headers.get("Content-Length")
+                    if (
+                        declared
+                        and declared.isdigit()
+                        and int(declared) > MAX_DOCUMENT_DOWNLOAD_BYTES
+                    ):
+                        raise ValueError(DOCUMENT_TOO_LARGE_MESSAGE)
+                    content_type = response.headers.get("Content-Type", "")
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                    while True:
+                        chunk = response.read(_DOCUMENT_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        total += len(chunk)
+                        if total > MAX_DOCUMENT_DOWNLOAD_BYTES:
+                            raise ValueError(DOCUMENT_TOO_LARGE_MESSAGE)
+                        digest.update(chunk)
+                        handle.write(chunk)
+            except ValueError:
+                raise
+            except HTTPError as exc:
+                if exc.code != 304 or cached is None:
+                    raise ValueError("Não foi possível baixar o documento.") from exc
+                not_modified = True
+            except Exception as exc:
+                raise ValueError("Não foi possível baixar o documento.") from exc
+
+        if not_modified:
+            os.unlink(tmp_name)
+            os.utime(_url_index_path(url))
+            return cached.path
+
+        if not total:
+            raise ValueError("O documento enviado está vazio.")
+
+        hexdigest = digest.hexdigest()
+        extension = _normalize_document_extension(
+            _resolve_document_extension(url, content_type)
+        )
+        relative = f"{_DOCUMENT_STORE}/{hexdigest[:2]}/{hexdigest}{extension}"
+        destination = _uploads_root() / relative
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            os.unlink(tmp_name)
+        else:
+            # Mesmo sistema de arquivos: a troca é atômica e downloads
+            # concorrentes do mesmo conteúdo apenas sobrescrevem bytes iguais.
+            os.chmod(tmp_name, 0o644)
+            os.replace(tmp_name, destination)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
 
-    return f"uploads/{subdir_clean}/{filename}"
+    relative_path = f"uploads/{relative}"
+    _record_document_url(url, relative_path, etag, last_modified)
+    return relative_path
 
 
 def _resolve_document_extension(url: str, content_type: str) -> str:
@@ -244,11 +501,7 @@ def _resolve_document_extension(url: str, content_type: str) -> str:
     return ".bin"
 
 
-def _build_document_filename(
-    url: str,
-    filename_hint: Optional[str],
-    extension: str,
-) -> str:
+def _normalize_document_extension(extension: str) -> str:
     ext = extension.lower()
     if not ext.startswith("."):
         ext = f".{ext}"
@@ -256,8 +509,4 @@ def _build_document_filename(
         not (char.isalnum() or char == ".") for char in ext.replace(".", "", 1)
     ):
         ext = ".bin"
-
-    hint = (filename_hint or "").strip()
-    seed = f"{url}|{hint}"
-    digest = hashlib.sha256(seed.encode("utf-8")).hexdigest()[:32]
-    return f"{digest}{ext}"
+    return ext
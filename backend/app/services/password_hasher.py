@@ -0,0 +1,151 @@
+"""bcrypt hashing and verification on a bounded process pool."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Tuple
+
+from passlib.hash import bcrypt
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Suggested wait for clients turned away while the pool is saturated; a few
+# hashes per worker clear in well under that.
+BUSY_RETRY_AFTER_SECONDS = 2
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when every worker is busy and the waiting queue is full."""
+
+    def __init__(self, retry_after: int = BUSY_RETRY_AFTER_SECONDS) -> None:
+        super().__init__("password hasher queue is full")
+        self.retry_after = retry_after
+
+
+# --- worker side (runs in the pool processes) ----------------------------------
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def _verify(
+    password: str, password_hash: str, rounds: int
+) -> Tuple[bool, Optional[str]]:
+    """Check ``password``; when it matches a hash weaker than ``rounds``, rehash it."""
+
+    if not bcrypt.verify(password, password_hash):
+        return False, None
+    if bcrypt.from_string(password_hash).rounds < rounds:
+        return True, _hash(password, rounds)
+    return True, None
+
+
+# --- request side --------------------------------------------------------------
+class PasswordHasher:
+    """Run bcrypt off the request threads.
+
+    Work goes to ``workers`` processes (bcrypt holds the GIL, so threads would
+    not help); the calling thread only waits on the result. At most
+    ``workers + max_pending`` calls may be in flight: past that a call
+    raises :class:`PasswordHasherBusy` instead of queueing without bound.
+    ``workers=0`` hashes inline, for tests and single-threaded scripts.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int = 2,
+        max_pending: int = 32,
+        rounds: int = 12,
+    ) -> None:
+        self._workers = max(0, int(workers))
+        self.rounds = int(rounds)
+        self._slots = threading.BoundedSemaphore(self._workers + max(0, max_pending))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # "spawn" avoids forking a process that already runs threads
+                # (request handlers, e-mail workers, the DB pool).
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn: Callable, *args):
+        if self._workers == 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            executor = self._get_executor()
+            try:
+                future: Future = executor.submit(fn, *args)
+                return future.result()
+            except BrokenProcessPool:
+                # A worker died (OOM killer, signal): start a fresh pool and
+                # retry once so the caller does not see the crash.
+                logger.warning("Pool de hashing de senhas reiniciado.")
+                self._discard_executor(executor)
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify(
+        self, password: str, password_hash: str | bytes
+    ) -> Tuple[bool, Optional[str]]:
+        """Return ``(matches, new_hash)``; ``new_hash`` is set when rounds were raised."""
+
+        if isinstance(password_hash, bytes):
+            password_hash = password_hash.decode("ascii")
+        return self._run(_verify, password, password_hash, self.rounds)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Process-wide hasher configured from ``settings``; the pool starts lazily."""
+
+    global _hasher
+    with _hasher_lock:
+        if _hasher is None:
+            _hasher = PasswordHasher(
+                workers=settings.password_hash_workers,
+                max_pending=settings.password_hash_max_pending,
+                rounds=settings.bcrypt_rounds,
+            )
+            atexit.register(_hasher.shutdown)
+        return _hasher
+
+
+__all__ = [
+    "PasswordHasher",
+    "PasswordHasherBusy",
+    "get_password_hasher",
+]
@@ -0,0 +1,244 @@
+"""Coalescing of item-progress events (video heartbeats) before they hit the database."""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+COMPLETED = "COMPLETED"
+
+# Upper bound on how often the background flusher wakes up.
+FLUSH_INTERVAL_CAP = 1.0
+
+
+@dataclass(frozen=True, slots=True)
+class ProgressEvent:
+    user_id: int
+    trail_id: int
+    item_id: int
+    status: str  # "IN_PROGRESS" | "COMPLETED"
+    progress_value: Optional[int] = None
+
+    def merge(self, newer: "ProgressEvent") -> "ProgressEvent":
+        """Fold a later event for the same item into this one.
+
+        Mirrors the upsert semantics: COMPLETED is sticky and the progress
+        value only moves forward.
+        """
+
+        status = COMPLETED if COMPLETED in (self.status, newer.status) else newer.status
+        values = [
+            v for v in (self.progress_value, newer.progress_value) if v is not None
+        ]
+        return replace(
+            newer, status=status, progress_value=max(values) if values else None
+        )
+
+
+def coalesce(events: Iterable[ProgressEvent]) -> List[ProgressEvent]:
+    """Collapse events to one per ``(user_id, item_id)``, keeping first-seen order."""
+
+    merged: Dict[Tuple[int, int], ProgressEvent] = {}
+    for event in events:
+        key = (event.user_id, event.item_id)
+        current = merged.get(key)
+        merged[key] = event if current is None else current.merge(event)
+    return list(merged.values())
+
+
+class ProgressCoalescer:
+    """Hold IN_PROGRESS heartbeats in memory and release them in batches.
+
+    Entries are keyed by ``(user_id, item_id)``; repeated heartbeats for the
+    same item merge into one pending row. An entry becomes due once it has
+    waited ``flush_after`` seconds, and everything is released early when the
+    buffer grows past ``max_entries``. ``start_flusher`` releases due entries
+    from a background thread, so at most ``flush_after`` plus one flush
+    interval of heartbeats are lost if the process dies, which only costs a
+    few seconds of replay for the learner; completions are never buffered.
+    """
+
+    def __init__(
+        self,
+        *,
+        flush_after: float,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.flush_after = max(0.0, float(flush_after))
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, int], Tuple[float, ProgressEvent]] = {}
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def add(self, event: ProgressEvent) -> None:
+        key = (event.user_id, event.item_id)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is None:
+                self._entries[key] = (self._clock(), event)
+            else:
+                # Keep the original timestamp so a steady stream still flushes.
+                self._entries[key] = (current[0], current[1].merge(event))
+
+    def buffered_value(self, user_id: int, item_id: int) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get((user_id, item_id))
+        return entry[1].progress_value if entry is not None else None
+
+    def drain_due(self) -> List[ProgressEvent]:
+        now = self._clock()
+        with self._lock:
+            if len(self._entries) > self.max_entries:
+                return self._pop(lambda _key, _since: True)
+            return self._pop(lambda _key, since: now - since >= self.flush_after)
+
+    def drain_user(self, user_id: int) -> List[ProgressEvent]:
+        with self._lock:
+            return self._pop(lambda key, _since: key[0] == user_id)
+
+    def drain_all(self) -> List[ProgressEvent]:
+        with self._lock:
+            return self._pop(lambda _key, _since: True)
+
+    def start_flusher(
+        self, write: Callable[[List[ProgressEvent]], object], *, interval: float
+    ) -> None:
+        """Pass due entries to ``write`` every ``interval`` seconds."""
+
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._stop.clear()
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                args=(write, max(0.01, float(interval))),
+                name="progress-flush",
+                daemon=True,
+            )
+            self._flusher.start()
+
+    def stop_flusher(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            thread, self._flusher = self._flusher, None
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _flush_loop(
+        self, write: Callable[[List[ProgressEvent]], object], interval: float
+    ) -> None:
+        while not self._stop.wait(interval):
+            events = self.drain_due()
+            if not events:
+                continue
+            try:
+                write(events)
+            except Exception:
+                logger.exception("Falha ao gravar %s eventos de progresso", len(events))
+                # Keep them for the next round instead of dropping them.
+                for event in events:
+                    self.add(event)
+
+    def _pop(self, predicate) -> List[ProgressEvent]:
+        keys = [
+            key for key, (since, _) in self._entries.items() if predicate(key, since)
+        ]
+        return [self._entries.pop(key)[1] for key in keys]
+
+
+_coalescer: Optional[ProgressCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+
+def get_progress_coalescer() -> Optional[ProgressCoalescer]:
+    """Process-wide buffer, or ``None`` when ``PROGRESS_COALESCE_SECONDS`` is 0."""
+
+    global _coalescer
+    if settings.progress_coalesce_seconds <= 0:
+        return None
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = ProgressCoalescer(
+                flush_after=settings.progress_coalesce_seconds,
+                max_entries=settings.progress_coalesce_max_entries,
+            )
+            _coalescer.start_flusher(_write_events, interval=flush_interval())
+            atexit.register(flush_progress_buffer)
+        return _coalescer
+
+
+def reset_progress_coalescer() -> None:
+    global _coalescer
+    with _coalescer_lock:
+        coalescer, _coalescer = _coalescer, None
+    if coalescer is not None:
+        coalescer.stop_flusher()
+
+
+def flush_interval() -> float:
+    return min(FLUSH_INTERVAL_CAP, settings.progress_coalesce_seconds)
+
+
+def max_buffer_lag() -> float:
+    """How far stored progress can trail what learners reported, in seconds.
+
+    A heartbeat may sit in any worker's buffer for ``flush_after`` plus one
+    flush interval, and requests served by other workers cannot see it.
+    """
+
+    if settings.progress_coalesce_seconds <= 0:
+        return 0.0
+    return settings.progress_coalesce_seconds + flush_interval()
+
+
+def _write_events(events: List[ProgressEvent]) -> int:
+    from app.core.db import session_scope
+    from app.repositories.UserProgressRepository import UserProgressRepository
+
+    with session_scope() as session:
+        return UserProgressRepository(session).upsert_progress_batch(events)
+
+
+def flush_progress_buffer() -> int:
+    """Write every buffered heartbeat (used at shutdown and by scripts)."""
+
+    coalescer = _coalescer
+    if coalescer is None:
+        return 0
+    coalescer.stop_flusher()
+    events = coalescer.drain_all()
+    if not events:
+        return 0
+    try:
+        return _write_events(events)
+    except Exception:  # pragma: no cover - best effort at shutdown
+        logger.exception("Falha ao gravar %s eventos de progresso", len(events))
+        return 0
+
+
+__all__ = [
+    "ProgressCoalescer",
+    "ProgressEvent",
+    "coalesce",
+    "flush_progress_buffer",
+    "flush_interval",
+    "get_progress_coalescer",
+    "max_buffer_lag",
+    "reset_progress_coalescer",
+]
@@ -6,7 +6,7 @@ import logging
 import time
 from collections import defaultdict, deque
 from threading import Lock
-from typing import Deque, DefaultDict, Tuple
+from typing import Deque, DefaultDict, Dict, Tuple
 from urllib.parse import urlsplit
 
 try:  # pragma: no cover - handled by runtime detection
@@ -21,6 +21,7 @@ except ModuleNotFoundError:  # pragma: no cover - redis is opcional
 
         pass
 
+
 from app.core.settings import settings
 
 LOGGER = logging.getLogger(__name__)
@@ -63,6 +64,94 @@ class FixedWindowRateLimiter:
             return True, None
 
 
+def _sliding_window_retry_after(
+    previous: float, current: float, elapsed: float, window: float, limit: int
+) -> float | None:
+    """Seconds until the weighted count drops below ``limit`` (``None`` if it is).
+
+    The sliding-window counter estimates the hits of the last ``window``
+    seconds as ``previous * (1 - elapsed / window) + current``: the previous
+    fixed window's count, weighted by how much of it the sliding window
+    still overlaps, plus the current window's count.
+    """
+
+    if previous * (1 - elapsed / window) + current < limit:
+        return None
+    if current < limit:
+        # Wait for the previous window's weight to decay enough.
+        return window * (1 - (limit - current) / previous) - elapsed
+    # Only the next window helps, once this one's weight has decayed too.
+    return (window - elapsed) + window * (1 - limit / current)
+
+
+class _WindowCounter:
+    __slots__ = ("window", "previous", "current")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.previous = 0
+        self.current = 0
+
+
+class SlidingWindowRateLimiter:
+    """Sliding-window counter with constant memory per key (in-memory).
+
+    Each key keeps only the index of its current fixed window and two counts,
+    however many attempts it makes. Keys idle for two windows no longer
+    affect any decision and are swept once per window.
+    """
+
+    def __init__(self, max_attempts: int, window_seconds: int) -> None:
+        self._max_attempts = int(max_attempts)
+        self._window = float(window_seconds)
+        self._counters: Dict[str, _WindowCounter] = {}
+        self._lock = Lock()
+        self._next_sweep = time.monotonic() + self._window
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def _sweep(self, current_window: int) -> None:
+        stale = [
+            key
+            for key, counter in self._counters.items()
+            if counter.window < current_window - 1
+        ]
+        for key in stale:
+            del self._counters[key]
+
+    def register_attempt(self, key: str) -> Tuple[bool, float | None]:
+        """Record a hit and return whether it's allowed and the wait otherwise."""
+
+        now = time.monotonic()
+        current_window = int(now // self._window)
+        elapsed = now - current_window * self._window
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(current_window)
+                self._next_sweep = now + self._window
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = _WindowCounter(current_window)
+            elif counter.window != current_window:
+                counter.previous = (
+                    counter.current if counter.window == current_window - 1 else 0
+                )
+                counter.current = 0
+                counter.window = current_window
+            retry_after = _sliding_window_retry_after(
+                counter.previous,
+                counter.current,
+                elapsed,
+                self._window,
+                self._max_attempts,
+            )
+            if retry_after is not None:
+                return False, max(retry_after, 0.0)
+            counter.current += 1
+            return True, None
+
+
 _RATE_LIMIT_LUA = """
 local key = KEYS[1]
 local now = tonumber(ARGV[1])
@@ -120,18 +209,97 @@ class RedisFixedWindowRateLimiter:
         return False, max(retry_after, 0.0)
 
 
-def _build_auth_limiter():
+# Same algorithm as SlidingWindowRateLimiter, stored as one small hash per key
+# (window index + two counts) that expires after two idle windows.
+_SLIDING_WINDOW_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+
+local current_window = math.floor(now / window)
+local elapsed = now - current_window * window
+local state = redis.call('HMGET', key, 'w', 'p', 'c')
+local stored_window = tonumber(state[1])
+local previous = tonumber(state[2]) or 0
+local current = tonumber(state[3]) or 0
+if stored_window ~= current_window then
+  if stored_window == current_window - 1 then
+    previous = current
+  else
+    previous = 0
+  end
+  current = 0
+end
+
+if previous * (1 - elapsed / window) + current >= limit then
+  local retry_after
+  if current < limit then
+    retry_after = window * (1 - (limit - current) / previous) - elapsed
+  else
+    retry_after = (window - elapsed) + window * (1 - limit / current)
+  end
+  -- Lua numbers become integers in replies; send the wait as a string.
+  return {0, tostring(retry_after)}
+end
+
+redis.call('HSET', key, 'w', current_window, 'p', previous, 'c', current + 1)
+redis.call('EXPIRE', key, math.ceil(window * 2))
+return {1, '0'}
+"""
+
+
+class RedisSlidingWindowRateLimiter:
+    """Sliding-window counter backed by one Redis hash per key."""
+
+    def __init__(
+        self,
+        client: "Redis",
+        max_attempts: int,
+        window_seconds: int,
+        *,
+        namespace: str = "auth",
+    ) -> None:
+        self._client = client
+        self._max_attempts = int(max_attempts)
+        self._window = float(window_seconds)
+        self._namespace = namespace
+        self._script = client.register_script(_SLIDING_WINDOW_LUA)
+
+    def _key(self, key: str) -> str:
+        return f"rate:sw:{self._namespace}:{key}"
+
+    def register_attempt(self, key: str) -> Tuple[bool, float | None]:
+        now = time.time()
+        allowed, retry_after = self._script(
+            keys=[self._key(key)],
+            args=[now, self._window, self._max_attempts],
+        )
+        if int(allowed):
+            return True, None
+        return False, max(float(retry_after), 0.0)
+
+
+def build_rate_limiter(
+    max_attempts: int, window_seconds: int, *, namespace: str = "auth"
+) -> SlidingWindowRateLimiter | RedisSlidingWindowRateLimiter:
+    """Sliding-window limiter on Redis when ``REDIS_URL`` works, in memory otherwise."""
+
     if settings.redis_url and from_url and Redis is not None:
         try:
             client = from_url(settings.redis_url, decode_responses=False)
             LOGGER.info(
                 "Usando Redis para rate limiting",
-                extra={"redis": _mask_redis_url(settings.redis_url)},
+                extra={
+                    "redis": _mask_redis_url(settings.redis_url),
+                    "namespace": namespace,
+                },
             )
-            return RedisFixedWindowRateLimiter(
+            return RedisSlidingWindowRateLimiter(
                 client,
-                max_attempts=settings.auth_rate_limit_max_attempts,
-                window_seconds=settings.auth_rate_limit_window_seconds,
+                max_attempts=max_attempts,
+                window_seconds=window_seconds,
+                namespace=namespace,
             )
         except RedisError as exc:
             LOGGER.warning(
@@ -142,13 +310,14 @@ def _build_auth_limiter():
         LOGGER.warning(
             "Redis não está disponível no ambiente atual; usando rate limiting em memória"
         )
-    return FixedWindowRateLimiter(
-        max_attempts=settings.auth_rate_limit_max_attempts,
-        window_seconds=settings.auth_rate_limit_window_seconds,
+    return SlidingWindowRateLimiter(
+        max_attempts=max_attempts, window_seconds=window_seconds
     )
 
 
-_auth_limiter = _build_auth_limiter()
+_auth_limiter = build_rate_limiter(
+    settings.auth_rate_limit_max_attempts, settings.auth_rate_limit_window_seconds
+)
 
 
 def check_auth_rate_limit(identifier: str) -> float | None:
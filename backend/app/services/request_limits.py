@@ -0,0 +1,245 @@
+"""Per-route rate limit policies and in-flight request shedding."""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+from flask import Blueprint, Flask, current_app, jsonify, request
+from werkzeug.exceptions import Unauthorized
+
+from app.core.settings import settings
+from app.services.rate_limiter import RedisError, build_rate_limiter
+from app.services.security import get_current_user_id
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS: FrozenSet[str] = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+# Never shed or throttle these: probes must see the process, not the queue.
+EXEMPT_ENDPOINTS = frozenset({"healthz", "metrics", "static"})
+OVERLOADED_RETRY_AFTER_SECONDS = 1
+_SLOT_ENVIRON_KEY = "rota.request_slot"
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    """``max_attempts`` per ``window_seconds`` for each client.
+
+    ``key="user"`` counts per signed-in user and falls back to the client IP
+    for anonymous requests; ``key="ip"`` always counts per IP. Only requests
+    whose method is in ``methods`` are counted.
+    """
+
+    max_attempts: int
+    window_seconds: int
+    key: str = "user"
+    methods: FrozenSet[str] = WRITE_METHODS
+
+
+def rate_limit(
+    max_attempts: int,
+    window_seconds: int,
+    *,
+    key: str = "user",
+    methods: FrozenSet[str] = WRITE_METHODS,
+) -> Callable:
+    """Attach a :class:`RatePolicy` to a view; place it under the route decorator."""
+
+    policy = RatePolicy(max_attempts, window_seconds, key, frozenset(methods))
+
+    def decorator(view: Callable) -> Callable:
+        view.rate_policy = policy
+        return view
+
+    return decorator
+
+
+_blueprint_policies: Dict[str, RatePolicy] = {}
+
+
+def limit_blueprint(
+    blueprint: Blueprint,
+    max_attempts: int,
+    window_seconds: int,
+    *,
+    key: str = "user",
+    methods: FrozenSet[str] = WRITE_METHODS,
+) -> None:
+    """Apply one shared budget to every route of ``blueprint`` without its own policy."""
+
+    _blueprint_policies[blueprint.name] = RatePolicy(
+        max_attempts, window_seconds, key, frozenset(methods)
+    )
+
+
+_limiters: Dict[str, object] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter(scope: str, policy: RatePolicy):
+    limiter = _limiters.get(scope)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(scope)
+            if limiter is None:
+                limiter = _limiters[scope] = build_rate_limiter(
+                    policy.max_attempts,
+                    policy.window_seconds,
+                    namespace=f"route:{scope}",
+                )
+    return limiter
+
+
+def client_ip() -> str:
+    """Client address as seen by the outermost of ``TRUSTED_PROXY_HOPS`` proxies.
+
+    Each proxy appends the peer it saw to ``X-Forwarded-For``; entries left
+    of the trusted ones are whatever the client sent, so they are ignored.
+    """
+
+    hops = settings.trusted_proxy_hops
+    if hops:
+        forwarded = [
+            part.strip()
+            for part in request.headers.get("X-Forwarded-For", "").split(",")
+            if part.strip()
+        ]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr or "unknown"
+
+
+def _policy_for_request() -> Optional[Tuple[str, RatePolicy]]:
+    view = current_app.view_functions.get(request.endpoint)
+    policy = getattr(view, "rate_policy", None)
+    if policy is not None:
+        return request.endpoint, policy
+    policy = _blueprint_policies.get(request.blueprint or "")
+    if policy is not None:
+        return request.blueprint, policy
+    return None
+
+
+def _client_key(policy: RatePolicy) -> str:
+    if policy.key == "user":
+        try:
+            return f"user:{get_current_user_id()}"
+        except Unauthorized:
+            pass
+    return f"ip:{client_ip()}"
+
+
+def _limited_response(status: int, detail: str, retry_after: float):
+    response = jsonify({"detail": detail})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def check_rate_policy():
+    """429 response when the matched policy is exhausted for this client, else ``None``."""
+
+    if not settings.route_rate_limits_enabled:
+        return None
+    matched = _policy_for_request()
+    if matched is None:
+        return None
+    scope, policy = matched
+    if request.method not in policy.methods:
+        return None
+    try:
+        allowed, retry_after = _limiter(scope, policy).register_attempt(
+            _client_key(policy)
+        )
+    except RedisError:
+        # Fail open: an unavailable Redis must not take the API down with it.
+        logger.warning("Rate limit de %s indisponível", scope, exc_info=True)
+        return None
+    if allowed:
+        return None
+    return _limited_response(
+        429,
+        "Muitas requisições. Aguarde antes de tentar novamente.",
+        retry_after or 0.0,
+    )
+
+
+class ConcurrencyLimiter:
+    """Cap requests in flight in this process.
+
+    A request that finds every slot taken waits up to ``wait_seconds`` for
+    one (absorbing short bursts) and is otherwise rejected, so excess load
+    is turned away up front instead of queueing on the DB pool.
+    """
+
+    def __init__(self, max_in_flight: int, wait_seconds: float = 0.0) -> None:
+        self.max_in_flight = int(max_in_flight)
+        self._wait = float(wait_seconds)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def acquire(self) -> bool:
+        if self._wait > 0:
+            return self._slots.acquire(timeout=self._wait)
+        return self._slots.acquire(blocking=False)
+
+    def release(self) -> None:
+        self._slots.release()
+
+
+def _build_concurrency_limiter() -> Optional[ConcurrencyLimiter]:
+    if settings.max_in_flight_requests <= 0:
+        return None
+    return ConcurrencyLimiter(
+        settings.max_in_flight_requests, settings.in_flight_wait_seconds
+    )
+
+
+_concurrency = _build_concurrency_limiter()
+
+
+def init_request_limits(app: Flask) -> None:
+    """Shed load and enforce rate policies before any route (or DB) work starts."""
+
+    @app.before_request
+    def _enforce_request_limits():
+        if request.method == "OPTIONS" or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if _concurrency is not None:
+            if not _concurrency.acquire():
+                return _limited_response(
+                    503,
+                    "Servidor sobrecarregado. Tente novamente em instantes.",
+                    OVERLOADED_RETRY_AFTER_SECONDS,
+                )
+            # Kept in the WSGI environ, not ``g``: teardown must see it even when
+            # the request shares an app context that has already been popped.
+            request.environ[_SLOT_ENVIRON_KEY] = _concurrency
+        return check_rate_policy()
+
+    @app.teardown_request
+    def _release_request_slot(_exc=None):
+        limiter = request.environ.pop(_SLOT_ENVIRON_KEY, None)
+        if limiter is not None:
+            limiter.release()
+
+
+def reset_rate_limits() -> None:
+    """Forget every route limiter (and its in-memory counts)."""
+
+    with _limiters_lock:
+        _limiters.clear()
+
+
+__all__ = [
+    "ConcurrencyLimiter",
+    "RatePolicy",
+    "client_ip",
+    "check_rate_policy",
+    "init_request_limits",
+    "limit_blueprint",
+    "rate_limit",
+    "reset_rate_limits",
+]
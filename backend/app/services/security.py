@@ -4,13 +4,15 @@ import jwt
 import secrets
 import time
 from datetime import datetime, timedelta, timezone
-from passlib.hash import bcrypt
 from flask import Response, request, has_request_context
 from werkzeug.exceptions import Unauthorized, Forbidden
 
 from app.core.db import get_db
 from app.core.settings import settings
+from app.models.lookups import LkRole
 from app.models.users import User
+from app.services.password_hasher import get_password_hasher
+from app.services.session_cache import CurrentUser, remember_user, resolve_session
 
 JWT_ALG = "HS256"
 CSRF_TTL_SECONDS = 12 * 60 * 60  # 12 horas
@@ -35,11 +37,19 @@ def _secure_cookie_flag() -> bool:
 
 
 def hash_password(password: str) -> str:
-    return bcrypt.hash(password)
+    return get_password_hasher().hash(password)
 
 
 def verify_password(password: str, password_hash: str | bytes) -> bool:
-    return bcrypt.verify(password, password_hash)
+    return get_password_hasher().verify(password, password_hash)[0]
+
+
+def verify_and_update_password(
+    password: str, password_hash: str | bytes
+) -> tuple[bool, str | None]:
+    """Like ``verify_password``, plus a new hash when ``BCRYPT_ROUNDS`` went up."""
+
+    return get_password_hasher().verify(password, password_hash)
 
 
 def sign_session(payload: dict, expires_in: timedelta = timedelta(days=1)) -> str:
@@ -217,36 +227,61 @@ def enforce_csrf(request_obj=None):
         raise Forbidden(description="CSRF token expirado ou inválido")
 
 
-def get_current_user_id(req=None) -> str:
-    req = req or request
-    token = req.cookies.get(settings.COOKIE_NAME)
-    if not token:
-        raise Unauthorized(description="Não autenticado")
+def _decode_session(token: str) -> dict:
     try:
-        decoded = jwt.decode(
+        return jwt.decode(
             token,
             settings.JWT_SECRET,
             algorithms=["HS256"],
             options={"require": ["exp"]},
         )
-        return decoded["id"]
     except jwt.PyJWTError:
         raise Unauthorized(description="Sessão inválida")
 
 
-def get_current_user() -> User:
-    user_id = get_current_user_id()
+def _session_token(req=None) -> str:
+    req = req or request
+    token = req.cookies.get(settings.COOKIE_NAME)
+    if not token:
+        raise Unauthorized(description="Não autenticado")
+    return token
+
+
+def get_current_user_id(req=None) -> str:
+    # Verified tokens are cached per request and, briefly, per process, so
+    # repeated calls do not decode the JWT again.
+    return resolve_session(_session_token(req), _decode_session).subject
+
+
+def get_current_user() -> CurrentUser:
+    token = _session_token()
+    entry = resolve_session(token, _decode_session)
+    if entry.user is not None:
+        return entry.user
+
     db = get_db()
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if not user:
+    row = (
+        db.query(User.user_id, User.email, User.username, LkRole.code)
+        .outerjoin(LkRole, LkRole.id == User.role_id)
+        .filter(User.user_id == entry.subject)
+        .first()
+    )
+    if not row:
         raise Unauthorized(description="Não autenticado")
+    user = CurrentUser(
+        user_id=row.user_id,
+        email=row.email,
+        username=row.username,
+        role_code=row.code or "User",
+    )
+    remember_user(token, entry, user)
     return user
 
 
 FORBID = Forbidden(description="Sem permissão")
 
 
-def require_roles(*roles: str) -> User:
+def require_roles(*roles: str) -> CurrentUser:
     user = get_current_user()
     if user.role_code not in roles:
         raise FORBID
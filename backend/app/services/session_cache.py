@@ -0,0 +1,129 @@
+"""Request- and process-scoped cache of verified session tokens and principals."""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Optional
+
+from flask import g, has_request_context
+
+from app.core.settings import settings
+from app.services.local_cache import LocalCache
+
+
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """Slim projection of the authenticated user (no ORM state)."""
+
+    user_id: int
+    email: str
+    username: str
+    role_code: str
+
+
+@dataclass(frozen=True, slots=True)
+class SessionEntry:
+    subject: Any  # the token's "id" claim, exactly as signed
+    expires_at: float
+    generation: int
+    user: Optional[CurrentUser] = None
+
+
+_cache: LocalCache[str, SessionEntry] = LocalCache(
+    max_entries=settings.session_cache_max_entries,
+    ttl_seconds=settings.session_cache_ttl_seconds,
+)
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _generation(subject: Any) -> int:
+    with _generations_lock:
+        return _generations.get(str(subject), 0)
+
+
+def _store(digest: str, entry: SessionEntry) -> None:
+    if has_request_context():
+        g.session_entry = (digest, entry)
+    if settings.session_cache_ttl_seconds <= 0:
+        return
+    # Never keep an entry past the token's own expiry.
+    remaining = entry.expires_at - time.time()
+    ttl = min(float(settings.session_cache_ttl_seconds), remaining)
+    if ttl > 0:
+        _cache.set(digest, entry, ttl_seconds=ttl)
+
+
+def resolve_session(token: str, decode: Callable[[str], dict]) -> SessionEntry:
+    """Return the cached entry for ``token`` or verify it with ``decode``.
+
+    ``decode`` must raise for invalid tokens; failures are never cached.
+    """
+
+    digest = token_digest(token)
+    if has_request_context():
+        scoped = g.get("session_entry")
+        if scoped is not None and scoped[0] == digest:
+            return scoped[1]
+
+    entry = _cache.get(digest)
+    if (
+        entry is not None
+        and entry.expires_at > time.time()
+        and entry.generation == _generation(entry.subject)
+    ):
+        if has_request_context():
+            g.session_entry = (digest, entry)
+        return entry
+
+    claims = decode(token)
+    entry = SessionEntry(
+        subject=claims["id"],
+        expires_at=float(claims["exp"]),
+        generation=_generation(claims["id"]),
+    )
+    _store(digest, entry)
+    return entry
+
+
+def remember_user(token: str, entry: SessionEntry, user: CurrentUser) -> SessionEntry:
+    if entry.generation != _generation(entry.subject):
+        # The user changed while we were loading them; keep it request-local.
+        return replace(entry, user=user)
+    updated = replace(entry, user=user)
+    _store(token_digest(token), updated)
+    return updated
+
+
+def invalidate_user_sessions(user_id: Any) -> None:
+    """Drop cached principals of ``user_id`` (role/password changes)."""
+
+    with _generations_lock:
+        key = str(user_id)
+        _generations[key] = _generations.get(key, 0) + 1
+    if has_request_context():
+        g.pop("session_entry", None)
+
+
+def clear_session_cache() -> None:
+    with _generations_lock:
+        _generations.clear()
+    _cache.clear()
+
+
+__all__ = [
+    "CurrentUser",
+    "SessionEntry",
+    "clear_session_cache",
+    "invalidate_user_sessions",
+    "remember_user",
+    "resolve_session",
+    "token_digest",
+]
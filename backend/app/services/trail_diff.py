@@ -0,0 +1,141 @@
+"""Structural diff between the stored trail tree and an incoming builder payload."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+# Table levels of the trail tree, parents first.
+LEVELS = ("sections", "items", "forms", "questions", "options")
+
+
+@dataclass
+class Node:
+    """One row of the tree: ``id`` is ``None`` for rows that do not exist yet."""
+
+    id: Optional[int]
+    row: Dict[str, Any]
+    children: List["Node"] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class New:
+    """Reference to the ``index``-th insert of the parent level."""
+
+    index: int
+
+
+# Existing parent id, a parent inserted by the same diff, or ``None`` at the root.
+ParentRef = Union[int, New, None]
+
+
+@dataclass
+class Insert:
+    parent: ParentRef
+    row: Dict[str, Any]
+
+
+@dataclass
+class Update:
+    id: int
+    values: Dict[str, Any]
+    parent: ParentRef = None  # only set when the row moves to another parent
+
+
+@dataclass
+class LevelDiff:
+    inserts: List[Insert] = field(default_factory=list)
+    updates: List[Update] = field(default_factory=list)
+    deletes: List[int] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
+
+
+@dataclass
+class TreeDiff:
+    levels: List[LevelDiff]
+
+    def __getitem__(self, level: str) -> LevelDiff:
+        return self.levels[LEVELS.index(level)]
+
+    def __bool__(self) -> bool:
+        return any(self.levels)
+
+    def counts(self) -> Dict[str, Tuple[int, int, int]]:
+        return {
+            name: (len(level.inserts), len(level.updates), len(level.deletes))
+            for name, level in zip(LEVELS, self.levels)
+        }
+
+
+def diff_trees(current: List[Node], incoming: List[Node]) -> TreeDiff:
+    """Compare two trees by id and return the writes that turn one into the other.
+
+    Incoming nodes are matched to stored rows of the same level by id, even
+    across parents (an item moved to another section keeps its id and only
+    gets its parent updated). Ids that are unknown, already claimed by an
+    earlier node, or ``None`` become inserts; stored rows nobody claimed
+    become deletes. Updates carry only the columns whose values changed.
+    """
+
+    depth = len(LEVELS)
+    stored: List[Dict[int, Tuple[ParentRef, Node]]] = [{} for _ in range(depth)]
+
+    def index(nodes: List[Node], level: int, parent: ParentRef) -> None:
+        for node in nodes:
+            if node.id is None:
+                continue
+            stored[level][node.id] = (parent, node)
+            if level + 1 < depth:
+                index(node.children, level + 1, node.id)
+
+    index(current, 0, None)
+
+    levels = [LevelDiff() for _ in range(depth)]
+    claimed: List[Set[int]] = [set() for _ in range(depth)]
+
+    def visit(nodes: List[Node], level: int, parent: ParentRef) -> None:
+        diff = levels[level]
+        for node in nodes:
+            match = None
+            if node.id is not None and node.id not in claimed[level]:
+                match = stored[level].get(node.id)
+            if match is None:
+                diff.inserts.append(Insert(parent=parent, row=node.row))
+                ref: ParentRef = New(len(diff.inserts) - 1)
+            else:
+                stored_parent, stored_node = match
+                claimed[level].add(node.id)
+                values = {
+                    key: value
+                    for key, value in node.row.items()
+                    if stored_node.row.get(key) != value
+                }
+                moved = parent if parent != stored_parent else None
+                if values or moved is not None:
+                    diff.updates.append(Update(node.id, values, moved))
+                ref = node.id
+            if level + 1 < depth:
+                visit(node.children, level + 1, ref)
+
+    visit(incoming, 0, None)
+
+    for level in range(depth):
+        levels[level].deletes = [
+            row_id for row_id in stored[level] if row_id not in claimed[level]
+        ]
+    return TreeDiff(levels)
+
+
+__all__ = [
+    "LEVELS",
+    "Insert",
+    "LevelDiff",
+    "New",
+    "Node",
+    "ParentRef",
+    "TreeDiff",
+    "Update",
+    "diff_trees",
+]
@@ -0,0 +1,167 @@
+"""Versioned in-memory outline (item order, sections, gating flags) per trail."""
+
+from __future__ import annotations
+
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session, aliased
+
+from app.core.settings import settings
+from app.models.trail_items import TrailItems as TrailItemsORM
+from app.models.trail_sections import TrailSections as TrailSectionsORM
+from app.services.local_cache import LocalCache
+
+
+@dataclass(frozen=True, slots=True)
+class OutlineItem:
+    id: int
+    section_id: Optional[int]
+    title: str
+    requires_completion: bool
+
+
+@dataclass(frozen=True)
+class TrailOutline:
+    trail_id: int
+    version: int
+    items: Tuple[OutlineItem, ...]
+    _positions: Dict[int, int] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(
+        cls, trail_id: int, version: int, items: List[OutlineItem]
+    ) -> "TrailOutline":
+        positions = {item.id: index for index, item in enumerate(items)}
+        return cls(trail_id, version, tuple(items), positions)
+
+    @property
+    def item_ids(self) -> List[int]:
+        return [item.id for item in self.items]
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._positions
+
+    def get(self, item_id: int) -> Optional[OutlineItem]:
+        position = self._positions.get(item_id)
+        return self.items[position] if position is not None else None
+
+    def first_item_id(self) -> Optional[int]:
+        return self.items[0].id if self.items else None
+
+    def required_before(self, item_id: int) -> List[OutlineItem]:
+        # Unknown targets are gated by every required item of the trail, which
+        # mirrors the behaviour of the original ordered scan.
+        end = self._positions.get(item_id, len(self.items))
+        return [item for item in self.items[:end] if item.requires_completion]
+
+    def neighbors(self, item_id: int) -> Tuple[Optional[int], Optional[int]]:
+        """Previous/next item ids inside the same section."""
+
+        position = self._positions.get(item_id)
+        if position is None:
+            return None, None
+        section_id = self.items[position].section_id
+        prev_id: Optional[int] = None
+        next_id: Optional[int] = None
+        if position > 0 and self.items[position - 1].section_id == section_id:
+            prev_id = self.items[position - 1].id
+        if (
+            position + 1 < len(self.items)
+            and self.items[position + 1].section_id == section_id
+        ):
+            next_id = self.items[position + 1].id
+        return prev_id, next_id
+
+
+_cache: LocalCache[int, TrailOutline] = LocalCache(
+    max_entries=settings.trail_outline_cache_size,
+    ttl_seconds=settings.trail_outline_ttl_seconds,
+)
+_versions: Dict[int, int] = {}
+_version_counter = itertools.count(1)
+_versions_lock = threading.Lock()
+
+
+def _current_version(trail_id: int) -> int:
+    with _versions_lock:
+        version = _versions.get(trail_id)
+        if version is None:
+            version = _versions[trail_id] = next(_version_counter)
+        return version
+
+
+def _requires_completion(row) -> bool:
+    if row.requires_completion is not None:
+        return bool(row.requires_completion)
+    if row.requires_completion_yn is not None:
+        return str(row.requires_completion_yn).upper() == "S"
+    return False
+
+
+def _load_items(db: Session, trail_id: int) -> List[OutlineItem]:
+    section_alias = aliased(TrailSectionsORM)
+    rows = (
+        db.query(
+            TrailItemsORM.id,
+            TrailItemsORM.section_id,
+            TrailItemsORM.title,
+            TrailItemsORM.requires_completion,
+            TrailItemsORM.requires_completion_yn,
+        )
+        .outerjoin(section_alias, section_alias.id == TrailItemsORM.section_id)
+        .filter(TrailItemsORM.trail_id == trail_id)
+        .order_by(
+            case((TrailItemsORM.section_id.is_(None), 0), else_=1),
+            section_alias.order_index.asc().nullsfirst(),
+            TrailItemsORM.order_index.asc().nullsfirst(),
+            TrailItemsORM.id.asc(),
+        )
+        .all()
+    )
+    return [
+        OutlineItem(
+            id=row.id,
+            section_id=row.section_id,
+            title=row.title or "",
+            requires_completion=_requires_completion(row),
+        )
+        for row in rows
+    ]
+
+
+def get_trail_outline(db: Session, trail_id: int) -> TrailOutline:
+    version = _current_version(trail_id)
+    outline = _cache.get(trail_id)
+    if outline is not None and outline.version == version:
+        return outline
+
+    outline = TrailOutline.build(trail_id, version, _load_items(db, trail_id))
+    # Skip caching if the trail was edited while we were reading it.
+    if _current_version(trail_id) == version:
+        _cache.set(trail_id, outline)
+    return outline
+
+
+def invalidate_trail_outline(trail_id: int) -> None:
+    with _versions_lock:
+        _versions[trail_id] = next(_version_counter)
+    _cache.pop(trail_id)
+
+
+def clear_trail_outlines() -> None:
+    with _versions_lock:
+        _versions.clear()
+    _cache.clear()
+
+
+__all__ = [
+    "OutlineItem",
+    "TrailOutline",
+    "clear_trail_outlines",
+    "get_trail_outline",
+    "invalidate_trail_outline",
+]
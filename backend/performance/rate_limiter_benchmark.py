@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""Benchmark auth rate limiters: attempts per second and memory per key."""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Optional
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.services.rate_limiter import (
+    FixedWindowRateLimiter,
+    RedisFixedWindowRateLimiter,
+    RedisSlidingWindowRateLimiter,
+    SlidingWindowRateLimiter,
+)
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    scenario: str
+    attempts: int
+    keys: int
+    total_time: float
+    attempts_per_second: float
+    bytes_per_key: float
+
+
+def _key_sequence(scenario: str, attempts: int, keys: int) -> list[str]:
+    # "stuffing": every attempt uses a new e-mail (one hit per key, the worst
+    # case for per-key state); "hot": attempts spread over a few keys.
+    if scenario == "stuffing":
+        return [
+            f"login:victim{index}@example.com:10.0.0.1" for index in range(attempts)
+        ]
+    return [
+        f"login:user{index % keys}@example.com:10.0.0.1" for index in range(attempts)
+    ]
+
+
+def bench_memory(
+    name: str, factory: Callable[[], object], scenario: str, attempts: int, keys: int
+) -> BenchmarkResult:
+    sequence = _key_sequence(scenario, attempts, keys)
+    distinct = len(set(sequence))
+
+    gc.collect()
+    tracemalloc.start()
+    limiter = factory()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = perf_counter()
+    for key in sequence:
+        limiter.register_attempt(key)
+    elapsed = perf_counter() - start
+    # Key strings are owned by ``sequence``, so only limiter state is counted.
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name,
+        scenario=scenario,
+        attempts=attempts,
+        keys=distinct,
+        total_time=elapsed,
+        attempts_per_second=attempts / elapsed if elapsed > 0 else 0.0,
+        bytes_per_key=used / distinct if distinct else 0.0,
+    )
+
+
+def bench_redis(
+    name: str, limiter, client, scenario: str, attempts: int, keys: int
+) -> BenchmarkResult:
+    namespace = f"bench-{uuid.uuid4().hex[:8]}"
+    limiter._namespace = namespace
+    sequence = _key_sequence(scenario, attempts, keys)
+    distinct = sorted(set(sequence))
+
+    start = perf_counter()
+    for key in sequence:
+        limiter.register_attempt(key)
+    elapsed = perf_counter() - start
+
+    sample = distinct[: min(len(distinct), 1000)]
+    sizes = [client.memory_usage(limiter._key(key)) or 0 for key in sample]
+    for batch_start in range(0, len(distinct), 1000):
+        batch = distinct[batch_start : batch_start + 1000]
+        client.delete(*(limiter._key(key) for key in batch))
+
+    return BenchmarkResult(
+        name=name,
+        scenario=scenario,
+        attempts=attempts,
+        keys=len(distinct),
+        total_time=elapsed,
+        attempts_per_second=attempts / elapsed if elapsed > 0 else 0.0,
+        bytes_per_key=sum(sizes) / len(sizes) if sizes else 0.0,
+    )
+
+
+def print_results(results: list[BenchmarkResult]) -> None:
+    header = (
+        f"{'Limiter':34} {'Scenario':10} {'Attempts':>10} {'Keys':>10}"
+        f" {'Attempts/s':>14} {'Bytes/key':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result.name:34} {result.scenario:10} {result.attempts:>10,}"
+            f" {result.keys:>10,} {result.attempts_per_second:>14,.0f}"
+            f" {result.bytes_per_key:>12,.1f}"
+        )
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--attempts",
+        type=int,
+        default=200_000,
+        help="Attempts per limiter and scenario (default 200000).",
+    )
+    parser.add_argument(
+        "--keys",
+        type=int,
+        default=100,
+        help="Distinct keys in the 'hot' scenario (default 100).",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=10,
+        help="Limiter threshold per window (default 10).",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=60,
+        help="Limiter window in seconds (default 60).",
+    )
+    parser.add_argument(
+        "--redis-url",
+        help="Also benchmark the Redis limiters against this server.",
+    )
+    parser.add_argument("--json", help="Write the raw results to this JSON file.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    memory_limiters = {
+        "FixedWindowRateLimiter": lambda: FixedWindowRateLimiter(
+            args.max_attempts, args.window
+        ),
+        "SlidingWindowRateLimiter": lambda: SlidingWindowRateLimiter(
+            args.max_attempts, args.window
+        ),
+    }
+
+    results: list[BenchmarkResult] = []
+    for scenario in ("stuffing", "hot"):
+        for name, factory in memory_limiters.items():
+            results.append(
+                bench_memory(name, factory, scenario, args.attempts, args.keys)
+            )
+
+    if args.redis_url:
+        from redis import from_url
+
+        client = from_url(args.redis_url)
+        redis_limiters = {
+            "RedisFixedWindowRateLimiter": RedisFixedWindowRateLimiter(
+                client, args.max_attempts, args.window
+            ),
+            "RedisSlidingWindowRateLimiter": RedisSlidingWindowRateLimiter(
+                client, args.max_attempts, args.window
+            ),
+        }
+        for scenario in ("stuffing", "hot"):
+            for name, limiter in redis_limiters.items():
+                results.append(
+                    bench_redis(
+                        name, limiter, client, scenario, args.attempts, args.keys
+                    )
+                )
+
+    print_results(results)
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps([asdict(result) for result in results], indent=2)
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -189,7 +189,8 @@ CREATE TABLE public.trails (
     description     TEXT,
     requirements    TEXT[],
     target_audience TEXT[],
-    included_items  TEXT[]
+    included_items  TEXT[],
+    content_version INT NOT NULL DEFAULT 0
 );
 CREATE INDEX idx_trails_created_date ON public.trails (created_date DESC);
 CREATE INDEX idx_trails_name ON public.trails ("name");
@@ -201,6 +202,7 @@ CREATE TABLE public.user_trails (
     trail_id           BIGINT REFERENCES public.trails(id) ON DELETE CASCADE,
     status_id          INT REFERENCES public.lk_enrollment_status(id),
     progress_percent   NUMERIC(5,2) NOT NULL DEFAULT 0.00,
+    done_items         INT,
     started_at         TIMESTAMPTZ,
     completed_at       TIMESTAMPTZ,
     started_at_utc     TIMESTAMP,
@@ -224,7 +226,10 @@ CREATE TABLE public.forums (
     is_general  BOOLEAN NOT NULL,
     trail_id    INT UNIQUE REFERENCES public.trails(id) ON DELETE CASCADE,
     created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
-    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+    updated_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+    topics_count INT NOT NULL DEFAULT 0,
+    posts_count  INT NOT NULL DEFAULT 0,
+    last_activity_at TIMESTAMPTZ
 );
 
 -- DROP TABLE public.trail_certificates;
@@ -288,9 +293,12 @@ CREATE TABLE public.forum_topics (
     title         VARCHAR(255) NOT NULL,
     created_by_id INT REFERENCES public.users(user_id) ON DELETE SET NULL,
     created_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
-    updated_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+    updated_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+    posts_count   INT NOT NULL DEFAULT 0,
+    last_post_at  TIMESTAMPTZ NOT NULL DEFAULT now()
 );
 CREATE INDEX ix_forum_topics_forum_id ON public.forum_topics (forum_id);
+CREATE INDEX ix_forum_topics_forum_last_post ON public.forum_topics (forum_id, last_post_at DESC, id DESC);
 
 -- DROP TABLE public.trail_items;
 CREATE TABLE public.trail_items (
@@ -360,6 +368,7 @@ CREATE TABLE public.forum_posts (
     parent_post_id INT REFERENCES public.forum_posts(id) ON DELETE CASCADE
 );
 CREATE INDEX ix_forum_posts_topic_id ON public.forum_posts (topic_id);
+CREATE INDEX ix_forum_posts_topic_created ON public.forum_posts (topic_id, created_at, id);
 CREATE INDEX ix_forum_posts_parent_post_id ON public.forum_posts (parent_post_id);
 
 -- DROP TABLE public.form_question;
@@ -72,3 +72,30 @@ CREATE INDEX IF NOT EXISTS idx_trail_included_items_trail ON public.trail_includ
 CREATE INDEX IF NOT EXISTS idx_trail_requirements_trail ON public.trail_requirements (trail_id, ord);
 CREATE INDEX IF NOT EXISTS idx_trail_target_audience_trail ON public.trail_target_audience (trail_id, ord);
 CREATE INDEX IF NOT EXISTS idx_user_item_progress_status ON public.user_item_progress (status_id);
+
+-- Contadores desnormalizados dos fóruns (bancos criados antes das colunas).
+-- Depois de aplicar, rode: python -m app.scripts.repair_forum_counters
+ALTER TABLE public.forums ADD COLUMN IF NOT EXISTS topics_count INT NOT NULL DEFAULT 0;
+ALTER TABLE public.forums ADD COLUMN IF NOT EXISTS posts_count INT NOT NULL DEFAULT 0;
+ALTER TABLE public.forums ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMPTZ;
+ALTER TABLE public.forum_topics ADD COLUMN IF NOT EXISTS posts_count INT NOT NULL DEFAULT 0;
+ALTER TABLE public.forum_topics ADD COLUMN IF NOT EXISTS last_post_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS ix_forum_topics_forum_last_post ON public.forum_topics (forum_id, last_post_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_forum_posts_topic_created ON public.forum_posts (topic_id, created_at, id);
+
+-- Contador de itens concluídos por inscrição (PROGRESS_AGGREGATION_MODE=incremental).
+-- Depois de aplicar, rode: python -m app.scripts.reconcile_progress
+ALTER TABLE public.user_trails ADD COLUMN IF NOT EXISTS done_items INT;
+
+-- Versão do conteúdo da trilha, incrementada pelo construtor; invalida os gabaritos em cache.
+ALTER TABLE public.trails ADD COLUMN IF NOT EXISTS content_version INT NOT NULL DEFAULT 0;
+
+-- Fórum geral e fóruns das trilhas existentes (a API não cria mais sob demanda).
+INSERT INTO public.forums (slug, title, description, is_general)
+SELECT 'forum-geral', 'Fórum Geral', 'Espaço para conversas gerais da comunidade ROTA.', TRUE
+WHERE NOT EXISTS (SELECT 1 FROM public.forums WHERE is_general);
+INSERT INTO public.forums (slug, title, description, trail_id, is_general)
+SELECT 'trilha-' || t.id, t."name", 'Discussões sobre ' || t."name", t.id, FALSE
+FROM public.trails t
+WHERE NOT EXISTS (SELECT 1 FROM public.forums f WHERE f.trail_id = t.id)
+ON CONFLICT DO NOTHING;
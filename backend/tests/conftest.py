@@ -17,14 +17,66 @@ from app.core.db import (
     set_db_session_override,
     set_session_factory,
 )
+from app.core.query_budget import query_budget as query_budget_factory
 from app.core.settings import settings
 from app.models.base import Base
 from app.models.lookups import LkRole, LkSex, LkColor
+from app.services.certificate_cache import reset_certificate_cache
+from app.services.form_answer_keys import clear_form_answer_keys
+from app.services.image_derivatives import clear_image_variants
+from app.services.item_detail_cache import clear_item_details
+from app.services.lookups import lookups
+from app.services.request_limits import reset_rate_limits
+from app.services.session_cache import clear_session_cache
+from app.services.trail_outline import clear_trail_outlines
 
 
 app.config.update({"TESTING": True})
 
 
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(monkeypatch):
+    # Routes declaring @route_query_budget fail the request when they run more
+    # SQL than declared or repeat one statement shape (N+1).
+    monkeypatch.setattr(settings, "query_budget_mode", "raise")
+
+
+@pytest.fixture
+def query_budget():
+    """``with query_budget(n, max_repeats=...) as seen:`` around code under test.
+
+    Without limits it only records: ``seen.statements`` lists the statement
+    shapes that ran (savepoints excluded).
+    """
+
+    return query_budget_factory
+
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    # Rows are created inside per-test transactions and rolled back, so cached
+    # lookup ids, trail outlines, answer keys, item details, rendered
+    # certificates, session principals, image manifests and rate limit counts
+    # (user ids are reused after rollback) must not leak between tests.
+    lookups.clear()
+    clear_trail_outlines()
+    clear_form_answer_keys()
+    clear_item_details()
+    reset_certificate_cache()
+    clear_session_cache()
+    clear_image_variants()
+    reset_rate_limits()
+    yield
+    lookups.clear()
+    clear_trail_outlines()
+    clear_form_answer_keys()
+    clear_item_details()
+    reset_certificate_cache()
+    clear_session_cache()
+    clear_image_variants()
+    reset_rate_limits()
+
+
 @pytest.fixture(scope="function")
 def engine():
     engine_options = {"pool_pre_ping": True}
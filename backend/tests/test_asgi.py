@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+from app.asgi import PublicMicrocache
+from app.core.settings import settings
+
+
+class _CountingWSGI:
+    def __init__(self, *, delay: float = 0.0, headers=None):
+        self.calls = 0
+        self.delay = delay
+        self.headers = headers or []
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.calls += 1
+            count = self.calls
+        if self.delay:
+            threading.Event().wait(self.delay)
+        start_response("200 OK", [("Content-Type", "text/plain"), *self.headers])
+        return [f"{environ['PATH_INFO']}#{count}".encode()]
+
+
+async def _request(app, path, *, method="GET", cookie=None):
+    headers = [(b"host", b"testserver")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 1234),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    status = sent[0]["status"]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return status, body.decode()
+
+
+def test_anonymous_public_reads_are_served_from_cache():
+    wsgi = _CountingWSGI()
+    app = PublicMicrocache(wsgi, workers=2, ttl_seconds=60)
+
+    async def scenario():
+        first = await _request(app, "/forums/")
+        second = await _request(app, "/forums/")
+        logged_in = await _request(
+            app, "/forums/", cookie=f"{settings.COOKIE_NAME}=abc"
+        )
+        private = await _request(app, "/user-trails/me/overview")
+        await _request(app, "/forums/1/topics", method="POST")
+        after_write = await _request(app, "/forums/")
+        return first, second, logged_in, private, after_write
+
+    first, second, logged_in, private, after_write = asyncio.run(scenario())
+
+    assert first == (200, "/forums/#1")
+    assert second == first
+    assert logged_in == (200, "/forums/#2")
+    assert private == (200, "/user-trails/me/overview#3")
+    # The POST (#4) purged /forums entries, so the next read renders again.
+    assert after_write == (200, "/forums/#5")
+
+
+def test_concurrent_misses_render_once():
+    wsgi = _CountingWSGI(delay=0.05)
+    app = PublicMicrocache(wsgi, workers=4, ttl_seconds=60)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(_request(app, "/certificates/abc123") for _ in range(20))
+        )
+
+    responses = asyncio.run(scenario())
+
+    assert wsgi.calls == 1
+    assert {body for _status, body in responses} == {"/certificates/abc123#1"}
+
+
+def test_responses_setting_cookies_are_not_cached():
+    wsgi = _CountingWSGI(headers=[("Set-Cookie", "x=1")])
+    app = PublicMicrocache(wsgi, workers=2, ttl_seconds=60)
+
+    async def scenario():
+        await _request(app, "/trails/")
+        return await _request(app, "/trails/")
+
+    assert asyncio.run(scenario()) == (200, "/trails/#2")
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+
+from app.services import certificate_cache
+from app.services.certificate_cache import (
+    DiskCertificateCache,
+    MemoryCertificateCache,
+    RedisCertificateCache,
+    get_certificate_payload,
+    invalidate_certificates,
+    qr_data_uri,
+    set_certificate_cache,
+    store_certificate_payload,
+)
+
+
+def _roundtrip(backend) -> None:
+    set_certificate_cache(backend)
+    store_certificate_payload("ABC123", {"student_name": "Ana", "trail_id": 1})
+
+    assert get_certificate_payload("abc123") == {"student_name": "Ana", "trail_id": 1}
+
+    invalidate_certificates(["abc123"])
+    assert get_certificate_payload("abc123") is None
+
+
+def test_memory_backend_roundtrip():
+    _roundtrip(MemoryCertificateCache(max_entries=8, ttl_seconds=60))
+
+
+def test_disk_backend_roundtrip_and_expiry(tmp_path):
+    backend = DiskCertificateCache(tmp_path, ttl_seconds=60)
+    _roundtrip(backend)
+
+    backend.set("key", "value")
+    assert backend.get("key") == "value"
+    path = backend._path("key")
+    stale = time.time() - 120
+    os.utime(path, (stale, stale))
+    assert backend.get("key") is None
+    assert not path.exists()
+
+
+def test_disk_sweep_drops_expired_and_oldest_entries(tmp_path):
+    backend = DiskCertificateCache(tmp_path, ttl_seconds=60, max_entries=3)
+    backend._sweep_every = 100  # sweep explicitly below
+    now = time.time()
+    for index in range(5):
+        backend.set(f"key{index}", "value")
+        stamp = now - 10 * (5 - index)
+        os.utime(backend._path(f"key{index}"), (stamp, stamp))
+    expired = now - 120
+    os.utime(backend._path("key4"), (expired, expired))
+
+    assert backend.sweep() == 2
+    assert [backend.get(f"key{index}") for index in range(5)] == [
+        None,
+        "value",
+        "value",
+        "value",
+        None,
+    ]
+
+
+def test_disk_backend_sweeps_as_it_writes(tmp_path):
+    backend = DiskCertificateCache(tmp_path, ttl_seconds=0, max_entries=8)
+    for index in range(40):
+        backend.set(f"key{index}", "value")
+
+    assert len(list(tmp_path.glob("??/*"))) <= 8 + backend._sweep_every
+
+
+def test_redis_backend_roundtrip():
+    fakeredis = pytest.importorskip("fakeredis")
+    _roundtrip(RedisCertificateCache(fakeredis.FakeRedis(), ttl_seconds=60))
+
+
+def test_qr_is_rendered_once_per_payload(monkeypatch):
+    set_certificate_cache(MemoryCertificateCache(max_entries=8, ttl_seconds=0))
+    calls: list[str] = []
+    original = certificate_cache._render_qr
+
+    def counting_render(payload: str) -> str:
+        calls.append(payload)
+        return original(payload)
+
+    monkeypatch.setattr(certificate_cache, "_render_qr", counting_render)
+
+    first = qr_data_uri("https://example.com/certificados/?cert_hash=abc")
+    second = qr_data_uri("https://example.com/certificados/?cert_hash=abc")
+
+    assert first == second
+    assert first.startswith("data:image/png;base64,")
+    assert len(calls) == 1
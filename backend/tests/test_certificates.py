@@ -14,6 +14,11 @@ from app.models.trail_certificates import TrailCertificates
 from app.models.lk_enrollment_status import LkEnrollmentStatus
 from app.models.lk_progress_status import LkProgressStatus
 from app.models.lk_item_type import LkItemType
+from app.models.lookups import LkColor, LkRole, LkSex
+from app.models.users import User
+from app.repositories.CertificatesRepository import CertificatesRepository
+from app.repositories.UsersRepository import UsersRepository
+from app.scripts.backfill_certificates import backfill
 
 
 @event.listens_for(TrailCertificates, "before_insert")
@@ -138,3 +143,116 @@ def test_certificate_endpoint_commits_generated_certificate(client, db_session):
         .first()
     )
     assert cert is not None
+
+
+def test_public_certificate_is_cached_and_invalidated_on_rename(client, db_session):
+    email = _unique_email("cached")
+    register_resp = client.post(
+        "/auth/register",
+        json={
+            "email": email,
+            "password": "StrongPass!123",
+            "name_for_certificate": "Original Name",
+            "sex": "NotSpecified",
+            "color": "NS",
+            "birthday": "1990-01-01",
+            "username": f"user_{uuid.uuid4().hex[:6]}",
+            "social_name": "Original Name",
+            "role": "User",
+        },
+    )
+    assert register_resp.status_code == 200, register_resp.get_data(as_text=True)
+    user_id = register_resp.get_json()["user"]["user_id"]
+
+    trail = Trails(name="Cached Trail", thumbnail_path=None)
+    db_session.add(trail)
+    db_session.flush()
+    cert = CertificatesRepository(db_session).ensure_certificate(user_id, trail.id)
+    db_session.commit()
+
+    first = client.get(f"/certificates/{cert.certificate_hash}")
+    assert first.status_code == 200
+    assert first.get_json()["student_name"] == "Original Name"
+
+    # Bypass the repository: the cached payload is served as-is.
+    db_session.query(User).filter(User.user_id == user_id).update(
+        {User.name_for_certificate: "Direct Edit"}, synchronize_session=False
+    )
+    db_session.commit()
+    cached = client.get(f"/certificates/{cert.certificate_hash}").get_json()
+    assert cached["student_name"] == "Original Name"
+    assert cached["qr_code_data_uri"] == first.get_json()["qr_code_data_uri"]
+
+    user = db_session.get(User, user_id)
+    db_session.refresh(user)
+    UsersRepository(db_session).UpdateCertificateName(
+        user, name_for_certificate="Renamed"
+    )
+    renamed = client.get(f"/certificates/{cert.certificate_hash}").get_json()
+    assert renamed["student_name"] == "Renamed"
+
+    trusted = client.get(
+        f"/certificates/{cert.certificate_hash}",
+        query_string={"verify_base": "http://localhost:5173/"},
+    ).get_json()
+    assert trusted["verification_url"].startswith(
+        "http://localhost:5173/certificados/?cert_hash="
+    )
+    # Arbitrary bases would each mint a new QR cache entry.
+    spoofed = client.get(
+        f"/certificates/{cert.certificate_hash}",
+        query_string={"verify_base": "https://evil.example"},
+    ).get_json()
+    assert spoofed["verification_url"].startswith("http://localhost/certificados/")
+    assert spoofed["qr_code_data_uri"] == first.get_json()["qr_code_data_uri"]
+
+
+def test_backfill_inserts_missing_certificates_in_batches(db_session):
+    db_session.add_all(
+        [LkEnrollmentStatus(code="ENROLLED"), LkEnrollmentStatus(code="COMPLETED")]
+    )
+    db_session.flush()
+    status = {row.code: row.id for row in db_session.query(LkEnrollmentStatus).all()}
+
+    user = User(
+        email=_unique_email("backfill"),
+        password_hash="x",
+        name_for_certificate="Backfill User",
+        username=f"bf_{uuid.uuid4().hex[:6]}",
+        sex_id=db_session.query(LkSex.id).filter_by(code="NS").scalar(),
+        color_id=db_session.query(LkColor.id).filter_by(code="NS").scalar(),
+        role_id=db_session.query(LkRole.id).filter_by(code="User").scalar(),
+    )
+    db_session.add(user)
+    db_session.flush()
+
+    trails = [Trails(name=f"Backfill {index}") for index in range(5)]
+    db_session.add_all(trails)
+    db_session.flush()
+    for index, trail in enumerate(trails):
+        db_session.add(
+            UserTrails(
+                id=index + 1,
+                user_id=user.user_id,
+                trail_id=trail.id,
+                status_id=status["ENROLLED" if index == 4 else "COMPLETED"],
+            )
+        )
+    db_session.flush()
+    CertificatesRepository(db_session).ensure_certificate(user.user_id, trails[0].id)
+    db_session.commit()
+
+    dry = backfill(db_session, dry_run=True, log=lambda _msg: None)
+    assert dry.scanned == 3
+    assert db_session.query(TrailCertificates).count() == 1
+
+    partial = backfill(db_session, batch_size=2, log=lambda _msg: None)
+    assert partial.scanned == 3 and partial.inserted == 3
+    assert partial.batches == 2 and partial.last_id == 4
+
+    certs = db_session.query(TrailCertificates).filter_by(user_id=user.user_id).all()
+    assert sorted(cert.trail_id for cert in certs) == [t.id for t in trails[:4]]
+    assert len({cert.certificate_hash for cert in certs}) == 4
+
+    again = backfill(db_session, log=lambda _msg: None)
+    assert again.scanned == 0 and again.inserted == 0
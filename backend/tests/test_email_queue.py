@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import smtplib
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from app.services.email_queue import EmailQueue
+
+
+def _message(index: int) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = f"Mensagem {index}"
+    message["From"] = "rota@example.com"
+    message["To"] = f"aluno{index}@example.com"
+    message.set_content(f"Corpo {index}")
+    return message
+
+
+class _FakeConnection:
+    def __init__(self, outbox: list[str], failures: list[Exception]):
+        self._outbox = outbox
+        self._failures = failures
+
+    def send_message(self, message):
+        if self._failures:
+            raise self._failures.pop(0)
+        self._outbox.append(message["Subject"])
+
+    def quit(self):
+        pass
+
+
+def _queue(tmp_path, outbox, failures=None, **kwargs) -> tuple[EmailQueue, list]:
+    connections: list[_FakeConnection] = []
+    failures = failures if failures is not None else []
+
+    def factory():
+        connection = _FakeConnection(outbox, failures)
+        connections.append(connection)
+        return connection
+
+    options = {"workers": 1, "retry_backoff": 0, "poll_interval": 0.01}
+    options.update(kwargs)
+    return EmailQueue(tmp_path, connection_factory=factory, **options), connections
+
+
+def test_messages_reuse_one_connection(tmp_path):
+    outbox: list[str] = []
+    email_queue, connections = _queue(tmp_path, outbox)
+    email_queue.start()
+    try:
+        for index in range(5):
+            email_queue.enqueue(_message(index))
+        assert email_queue.join()
+    finally:
+        email_queue.stop()
+
+    assert sorted(outbox) == [f"Mensagem {index}" for index in range(5)]
+    assert len(connections) == 1
+    assert email_queue.pending_count() == 0
+
+
+def test_transient_failures_are_retried_and_permanent_ones_parked(tmp_path):
+    outbox: list[str] = []
+    failures = [
+        smtplib.SMTPResponseException(451, b"try later"),
+        smtplib.SMTPServerDisconnected("gone"),
+    ]
+    email_queue, connections = _queue(tmp_path, outbox, failures, max_attempts=3)
+    email_queue.enqueue(_message(1))
+    email_queue.start()
+    try:
+        assert email_queue.join()
+        failures.append(smtplib.SMTPResponseException(550, b"no such user"))
+        email_queue.enqueue(_message(2))
+        assert email_queue.join()
+    finally:
+        email_queue.stop()
+
+    # 451 -> retried later; the pooled connection then drops and is replaced
+    # transparently, so the second attempt delivers.
+    assert outbox == ["Mensagem 1"]
+    assert len(connections) == 2
+    # 550 is permanent: no retry, the message is kept under failed/.
+    assert email_queue.failed_count() == 1
+    assert email_queue.pending_count() == 0
+
+
+def test_spooled_messages_survive_restart(tmp_path):
+    outbox: list[str] = []
+    first, _ = _queue(tmp_path, outbox)
+    first.enqueue(_message(1))  # never started: simulates a crash before delivery
+    assert first.pending_count() == 1
+
+    second, _ = _queue(tmp_path, outbox)
+    second.start()
+    try:
+        assert second.join()
+    finally:
+        second.stop()
+
+    assert outbox == ["Mensagem 1"]
+
+
+def test_bad_spool_files_are_parked_without_stopping_workers(tmp_path):
+    outbox: list[str] = []
+    email_queue, _ = _queue(tmp_path, outbox)
+    pending = tmp_path / "pending"
+    (pending / "notas.eml").write_text("não é um job")
+    # A directory with a valid job name is claimed but cannot be opened.
+    (pending / f"{'a' * 32}.1.eml").mkdir()
+    email_queue.start()
+    try:
+        assert email_queue.join()
+        email_queue.enqueue(_message(1))
+        assert email_queue.join()
+    finally:
+        email_queue.stop()
+
+    assert outbox == ["Mensagem 1"]
+    assert sorted(path.name for path in (tmp_path / "failed").iterdir()) == [
+        f"{'a' * 32}.1.eml",
+        "notas.eml",
+    ]
+    assert email_queue.pending_count() == 0
+
+
+def test_delivers_through_local_smtp_server(tmp_path):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+
+    received: list[str] = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append(envelope.rcpt_tos[0])
+            return "250 OK"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    controller = controller_module.Controller(
+        Handler(), hostname="127.0.0.1", port=port
+    )
+    controller.start()
+    connections: list[smtplib.SMTP] = []
+
+    def factory():
+        connection = smtplib.SMTP("127.0.0.1", port)
+        connections.append(connection)
+        return connection
+
+    email_queue = EmailQueue(
+        tmp_path, connection_factory=factory, workers=1, poll_interval=0.01
+    )
+    email_queue.start()
+    try:
+        for index in range(3):
+            email_queue.enqueue(_message(index))
+        assert email_queue.join()
+    finally:
+        email_queue.stop()
+        controller.stop()
+
+    assert sorted(received) == [f"aluno{index}@example.com" for index in range(3)]
+    assert len(connections) == 1
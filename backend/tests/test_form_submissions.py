@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+from app.models.form_answers import FormAnswer
+from app.models.form_question_options import FormQuestionOption
+from app.models.form_questions import FormQuestion
+from app.models.form_submissions import FormSubmission
+from app.models.forms import Form
+from app.models.lk_enrollment_status import LkEnrollmentStatus
+from app.models.lk_item_type import LkItemType
+from app.models.lk_question_type import LkQuestionType
+from app.models.trail_items import TrailItems
+from app.models.trails import Trails
+from app.models.user_trails import UserTrails
+from app.models.users import User
+from app.services.form_answer_keys import (
+    get_form_answer_key,
+    invalidate_form_answer_keys,
+)
+from tests.test_me import register_and_login
+
+
+def _seed_form(session):
+    session.add_all(
+        [
+            LkEnrollmentStatus(code="ENROLLED"),
+            LkItemType(code="FORM"),
+            LkQuestionType(code="SINGLE_CHOICE"),
+            LkQuestionType(code="ESSAY"),
+        ]
+    )
+    session.flush()
+    single = session.query(LkQuestionType).filter_by(code="SINGLE_CHOICE").one()
+    trail = Trails(name="Trilha com prova")
+    session.add(trail)
+    session.flush()
+    item = TrailItems(
+        trail_id=trail.id,
+        title="Prova",
+        url="",
+        order_index=0,
+        legacy_type="FORM",
+        item_type_id=session.query(LkItemType.id).filter_by(code="FORM").scalar(),
+    )
+    session.add(item)
+    session.flush()
+    # forms/questions/options use BIGINT keys, which sqlite does not autoincrement.
+    session.add(
+        Form(id=item.id, trail_item_id=item.id, min_score_to_pass=Decimal("70"))
+    )
+    session.flush()
+    questions = []
+    for index in range(2):
+        question = FormQuestion(
+            id=item.id * 10 + index,
+            form_id=item.id,
+            prompt=f"Pergunta {index}",
+            question_type_id=single.id,
+            required=True,
+            order_index=index,
+            points=Decimal("1"),
+        )
+        session.add(question)
+        session.flush()
+        session.add_all(
+            [
+                FormQuestionOption(
+                    id=question.id * 10 + option,
+                    question_id=question.id,
+                    option_text=f"Opção {option}",
+                    is_correct=option == 0,
+                    order_index=option,
+                )
+                for option in range(2)
+            ]
+        )
+        questions.append(question)
+    session.flush()
+    return trail, item, questions
+
+
+def _enroll(session, trail):
+    user_id = session.query(User.user_id).order_by(User.user_id.desc()).scalar()
+    session.add(
+        UserTrails(
+            id=trail.id,
+            user_id=user_id,
+            trail_id=trail.id,
+            status_id=session.query(LkEnrollmentStatus.id).scalar(),
+            progress_percent=0,
+        )
+    )
+    session.flush()
+
+
+def test_submission_is_graded_from_answer_key_and_bulk_inserted(
+    client, db_session, query_budget
+):
+    trail, item, (first, second) = _seed_form(db_session)
+    login = register_and_login(client, db_session)
+    headers = {"X-CSRF-Token": login.headers["X-CSRF-Token"]}
+    _enroll(db_session, trail)
+
+    with query_budget() as submission:
+        resp = client.post(
+            f"/trails/{trail.id}/items/{item.id}/form-submissions",
+            json={
+                "answers": [
+                    {"question_id": first.id, "selected_option_id": first.id * 10},
+                    {
+                        "question_id": second.id,
+                        "selected_option_id": second.id * 10 + 1,
+                    },
+                ]
+            },
+            headers=headers,
+        )
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    body = resp.get_json()
+    assert body["score"] == 50.0
+    assert body["max_points"] == 2.0
+    assert body["passed"] is False
+    assert [answer["is_correct"] for answer in body["answers"]] == [True, False]
+
+    answers = (
+        db_session.query(FormAnswer)
+        .filter_by(submission_id=body["submission_id"])
+        .order_by(FormAnswer.question_id)
+        .all()
+    )
+    assert [(a.question_id, a.is_correct) for a in answers] == [
+        (first.id, True),
+        (second.id, False),
+    ]
+    assert db_session.get(FormSubmission, body["submission_id"]).passed is False
+    inserts = [
+        s for s in submission.statements if s.startswith("INSERT INTO form_answers")
+    ]
+    assert len(inserts) == 1
+
+    invalid = client.post(
+        f"/trails/{trail.id}/items/{item.id}/form-submissions",
+        json={
+            "answers": [
+                {"question_id": first.id, "selected_option_id": second.id * 10},
+                {"question_id": second.id, "selected_option_id": second.id * 10},
+            ]
+        },
+        headers=headers,
+    )
+    assert invalid.status_code == 422
+    assert invalid.get_json()["question_id"] == first.id
+
+
+def test_answer_key_is_cached_until_trail_version_changes(db_session):
+    trail, item, (first, _second) = _seed_form(db_session)
+
+    key = get_form_answer_key(db_session, trail.id, item.id)
+    assert key.get(first.id).correct_option_ids == frozenset({first.id * 10})
+    assert get_form_answer_key(db_session, trail.id, item.id) is key
+
+    db_session.query(FormQuestionOption).filter_by(id=first.id * 10 + 1).update(
+        {FormQuestionOption.is_correct: True}
+    )
+    assert get_form_answer_key(db_session, trail.id, item.id) is key
+
+    # A save through the builder on another worker only bumps the version;
+    # this process's cache was never told about it.
+    db_session.query(Trails).filter_by(id=trail.id).update(
+        {Trails.content_version: Trails.content_version + 1}
+    )
+    refreshed = get_form_answer_key(db_session, trail.id, item.id)
+    assert refreshed is not key
+    assert refreshed.get(first.id).correct_option_ids == frozenset(
+        {first.id * 10, first.id * 10 + 1}
+    )
+    assert get_form_answer_key(db_session, trail.id, item.id) is refreshed
+
+    invalidate_form_answer_keys(trail.id)
+    assert get_form_answer_key(db_session, trail.id, item.id) is not refreshed
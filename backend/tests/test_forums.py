@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from app.models.forums import Forum, ForumPost, ForumTopic
+from app.repositories.ForumsRepository import ForumsRepository
+from app.repositories.TrailsRepository import TrailsRepository
+from tests.test_me import register_and_login
+
+
+def test_counters_follow_topic_and_post_creation(db_session):
+    repo = ForumsRepository(db_session)
+    forum = repo.ensure_general_forum()
+
+    topic = repo.create_topic(
+        forum_id=forum.id, title="Olá", content="<p>primeiro</p>", author_id=None
+    )
+    repo.create_post(topic_id=topic.id, content="<p>resposta</p>", author_id=None)
+    repo.create_post(topic_id=topic.id, content="<p>outra</p>", author_id=None)
+
+    topic_stats = repo.get_topic_stats(topic.id)
+    forum_stats = repo.get_forum_with_stats(forum.id)
+
+    assert topic_stats.posts_count == 3
+    assert topic_stats.last_post_at is not None
+    assert forum_stats.topics_count == 1
+    assert forum_stats.posts_count == 3
+    assert forum_stats.last_activity_at is not None
+
+
+def test_rebuild_counters_repairs_drift(db_session):
+    repo = ForumsRepository(db_session)
+    forum = repo.ensure_general_forum()
+    topic = repo.create_topic(
+        forum_id=forum.id, title="Olá", content="<p>primeiro</p>", author_id=None
+    )
+    repo.create_post(topic_id=topic.id, content="<p>resposta</p>", author_id=None)
+    db_session.flush()
+
+    db_session.query(Forum).filter(Forum.id == forum.id).update(
+        {Forum.topics_count: 0, Forum.posts_count: 42}, synchronize_session=False
+    )
+    db_session.query(ForumTopic).filter(ForumTopic.id == topic.id).update(
+        {ForumTopic.posts_count: 0}, synchronize_session=False
+    )
+
+    forums_updated, topics_updated = repo.rebuild_counters()
+
+    assert forums_updated >= 1 and topics_updated >= 1
+    forum_stats = repo.get_forum_with_stats(forum.id)
+    assert forum_stats.topics_count == 1
+    assert forum_stats.posts_count == 2
+    assert repo.get_topic_stats(topic.id).posts_count == 2
+
+
+def _walk_cursor(client, url: str, key: str) -> list[list[int]]:
+    pages: list[list[int]] = []
+    cursor = ""
+    while True:
+        resp = client.get(url, query_string={"cursor": cursor, "page_size": 2})
+        assert resp.status_code == 200
+        body = resp.get_json()
+        pages.append([row["id"] for row in body[key]])
+        cursor = body["pagination"]["next_cursor"]
+        if not body["pagination"]["has_more"]:
+            assert cursor is None
+            return pages
+
+
+def test_topics_keyset_pagination_is_stable_across_ties(client, db_session):
+    repo = ForumsRepository(db_session)
+    forum = repo.ensure_general_forum()
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    topics = []
+    for index, offset in enumerate([0, 5, 5, 5, 10]):
+        topic = repo.create_topic(
+            forum_id=forum.id, title=f"T{index}", content="<p>x</p>", author_id=None
+        )
+        topic.last_post_at = base + timedelta(minutes=offset)
+        topics.append(topic)
+    db_session.flush()
+
+    pages = _walk_cursor(client, f"/forums/{forum.id}/topics", "topics")
+
+    t = [topic.id for topic in topics]
+    assert pages == [[t[4], t[3]], [t[2], t[1]], [t[0]]]
+
+    legacy = client.get(
+        f"/forums/{forum.id}/topics", query_string={"page": 2, "page_size": 2}
+    ).get_json()
+    assert [row["id"] for row in legacy["topics"]] == [t[2], t[1]]
+    assert legacy["pagination"]["total"] == 5
+    assert legacy["pagination"]["pages"] == 3
+
+
+def test_posts_keyset_pagination_and_invalid_cursor(client, db_session):
+    repo = ForumsRepository(db_session)
+    forum = repo.ensure_general_forum()
+    topic = repo.create_topic(
+        forum_id=forum.id, title="Posts", content="<p>x</p>", author_id=None
+    )
+    for _ in range(3):
+        repo.create_post(topic_id=topic.id, content="<p>y</p>", author_id=None)
+    posts = (
+        db_session.query(ForumPost)
+        .filter(ForumPost.topic_id == topic.id)
+        .order_by(ForumPost.id)
+        .all()
+    )
+    stamp = datetime(2024, 1, 1, 12, 0, 0)
+    for post in posts:
+        post.created_at = stamp
+    db_session.flush()
+
+    pages = _walk_cursor(client, f"/forums/topics/{topic.id}/posts", "posts")
+
+    ids = [post.id for post in posts]
+    assert pages == [ids[:2], ids[2:]]
+
+    resp = client.get(
+        f"/forums/topics/{topic.id}/posts", query_string={"cursor": "not-a-cursor"}
+    )
+    assert resp.status_code == 400
+
+
+def test_forum_reads_do_not_provision_missing_forums(client, db_session):
+    trail = TrailsRepository(db_session).create_trail(
+        name="Sem fórum",
+        thumbnail_path=None,
+        description=None,
+        author=None,
+        created_by=None,
+        sections=[],
+    )
+    trail_forum = db_session.query(Forum).filter(Forum.trail_id == trail.id)
+    assert trail_forum.count() == 1
+
+    trail_forum.delete()
+    db_session.flush()
+    before = db_session.query(Forum).count()
+
+    resp = client.get("/forums/")
+
+    assert resp.status_code == 200
+    assert db_session.query(Forum).count() == before
+
+    assert ForumsRepository(db_session).ensure_trail_forums() == 1
+    assert trail_forum.count() == 1
+
+
+def test_create_post_route_returns_the_author(client, db_session):
+    login = register_and_login(client, db_session)
+    repo = ForumsRepository(db_session)
+    forum = repo.ensure_general_forum()
+    topic = repo.create_topic(
+        forum_id=forum.id, title="Olá", content="<p>primeiro</p>", author_id=None
+    )
+    db_session.flush()
+
+    resp = client.post(
+        f"/forums/topics/{topic.id}/posts",
+        json={"content": "<p>resposta</p>"},
+        headers={"X-CSRF-Token": login.headers["X-CSRF-Token"]},
+    )
+
+    assert resp.status_code == 201, resp.get_data(as_text=True)
+    body = resp.get_json()
+    assert body["post"]["author"]["username"].startswith("user_")
+    assert "profile_pic_url" in body["post"]["author"]
+    assert body["topic"]["posts_count"] == 2
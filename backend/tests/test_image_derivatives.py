@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+from PIL import Image
+
+from app.main import app
+from app.models.lk_enrollment_status import LkEnrollmentStatus
+from app.models.user_trails import UserTrails
+from app.models.users import User
+from app.repositories.MembersRepository import MembersRepository
+from app.repositories.TrailsRepository import TrailsRepository
+from app.services import image_derivatives, media
+from tests.test_me import register_and_login
+
+
+@pytest.fixture
+def static_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "static_folder", str(tmp_path))
+    with app.app_context():
+        yield tmp_path
+
+
+def test_members_expose_srcset_once_the_manifest_exists(
+    client, db_session, static_root
+):
+    photo = "uploads/members/foto.png"
+    (static_root / "uploads/members").mkdir(parents=True)
+    (static_root / photo).write_bytes(b"\x89PNG")
+    MembersRepository(db_session).create_member(
+        full_name="Ana",
+        role=None,
+        bio=None,
+        order_index=0,
+        photo_path=photo,
+    )
+
+    member = client.get("/members").get_json()["members"][0]
+    assert member["photo_variants"] is None
+
+    variants = static_root / f"{photo}{media.IMAGE_VARIANTS_SUFFIX}"
+    variants.mkdir()
+    (variants / image_derivatives.MANIFEST_NAME).write_text(
+        json.dumps(
+            {
+                "width": 800,
+                "height": 600,
+                "placeholder": "data:image/webp;base64,AAAA",
+                "formats": {
+                    "webp": [
+                        [160, f"{photo}.variants/w160.webp"],
+                        [320, f"{photo}.variants/w320.webp"],
+                    ]
+                },
+            }
+        )
+    )
+    image_derivatives.clear_image_variants()
+
+    member = client.get("/members").get_json()["members"][0]
+    srcset = member["photo_variants"]["srcset"]["webp"]
+    assert srcset.endswith(
+        f"/static/{photo}.variants/w160.webp 160w, "
+        f"http://localhost/static/{photo}.variants/w320.webp 320w"
+    )
+    assert member["photo_variants"]["placeholder"] == "data:image/webp;base64,AAAA"
+
+    media.delete_media(photo)
+    assert not variants.exists()
+
+
+def test_generate_image_derivatives_writes_each_width_and_format(static_root):
+    source = static_root / "uploads/trails/capa.png"
+    source.parent.mkdir(parents=True)
+    Image.new("RGB", (700, 350), "orange").save(source)
+
+    manifest = image_derivatives.generate_image_derivatives(
+        source, "uploads/trails/capa.png"
+    )
+
+    assert (manifest["width"], manifest["height"]) == (700, 350)
+    assert manifest["placeholder"].startswith("data:image/webp;base64,")
+    assert [width for width, _ in manifest["formats"]["webp"]] == [160, 320, 640]
+    for entries in manifest["formats"].values():
+        for width, path in entries:
+            with Image.open(static_root / path) as derived:
+                assert derived.size == (width, width // 2)
+    with app.test_request_context():
+        assert image_derivatives.image_variants("uploads/trails/capa.png") is not None
+
+
+def test_overview_exposes_generated_thumbnail_variants(client, db_session, static_root):
+    register_and_login(client, db_session)
+    user = db_session.query(User).order_by(User.user_id.desc()).first()
+    thumbnail = "uploads/trails/capa.png"
+    source = static_root / thumbnail
+    source.parent.mkdir(parents=True)
+    Image.new("RGB", (400, 200), "teal").save(source)
+    image_derivatives.generate_image_derivatives(source, thumbnail)
+
+    status = LkEnrollmentStatus(code="ENROLLED")
+    db_session.add(status)
+    db_session.flush()
+    trail = TrailsRepository(db_session).create_trail(
+        name="Trilha",
+        thumbnail_path=thumbnail,
+        description=None,
+        author="Equipe",
+        created_by=None,
+        sections=[],
+    )
+    db_session.add(
+        UserTrails(
+            id=1,
+            user_id=user.user_id,
+            trail_id=trail.id,
+            status_id=status.id,
+            progress_percent=0,
+            started_at=datetime.now(timezone.utc),
+        )
+    )
+    db_session.flush()
+
+    overview = client.get("/user-trails/me/overview").get_json()["trails"][0]
+    variants = overview["thumbnail_variants"]
+    assert (variants["width"], variants["height"]) == (400, 200)
+    assert variants["srcset"]["webp"].endswith(
+        f"/static/{thumbnail}.variants/w320.webp 320w"
+    )
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from app.models.trail_items import TrailItems
+from app.services.trail_outline import invalidate_trail_outline
+from tests.test_me import register_and_login
+from tests.test_trail_outline import _create_trail, _item_ids
+
+
+def test_item_detail_is_served_from_cache_with_per_user_lock(
+    client, db_session, query_budget
+):
+    trail = _create_trail(db_session)
+    ids = _item_ids(db_session, trail.id)
+    register_and_login(client, db_session)
+    url = f"/trails/{trail.id}/items/{ids['A']}"
+
+    first = client.get(url)
+    assert first.status_code == 200, first.get_data(as_text=True)
+    assert first.get_json()["title"] == "A"
+    assert first.get_json()["next_item_id"] == ids["B"]
+
+    with query_budget() as cached:
+        second = client.get(url)
+    assert second.get_data() == first.get_data()
+    assert not any("FROM trail_items" in statement for statement in cached.statements)
+
+    # B sits behind the required item A: the lock is still evaluated per user.
+    locked = client.get(f"/trails/{trail.id}/items/{ids['B']}")
+    assert locked.status_code == 423
+    assert locked.get_json()["blocked_item"]["id"] == ids["A"]
+
+    assert client.get(f"/trails/{trail.id}/items/999999").status_code == 404
+
+    db_session.query(TrailItems).filter_by(id=ids["A"]).update(
+        {TrailItems.title: "A revisado"}
+    )
+    assert client.get(url).get_json()["title"] == "A"
+    invalidate_trail_outline(trail.id)
+    assert client.get(url).get_json()["title"] == "A revisado"
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import threading
+
+from app.core.settings import settings
+from app.models.lk_enrollment_status import LkEnrollmentStatus
+from app.models.lk_item_type import LkItemType
+from app.models.lk_progress_status import LkProgressStatus
+from app.models.trail_items import TrailItems
+from app.models.trails import Trails
+from app.models.user_item_progress import UserItemProgress
+from app.models.user_trails import UserTrails
+from app.models.users import User
+from app.repositories.UserProgressRepository import UserProgressRepository
+from app.services.progress_buffer import (
+    ProgressCoalescer,
+    ProgressEvent,
+    reset_progress_coalescer,
+)
+from tests.test_me import register_and_login
+
+# Registers the sqlite id assigner for trail_certificates.
+import tests.test_certificates  # noqa: F401
+
+
+def _seed_trail(session):
+    session.add_all(
+        [
+            LkEnrollmentStatus(code="ENROLLED"),
+            LkEnrollmentStatus(code="IN_PROGRESS"),
+            LkEnrollmentStatus(code="COMPLETED"),
+            LkProgressStatus(code="IN_PROGRESS"),
+            LkProgressStatus(code="COMPLETED"),
+            LkItemType(code="VIDEO"),
+            LkItemType(code="DOC"),
+        ]
+    )
+    session.flush()
+    types = {row.code: row.id for row in session.query(LkItemType).all()}
+    trail = Trails(name="Trilha em lote")
+    session.add(trail)
+    session.flush()
+    items = [
+        TrailItems(
+            trail_id=trail.id,
+            title=title,
+            url=f"https://example.com/{order}",
+            order_index=order,
+            duration_seconds=duration,
+            legacy_type=code,
+            item_type_id=types[code],
+        )
+        for order, (title, code, duration) in enumerate(
+            [("Vídeo 1", "VIDEO", 600), ("Vídeo 2", "VIDEO", 600), ("Texto", "DOC", 0)]
+        )
+    ]
+    session.add_all(items)
+    session.flush()
+    return trail, items
+
+
+def _enroll(session, trail) -> int:
+    # user_trails.id is a BIGINT key, which sqlite does not autoincrement.
+    user_id = session.query(User.user_id).order_by(User.user_id.desc()).scalar()
+    enrolled = session.query(LkEnrollmentStatus).filter_by(code="ENROLLED").one()
+    session.add(
+        UserTrails(
+            id=trail.id,
+            user_id=user_id,
+            trail_id=trail.id,
+            status_id=enrolled.id,
+            progress_percent=0,
+        )
+    )
+    session.flush()
+    return user_id
+
+
+def test_batch_applies_events_with_one_upsert(client, db_session, query_budget):
+    trail, (video, other_video, doc) = _seed_trail(db_session)
+    login = register_and_login(client, db_session)
+    headers = {"X-CSRF-Token": login.headers["X-CSRF-Token"]}
+    _enroll(db_session, trail)
+
+    events = [
+        {"item_id": video.id, "status": "IN_PROGRESS", "progress_value": seconds}
+        for seconds in (10, 30, 50, 70)
+    ]
+    events += [
+        {"item_id": other_video.id, "status": "IN_PROGRESS", "progress_value": 500},
+        {"item_id": doc.id, "status": "COMPLETED"},
+        {"item_id": 999999, "status": "IN_PROGRESS", "progress_value": 1},
+    ]
+    with query_budget() as batch:
+        resp = client.post(
+            "/trails/progress/batch", json={"events": events}, headers=headers
+        )
+    inserts = [
+        statement
+        for statement in batch.statements
+        if statement.upper().startswith("INSERT INTO USER_ITEM_PROGRESS")
+    ]
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    body = resp.get_json()
+    assert len(inserts) == 1
+    assert body["accepted"] == 5
+    assert body["written"] == 2
+    assert [(r["index"], r["reason"]) for r in body["rejected"]] == [
+        (4, "skip_ahead_blocked"),
+        (6, "not_found"),
+    ]
+    assert body["progress"][str(trail.id)]["done"] == 1
+
+    rows = {
+        row.trail_item_id: row
+        for row in db_session.query(UserItemProgress).filter(
+            UserItemProgress.trail_item_id.in_([video.id, other_video.id, doc.id])
+        )
+    }
+    assert rows[video.id].progress_value == 70
+    assert other_video.id not in rows
+    assert rows[doc.id].completed_at is not None
+    enrollment = db_session.query(UserTrails).filter_by(trail_id=trail.id).one()
+    assert float(enrollment.progress_percent) == 33.33
+
+
+def test_batch_upsert_keeps_completion_and_max_progress(client, db_session):
+    trail, (video, _other, _doc) = _seed_trail(db_session)
+    register_and_login(client, db_session)
+    user_id = _enroll(db_session, trail)
+    repo = UserProgressRepository(db_session)
+
+    def apply(status, value):
+        repo.upsert_progress_batch(
+            [ProgressEvent(user_id, trail.id, video.id, status, value)]
+        )
+        return (
+            db_session.query(UserItemProgress)
+            .filter_by(user_id=user_id, trail_item_id=video.id)
+            .populate_existing()
+            .one()
+        )
+
+    apply("COMPLETED", 550)
+    row = apply("IN_PROGRESS", 120)
+
+    completed_id = db_session.query(LkProgressStatus.id).filter_by(code="COMPLETED")
+    assert row.status_id == completed_id.scalar()
+    assert row.progress_value == 550
+    assert row.completed_at is not None
+
+
+def test_coalescer_merges_heartbeats_until_due():
+    now = [0.0]
+    coalescer = ProgressCoalescer(flush_after=10, clock=lambda: now[0])
+
+    for value in (5, 15, 10):
+        coalescer.add(ProgressEvent(1, 7, 42, "IN_PROGRESS", value))
+    coalescer.add(ProgressEvent(2, 7, 42, "IN_PROGRESS", 3))
+
+    assert len(coalescer) == 2
+    assert coalescer.buffered_value(1, 42) == 15
+    assert coalescer.drain_due() == []
+
+    now[0] = 10.0
+    assert coalescer.drain_user(2) == [ProgressEvent(2, 7, 42, "IN_PROGRESS", 3)]
+    assert coalescer.drain_due() == [ProgressEvent(1, 7, 42, "IN_PROGRESS", 15)]
+    assert len(coalescer) == 0
+
+
+def test_flusher_writes_due_heartbeats_without_further_requests():
+    coalescer = ProgressCoalescer(flush_after=0)
+    written: list[ProgressEvent] = []
+    done = threading.Event()
+    failures = [RuntimeError("db down")]
+
+    def write(events):
+        if failures:
+            raise failures.pop()
+        written.extend(events)
+        done.set()
+
+    coalescer.add(ProgressEvent(1, 7, 42, "IN_PROGRESS", 15))
+    coalescer.start_flusher(write, interval=0.01)
+    try:
+        assert done.wait(2)
+    finally:
+        coalescer.stop_flusher()
+
+    # The failed write was kept and retried on the next tick.
+    assert written == [ProgressEvent(1, 7, 42, "IN_PROGRESS", 15)]
+    assert len(coalescer) == 0
+
+
+def test_skip_ahead_window_allows_for_buffered_heartbeats(
+    client, db_session, monkeypatch
+):
+    trail, (video, _other_video, _doc) = _seed_trail(db_session)
+    login = register_and_login(client, db_session)
+    headers = {"X-CSRF-Token": login.headers["X-CSRF-Token"]}
+    _enroll(db_session, trail)
+    # 80s is past the 60s window of a 10-minute video...
+    body = {
+        "events": [{"item_id": video.id, "status": "IN_PROGRESS", "progress_value": 80}]
+    }
+
+    resp = client.post("/trails/progress/batch", json=body, headers=headers)
+    assert [r["reason"] for r in resp.get_json()["rejected"]] == ["skip_ahead_blocked"]
+
+    # ...but heartbeats buffered by another worker may account for the gap.
+    monkeypatch.setattr(settings, "progress_coalesce_seconds", 30.0)
+    reset_progress_coalescer()
+    try:
+        resp = client.post("/trails/progress/batch", json=body, headers=headers)
+    finally:
+        reset_progress_coalescer()
+
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert resp.get_json()["rejected"] == []
+    assert resp.get_json()["buffered"] == 1
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from app.models.lk_progress_status import LkProgressStatus
+from app.services.lookups import PROGRESS_STATUS, ROLE, LookupRegistry
+
+
+def test_registry_serves_ids_and_codes_from_memory(db_session, query_budget):
+    db_session.add_all(
+        [LkProgressStatus(code="IN_PROGRESS"), LkProgressStatus(code="COMPLETED")]
+    )
+    db_session.flush()
+    registry = LookupRegistry()
+    registry.load(db_session)
+
+    with query_budget(0):
+        completed_id = registry.id_for(db_session, PROGRESS_STATUS, "COMPLETED")
+        assert registry.code_for(db_session, PROGRESS_STATUS, completed_id) == (
+            "COMPLETED"
+        )
+        assert registry.id_for(db_session, ROLE, "Admin") is not None
+
+
+def test_registry_reloads_table_on_miss(db_session):
+    registry = LookupRegistry()
+    registry.load(db_session)
+    assert registry.id_for(db_session, PROGRESS_STATUS, "COMPLETED") is None
+
+    db_session.add(LkProgressStatus(code="COMPLETED"))
+    db_session.flush()
+
+    status_id = registry.id_for(db_session, PROGRESS_STATUS, "COMPLETED")
+    assert status_id is not None
+    assert registry.code_for(db_session, PROGRESS_STATUS, status_id) == "COMPLETED"
+
+    registry.clear()
+    assert registry.ids(db_session, PROGRESS_STATUS) == {"COMPLETED": status_id}
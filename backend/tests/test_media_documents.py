@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.settings import settings
+from app.main import app
+from app.services import media
+
+PDF = b"%PDF-1.4 " + b"x" * 200_000
+
+
+@pytest.fixture
+def document_server():
+    hits: list[str] = []
+    files = {"/a.pdf": PDF, "/copia.pdf": PDF, "/grande.pdf": b"y" * 4096}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802 - http.server API
+            hits.append(self.path)
+            body = files.get(self.path)
+            if body is None:
+                self.send_error(404)
+                return
+            etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}", hits, files
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def static_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "static_folder", str(tmp_path))
+    with app.app_context():
+        yield tmp_path
+
+
+def test_downloads_are_content_addressed_and_indexed_by_url(
+    document_server, static_root
+):
+    base, hits, _files = document_server
+    digest = hashlib.sha256(PDF).hexdigest()
+
+    first = media.cache_document(f"{base}/a.pdf")
+    copy = media.cache_document(f"{base}/copia.pdf")
+    again = media.cache_document(f"{base}/a.pdf")
+
+    expected = f"uploads/documents/sha256/{digest[:2]}/{digest}.pdf"
+    assert first == copy == again == expected
+    assert (static_root / expected).read_bytes() == PDF
+    assert hits == ["/a.pdf", "/copia.pdf"]
+    stored = list((static_root / "uploads/documents/sha256").rglob("*"))
+    assert [path.name for path in stored if path.is_file()] == [f"{digest}.pdf"]
+
+
+def test_cache_documents_runs_concurrently_and_reports_failures(
+    document_server, static_root, monkeypatch
+):
+    base, hits, _files = document_server
+    monkeypatch.setattr(media, "MAX_DOCUMENT_DOWNLOAD_BYTES", 1024)
+
+    results = media.cache_documents(
+        [f"{base}/grande.pdf", f"{base}/faltando.pdf", f"{base}/grande.pdf"],
+        max_workers=4,
+    )
+
+    assert sorted(hits) == ["/faltando.pdf", "/grande.pdf"]
+    assert str(results[f"{base}/grande.pdf"]) == "O documento deve ter no máximo 20 MB."
+    assert (
+        str(results[f"{base}/faltando.pdf"]) == "Não foi possível baixar o documento."
+    )
+    # Rejected downloads leave no temporary files behind.
+    store = static_root / "uploads/documents/sha256"
+    assert [path for path in store.rglob("*") if path.is_file()] == []
+
+
+def test_indexed_urls_are_revalidated_after_the_ttl(
+    document_server, static_root, monkeypatch
+):
+    base, hits, files = document_server
+    url = f"{base}/a.pdf"
+    first = media.cache_document(url)
+    assert media.cache_document(url) == first
+    assert hits == ["/a.pdf"]
+
+    monkeypatch.setattr(settings, "document_revalidate_seconds", 0)
+    # Unchanged: a conditional request answered with 304 keeps the copy.
+    assert media.cache_document(url) == first
+    assert hits == ["/a.pdf", "/a.pdf"]
+
+    files["/a.pdf"] = b"%PDF-1.4 nova versao"
+    updated = media.cache_document(url)
+    digest = hashlib.sha256(files["/a.pdf"]).hexdigest()
+    assert updated == f"uploads/documents/sha256/{digest[:2]}/{digest}.pdf"
+    assert (static_root / updated).read_bytes() == files["/a.pdf"]
+
+    # The remote server going away does not break items already cached.
+    files.clear()
+    assert media.cache_document(url) == updated
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import os
+
+from app.core import metrics
+from app.core.metrics import Histogram
+from app.core.settings import settings
+
+
+def test_histogram_exposes_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(3, "/a")
+
+    assert histogram.expose() == [
+        "# HELP demo_seconds Demo.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{route="/a",le="0.1"} 1',
+        'demo_seconds_bucket{route="/a",le="1"} 2',
+        'demo_seconds_bucket{route="/a",le="+Inf"} 3',
+        'demo_seconds_sum{route="/a"} 3.55',
+        'demo_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_requests_record_latency_sql_and_server_timing(client, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "server_timing_enabled", True)
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+    labels = ("GET", "/trails/showcase")
+    requests_before = metrics.REQUEST_LATENCY.count(*labels)
+    statements_before = metrics.REQUEST_SQL_STATEMENTS.sum(*labels)
+
+    resp = client.get("/trails/showcase")
+
+    assert resp.status_code == 200
+    timing = resp.headers["Server-Timing"]
+    assert timing.startswith("app;dur=") and "pool;dur=" in timing
+    queries = metrics.REQUEST_SQL_STATEMENTS.sum(*labels) - statements_before
+    assert queries > 0
+    assert f'desc="{int(queries)} queries"' in timing
+    assert metrics.REQUEST_LATENCY.count(*labels) == requests_before + 1
+
+    body = client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).get_data(
+        as_text=True
+    )
+    assert (
+        'http_requests_total{method="GET",route="/trails/showcase",status="200"}'
+        in body
+    )
+    assert 'http_request_sql_statements_bucket{method="GET"' in body
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in body
+
+
+def test_metrics_endpoint_requires_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", None)
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(settings, "metrics_token", "s3cret")
+
+    assert client.get("/metrics").status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+
+
+def test_multiprocess_dir_sums_every_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "metrics_multiproc_dir", str(tmp_path))
+    labels = ("GET", "/demo")
+    metrics.REQUESTS.inc(*labels, "200")
+    metrics.REQUEST_LATENCY.observe(0.004, *labels)
+    other = Histogram("other", "Other worker.", ("method", "route"))
+    other.observe(2.0, *labels)
+    (tmp_path / "999999.json").write_text(
+        json.dumps(
+            {
+                "http_requests_total": [[[*labels, "200"], 2]],
+                "http_request_duration_seconds": [
+                    [list(labels), other.snapshot()[labels]]
+                ],
+            }
+        )
+    )
+    (tmp_path / "999998.json").write_text("{")  # torn write: skipped
+
+    body = metrics.render_metrics()
+
+    assert 'http_requests_total{method="GET",route="/demo",status="200"} 3' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/demo"} 2' in body
+    assert 'http_request_duration_seconds_sum{method="GET",route="/demo"} 2.004' in body
+    assert (tmp_path / f"{os.getpid()}.json").is_file()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import uuid
+
+import pytest
+from passlib.hash import bcrypt
+
+from app.models.users import User
+from app.services import security
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+from tests.test_me import register_and_login
+
+
+def _login(client, email):
+    return client.post(
+        "/auth/login",
+        json={"email": email, "password": "TestPass!123", "remember": False},
+    )
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    hasher = PasswordHasher(workers=0, rounds=4)
+    monkeypatch.setattr(security, "get_password_hasher", lambda: hasher)
+    return hasher
+
+
+def test_process_pool_hashes_and_verifies():
+    hasher = PasswordHasher(workers=1, rounds=4)
+    try:
+        password_hash = hasher.hash("segredo")
+        assert bcrypt.from_string(password_hash).rounds == 4
+        assert hasher.verify("segredo", password_hash) == (True, None)
+        assert hasher.verify("errado", password_hash) == (False, None)
+    finally:
+        hasher.shutdown()
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=4)
+    hasher._slots.acquire()
+    hasher._slots.acquire()
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("segredo")
+    finally:
+        hasher._slots.release()
+        hasher._slots.release()
+        hasher.shutdown()
+
+
+def test_login_answers_503_when_the_hasher_is_saturated(
+    client, db_session, hasher, monkeypatch
+):
+    register_and_login(client, db_session)
+    email = db_session.query(User).order_by(User.user_id.desc()).first().email
+
+    def busy(*_args):
+        raise PasswordHasherBusy(retry_after=3)
+
+    monkeypatch.setattr(hasher, "verify", busy)
+    resp = _login(client, email)
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "3"
+
+
+def test_login_upgrades_hashes_below_the_configured_rounds(client, db_session, hasher):
+    register_and_login(client, db_session)
+    user = db_session.query(User).order_by(User.user_id.desc()).first()
+    old_hash = user.password_hash
+    assert bcrypt.from_string(old_hash).rounds == 4
+
+    hasher.rounds = 5
+    resp = _login(client, user.email)
+
+    assert resp.status_code == 200
+    db_session.refresh(user)
+    assert user.password_hash != old_hash
+    assert bcrypt.from_string(user.password_hash).rounds == 5
+    # The next login finds the hash up to date and leaves it alone.
+    upgraded = user.password_hash
+    assert _login(client, user.email).status_code == 200
+    db_session.refresh(user)
+    assert user.password_hash == upgraded
+    assert _login(client, f"{uuid.uuid4().hex}@example.com").status_code == 401
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.core.query_budget import (
+    QueryBudgetExceeded,
+    RouteQueryBudget,
+    statement_shape,
+)
+from app.core.settings import settings
+from app.main import app
+from app.models.lk_enrollment_status import LkEnrollmentStatus
+from app.models.lk_item_type import LkItemType
+from app.models.lk_progress_status import LkProgressStatus
+from app.models.user_trails import UserTrails
+from app.models.users import User
+from app.repositories.ForumsRepository import ForumsRepository
+from app.repositories.TrailsRepository import TrailsRepository
+from tests.test_me import register_and_login
+
+TRAILS = 5
+
+
+def _seed_trails(session, user_id: int) -> None:
+    session.add_all(
+        [
+            LkEnrollmentStatus(code="ENROLLED"),
+            LkEnrollmentStatus(code="IN_PROGRESS"),
+            LkEnrollmentStatus(code="COMPLETED"),
+            LkProgressStatus(code="IN_PROGRESS"),
+            LkProgressStatus(code="COMPLETED"),
+            LkItemType(code="VIDEO"),
+        ]
+    )
+    session.flush()
+    enrolled = session.query(LkEnrollmentStatus).filter_by(code="ENROLLED").one()
+    repo = TrailsRepository(session)
+    for index in range(TRAILS):
+        trail = repo.create_trail(
+            name=f"Trilha {index}",
+            thumbnail_path=None,
+            description=None,
+            author="Equipe",
+            created_by=None,
+            sections=[
+                {
+                    "title": "Seção",
+                    "order_index": 0,
+                    "items": [
+                        {
+                            "title": f"Vídeo {order}",
+                            "type": "VIDEO",
+                            "url": "https://www.youtube.com/watch?v=abcdefgh",
+                            "duration_seconds": 60,
+                        }
+                        for order in range(2)
+                    ],
+                }
+            ],
+        )
+        session.add(
+            UserTrails(
+                id=index + 1,
+                user_id=user_id,
+                trail_id=trail.id,
+                status_id=enrolled.id,
+                progress_percent=0,
+                started_at=datetime.now(timezone.utc),
+            )
+        )
+    session.flush()
+
+
+def test_statement_shape_normalises_literals_and_in_lists():
+    assert statement_shape(
+        "SELECT *\n  FROM t WHERE id IN (?, ?, ?) AND x = 10 LIMIT ?"
+    ) == statement_shape("SELECT * FROM t WHERE id IN (?, ?) AND x = 3 LIMIT ?")
+
+
+def test_query_budget_flags_totals_and_repeated_shapes(db_session, query_budget):
+    def lookup_each(ids):
+        for user_id in ids:
+            db_session.execute(select(User).where(User.user_id == user_id)).all()
+
+    with query_budget(3):
+        lookup_each([1, 2, 3])
+
+    with pytest.raises(QueryBudgetExceeded, match="4 queries"):
+        with query_budget(3):
+            lookup_each([1, 2, 3, 4])
+
+    with pytest.raises(QueryBudgetExceeded, match="repetida 3x"):
+        with query_budget(max_repeats=2):
+            lookup_each([1, 2, 3])
+
+    @query_budget(1)
+    def single():
+        lookup_each([1])
+
+    single()
+    single()  # each call gets its own counter
+
+
+def test_read_routes_stay_within_their_declared_budgets(client, db_session):
+    login = register_and_login(client, db_session)
+    user = db_session.query(User).order_by(User.user_id.desc()).first()
+    _seed_trails(db_session, user.user_id)
+    forums = ForumsRepository(db_session)
+    forum = forums.ensure_general_forum()
+    for index in range(3):
+        forums.create_topic(
+            forum_id=forum.id, title=f"T{index}", content="<p>x</p>", author_id=None
+        )
+    db_session.flush()
+
+    # conftest runs with QUERY_BUDGET_MODE=raise, so an overrun fails here.
+    for url in ("/trails/", "/user-trails/me/overview", "/forums/"):
+        for _ in range(2):  # cold and warm process caches
+            resp = client.get(url)
+            assert resp.status_code == 200, (url, resp.get_data(as_text=True))
+    assert len(client.get("/user-trails/me/overview").get_json()["trails"]) == TRAILS
+
+
+def test_route_overruns_fail_in_tests_and_are_logged_elsewhere(
+    client, db_session, monkeypatch, caplog
+):
+    ForumsRepository(db_session).ensure_general_forum()
+    db_session.flush()
+    view = app.view_functions["forums.list_forums"]
+    monkeypatch.setattr(view, "query_budget", RouteQueryBudget(0, None))
+
+    with pytest.raises(QueryBudgetExceeded, match="GET /forums/: 1 queries"):
+        client.get("/forums/")
+
+    monkeypatch.setattr(settings, "query_budget_mode", "log")
+    assert client.get("/forums/").status_code == 200
+    assert "Orçamento de queries excedido" in caplog.text
@@ -1,7 +1,11 @@
 import pytest
 
 from app.services import rate_limiter as rate_limiter_module
-from app.services.rate_limiter import FixedWindowRateLimiter
+from app.services.rate_limiter import (
+    FixedWindowRateLimiter,
+    RedisSlidingWindowRateLimiter,
+    SlidingWindowRateLimiter,
+)
 
 
 def test_fixed_window_rate_limiter_blocks_after_threshold(monkeypatch):
@@ -25,3 +29,67 @@ def test_fixed_window_rate_limiter_blocks_after_threshold(monkeypatch):
     allowed, retry_after = limiter.register_attempt("user")
     assert allowed is True
     assert retry_after is None
+
+
+def test_sliding_window_rate_limiter_weights_the_previous_window(monkeypatch):
+    current_time = {"value": 1200.0}  # start of a 60s window
+    monkeypatch.setattr(
+        rate_limiter_module.time, "monotonic", lambda: current_time["value"]
+    )
+
+    limiter = SlidingWindowRateLimiter(max_attempts=4, window_seconds=60)
+    for _ in range(4):
+        assert limiter.register_attempt("user") == (True, None)
+    allowed, retry_after = limiter.register_attempt("user")
+    assert allowed is False
+    # The weighted count only drops below the limit once the next window starts.
+    assert retry_after == pytest.approx(60)
+
+    # Halfway through the next window the old hits count for 4 * 0.5 = 2.
+    current_time["value"] += 90
+    assert limiter.register_attempt("user") == (True, None)
+    assert limiter.register_attempt("user") == (True, None)
+    assert limiter.register_attempt("user")[0] is False
+    # 10s later they count for 4 / 3, leaving room for one more attempt.
+    current_time["value"] += 10
+    assert limiter.register_attempt("user") == (True, None)
+    allowed, retry_after = limiter.register_attempt("user")
+    assert allowed is False
+    # 3 + 4 * (1 - t / 60) < 4 once t > 45, i.e. 5s from now.
+    assert retry_after == pytest.approx(5)
+
+
+def test_sliding_window_rate_limiter_evicts_idle_keys(monkeypatch):
+    current_time = {"value": 1200.0}
+    monkeypatch.setattr(
+        rate_limiter_module.time, "monotonic", lambda: current_time["value"]
+    )
+
+    limiter = SlidingWindowRateLimiter(max_attempts=3, window_seconds=60)
+    for index in range(1000):
+        limiter.register_attempt(f"victim-{index}@example.com")
+    assert len(limiter) == 1000
+
+    current_time["value"] += 130
+    limiter.register_attempt("someone-else")
+    assert len(limiter) == 1
+
+
+def test_redis_sliding_window_matches_the_in_memory_limiter(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs Lua scripts through lupa
+    current_time = {"value": 1200.0}
+    monkeypatch.setattr(rate_limiter_module.time, "time", lambda: current_time["value"])
+    monkeypatch.setattr(
+        rate_limiter_module.time, "monotonic", lambda: current_time["value"]
+    )
+
+    memory = SlidingWindowRateLimiter(max_attempts=4, window_seconds=60)
+    redis = RedisSlidingWindowRateLimiter(
+        fakeredis.FakeRedis(), max_attempts=4, window_seconds=60
+    )
+    for step in (0, 1, 1, 2, 5, 50, 30, 1, 1, 1, 100):
+        current_time["value"] += step
+        assert redis.register_attempt("user") == pytest.approx(
+            memory.register_attempt("user")
+        )
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from app.core.settings import settings
+from app.services import request_limits
+from app.services.request_limits import ConcurrencyLimiter
+from tests.test_me import register_and_login
+
+
+def test_route_policy_throttles_each_client_separately(client, db_session):
+    # The policy runs before the view, so even rejected calls use the budget.
+    for _ in range(10):
+        assert client.post("/trails/999999/reviews", json={}).status_code != 429
+
+    resp = client.post("/trails/999999/reviews", json={})
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+
+    # Signed-in users are counted by id, not by the shared IP.
+    login = register_and_login(client, db_session)
+    resp = client.post(
+        "/trails/999999/reviews",
+        json={},
+        headers={"X-CSRF-Token": login.headers["X-CSRF-Token"]},
+    )
+    assert resp.status_code != 429
+
+
+def test_forwarded_for_only_counts_hops_added_by_trusted_proxies(client, monkeypatch):
+    def review(forwarded_for: str):
+        headers = {"X-Forwarded-For": forwarded_for}
+        return client.post("/trails/999999/reviews", json={}, headers=headers)
+
+    # Without trusted proxies the header is ignored: rotating it does not
+    # buy a fresh budget.
+    for index in range(10):
+        assert review(f"10.0.0.{index}").status_code != 429
+    assert review("10.0.1.1").status_code == 429
+
+    # Behind one proxy, the entry it appended is the client; spoofed
+    # entries to its left do not matter.
+    monkeypatch.setattr(settings, "trusted_proxy_hops", 1)
+    for index in range(10):
+        assert review(f"10.9.{index}.1, 203.0.113.7").status_code != 429
+    assert review("10.9.99.1, 203.0.113.7").status_code == 429
+    assert review("203.0.113.8").status_code != 429
+
+
+def test_route_policies_can_be_disabled(client, monkeypatch):
+    monkeypatch.setattr(settings, "route_rate_limits_enabled", False)
+    for _ in range(12):
+        assert client.post("/trails/999999/reviews", json={}).status_code != 429
+
+
+def test_requests_beyond_the_in_flight_cap_are_shed(client, monkeypatch):
+    limiter = ConcurrencyLimiter(max_in_flight=1)
+    monkeypatch.setattr(request_limits, "_concurrency", limiter)
+
+    assert limiter.acquire()  # a request already in flight
+    resp = client.get("/trails/showcase")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert client.get("/healthz").status_code == 200
+
+    limiter.release()
+    assert client.get("/trails/showcase").status_code == 200
+    # The slot taken by the request was given back at teardown.
+    assert limiter.acquire()
+    limiter.release()
@@ -12,9 +12,12 @@ from app.services.security import (
     enforce_csrf,
     generate_csrf_token,
     generate_password_reset_token,
+    get_current_user,
+    get_current_user_id,
     hash_password,
     sign_session,
 )
+from app.services import security
 from app.models.roles import RolesEnum
 from app.models.users import Sex, SkinColor
 
@@ -120,3 +123,67 @@ def test_password_reset_token_rejects_tampering(db_session):
 
     with pytest.raises(Unauthorized):
         decode_password_reset_token(tampered)
+
+
+def _session_cookie(token: str) -> dict:
+    return {"HTTP_COOKIE": f"{settings.COOKIE_NAME}={token}"}
+
+
+def test_session_token_is_decoded_once_across_requests(monkeypatch):
+    token = sign_session({"id": "77", "email": "77@example.com", "role": "User"})
+    calls = []
+    original = security._decode_session
+
+    def counting_decode(value):
+        calls.append(value)
+        return original(value)
+
+    monkeypatch.setattr(security, "_decode_session", counting_decode)
+
+    for _ in range(3):
+        with flask_app.test_request_context(
+            "/protected", environ_overrides=_session_cookie(token)
+        ):
+            assert get_current_user_id() == "77"
+            assert get_current_user_id() == "77"
+
+    assert len(calls) == 1
+
+    with flask_app.test_request_context(
+        "/protected", environ_overrides=_session_cookie(token + "x")
+    ):
+        with pytest.raises(Unauthorized):
+            get_current_user_id()
+
+
+def test_current_user_projection_is_invalidated_on_role_change(db_session):
+    repo = UsersRepository(db_session)
+    user = repo.CreateUser(
+        email=_unique_email("principal"),
+        password_hash="x",
+        name_for_certificate="Principal User",
+        username=f"user_{uuid.uuid4().hex[:6]}",
+        sex=Sex.NotSpecified,
+        color=SkinColor.NotSpecified,
+        role=RolesEnum.User,
+    )
+    token = sign_session({"id": user.user_id, "email": user.email, "role": "User"})
+
+    with flask_app.test_request_context(
+        "/protected", environ_overrides=_session_cookie(token)
+    ):
+        principal = get_current_user()
+        assert principal.user_id == user.user_id
+        assert principal.role_code == "User"
+
+    with flask_app.test_request_context(
+        "/protected", environ_overrides=_session_cookie(token)
+    ):
+        assert get_current_user() is principal
+
+    repo.UpdateUserRole(user, RolesEnum.Admin)
+
+    with flask_app.test_request_context(
+        "/protected", environ_overrides=_session_cookie(token)
+    ):
+        assert get_current_user().role_code == "Admin"
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import threading
+from itertools import groupby
+
+import pytest
+
+from app.main import app
+from app.models.form_question_options import FormQuestionOption
+from app.models.form_questions import FormQuestion
+from app.models.forms import Form
+from app.models.lk_item_type import LkItemType
+from app.models.lk_question_type import LkQuestionType
+from app.models.trail_items import TrailItems
+from app.models.trails import Trails
+from app.repositories.TrailsRepository import TrailsRepository
+from app.services import media
+
+
+def _seed_types(session):
+    session.add_all(
+        [
+            LkItemType(code="VIDEO"),
+            LkItemType(code="DOC"),
+            LkItemType(code="FORM"),
+            LkQuestionType(code="SINGLE_CHOICE"),
+            LkQuestionType(code="ESSAY"),
+        ]
+    )
+    session.flush()
+
+
+def _sections(doc_url: str) -> list[dict]:
+    form = {
+        "min_score_to_pass": 60,
+        "questions": [
+            {
+                "prompt": "Quanto é 1 + 1?",
+                "type": "SINGLE_CHOICE",
+                "points": 1,
+                "options": [
+                    {"text": "2", "is_correct": True},
+                    {"text": "3", "is_correct": False},
+                ],
+            },
+            {"prompt": "Comente.", "type": "ESSAY", "points": 1},
+        ],
+    }
+    form["randomize_questions"] = False
+    for question in form["questions"]:
+        question["required"] = True
+    return [
+        {
+            "title": "Introdução",
+            "items": [
+                {"title": "Vídeo", "type": "VIDEO", "url": "https://example.com/v"},
+                {"title": "Apostila", "type": "DOC", "url": doc_url},
+            ],
+        },
+        {
+            "title": "Avaliação",
+            "items": [
+                {"title": "Leitura", "type": "DOC", "url": doc_url},
+                {"title": "Prova", "type": "FORM", "form": form},
+            ],
+        },
+    ]
+
+
+def _create(session, sections):
+    return TrailsRepository(session).create_trail(
+        name="Construtor",
+        thumbnail_path=None,
+        description=None,
+        author=None,
+        created_by=None,
+        sections=sections,
+    )
+
+
+def _writes(statements: list[str]) -> list[tuple[str, str]]:
+    """The (verb, table) of each write among ``statements``."""
+
+    writes: list[tuple[str, str]] = []
+    for statement in statements:
+        words = statement.replace("(", " ").upper().split()
+        verb = words[0]
+        if verb in ("INSERT", "UPDATE", "DELETE"):
+            marker = {"INSERT": "INTO", "UPDATE": "UPDATE", "DELETE": "FROM"}[verb]
+            table = words[words.index(marker) + 1].lower()
+            writes.append((verb, table))
+    return writes
+
+
+def test_builder_groups_inserts_per_table(
+    db_session, tmp_path, monkeypatch, query_budget
+):
+    _seed_types(db_session)
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "apostila.pdf").write_bytes(b"%PDF-1.4")
+    monkeypatch.setattr(app, "static_folder", str(tmp_path))
+
+    with app.app_context(), query_budget() as create:
+        trail = _create(db_session, _sections("docs/apostila.pdf"))
+    statements = [
+        table for verb, table in _writes(create.statements) if verb == "INSERT"
+    ]
+
+    # Writes are grouped per table. PostgreSQL batches each group into one
+    # INSERT ... RETURNING; sqlite cannot guarantee RETURNING order in a batch,
+    # so SQLAlchemy sends those rows one by one there.
+    tables = [name for name, _group in groupby(statements) if name != "forums"]
+    assert tables == [
+        "trails",
+        "trail_sections",
+        "trail_items",
+        "forms",
+        "form_question",
+        "form_question_options",
+    ]
+
+    items = (
+        db_session.query(TrailItems)
+        .filter_by(trail_id=trail.id)
+        .order_by(TrailItems.id)
+        .all()
+    )
+    assert [(item.title, item.order_index) for item in items] == [
+        ("Vídeo", 0),
+        ("Apostila", 1),
+        ("Leitura", 0),
+        ("Prova", 1),
+    ]
+    assert items[0].section_id == items[1].section_id != items[2].section_id
+    form = db_session.query(Form).filter_by(trail_item_id=items[3].id).one()
+    questions = (
+        db_session.query(FormQuestion)
+        .filter_by(form_id=form.id)
+        .order_by(FormQuestion.order_index)
+        .all()
+    )
+    assert [question.prompt for question in questions] == [
+        "Quanto é 1 + 1?",
+        "Comente.",
+    ]
+    options = db_session.query(FormQuestionOption).filter_by(
+        question_id=questions[0].id
+    )
+    assert sorted((o.option_text, o.is_correct) for o in options) == [
+        ("2", True),
+        ("3", False),
+    ]
+
+
+def test_documents_are_fetched_in_parallel_before_any_write(db_session, monkeypatch):
+    _seed_types(db_session)
+    barrier = threading.Barrier(2, timeout=5)
+    fetched: list[str] = []
+
+    def fake_cache_document(url):
+        barrier.wait()  # only passes when both documents download concurrently
+        fetched.append(url)
+        if url.endswith("quebrado.pdf"):
+            raise ValueError("Não foi possível baixar o documento.")
+        return "uploads/documents/ok.pdf"
+
+    monkeypatch.setattr(media, "cache_document", fake_cache_document)
+    sections = _sections("https://example.com/ok.pdf")
+    sections[1]["items"][0]["url"] = "https://example.com/quebrado.pdf"
+
+    with app.app_context(), pytest.raises(ValueError) as excinfo:
+        _create(db_session, sections)
+
+    assert "'Leitura'" in str(excinfo.value)
+    assert sorted(fetched) == [
+        "https://example.com/ok.pdf",
+        "https://example.com/quebrado.pdf",
+    ]
+    assert db_session.query(Trails).filter_by(name="Construtor").count() == 0
+
+
+def test_update_diffs_the_tree_and_keeps_ids(db_session, monkeypatch, query_budget):
+    _seed_types(db_session)
+    fetched: list[str] = []
+
+    def fake_cache_document(url):
+        fetched.append(url)
+        return "uploads/documents/doc.pdf"
+
+    monkeypatch.setattr(media, "cache_document", fake_cache_document)
+    repo = TrailsRepository(db_session)
+
+    def save(sections):
+        return repo.update_trail(
+            trail.id,
+            name="Construtor",
+            thumbnail_path=None,
+            description=None,
+            author=None,
+            sections=sections,
+        )
+
+    with app.app_context():
+        trail = _create(db_session, _sections("https://example.com/a.pdf"))
+        payload = repo.get_trail_builder_payload(trail.id)
+        fetched.clear()
+
+        with query_budget() as unchanged:
+            save(payload["sections"])
+        assert _writes(unchanged.statements) == []
+        assert fetched == []
+
+        intro, evaluation = payload["sections"]
+        video, doc = intro["items"]
+        reading, exam = evaluation["items"]
+        question = exam["form"]["questions"][0]
+        video["title"] = "Vídeo revisado"
+        reading["order_index"] = 2
+        intro["items"].append(evaluation["items"].pop(0))
+        exam["order_index"] = 0
+        question["options"] = question["options"][:1] + [
+            {"text": "4", "is_correct": False, "order_index": 1}
+        ]
+        payload["sections"].append(
+            {
+                "title": "Extra",
+                "order_index": 2,
+                "items": [{"title": "Novo", "type": "DOC", "url": "https://x/b.pdf"}],
+            }
+        )
+        with query_budget() as edited:
+            save(payload["sections"])
+
+    assert sorted(set(_writes(edited.statements))) == [
+        ("DELETE", "form_question_options"),
+        ("INSERT", "form_question_options"),
+        ("INSERT", "trail_items"),
+        ("INSERT", "trail_sections"),
+        ("UPDATE", "trail_items"),
+        # Content changed: cached answer keys compare this version.
+        ("UPDATE", "trails"),
+        # Item set changed: incremental progress counters are reset.
+        ("UPDATE", "user_trails"),
+    ]
+    assert fetched == ["https://x/b.pdf"]
+
+    stored = repo.get_trail_builder_payload(trail.id)
+    intro_after, evaluation_after, extra_after = stored["sections"]
+    assert intro_after["id"] == intro["id"]
+    assert [(i["id"], i["title"]) for i in intro_after["items"]] == [
+        (video["id"], "Vídeo revisado"),
+        (doc["id"], "Apostila"),
+        (reading["id"], "Leitura"),
+    ]
+    assert [i["id"] for i in evaluation_after["items"]] == [exam["id"]]
+    options = evaluation_after["items"][0]["form"]["questions"][0]["options"]
+    assert options[0]["id"] == question["options"][0]["id"]
+    assert [o["text"] for o in options] == ["2", "4"]
+    assert [i["title"] for i in extra_after["items"]] == ["Novo"]
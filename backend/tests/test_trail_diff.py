@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from app.services.trail_diff import New, Node, Update, diff_trees
+
+
+def _section(section_id, title, *items):
+    return Node(section_id, {"title": title}, list(items))
+
+
+def _item(item_id, title):
+    return Node(item_id, {"title": title})
+
+
+def test_diff_matches_by_id_and_moves_rows_to_new_parents():
+    current = [
+        _section(1, "A", _item(10, "x"), _item(11, "y")),
+        _section(2, "B", _item(20, "z")),
+    ]
+    incoming = [
+        _section(1, "A", _item(10, "x")),
+        # Item 11 moves into a brand-new section; the repeated id 10 is unknown
+        # to this position, so it becomes an insert instead of stealing the row.
+        _section(None, "C", _item(11, "y"), _item(10, "copy")),
+    ]
+
+    diff = diff_trees(current, incoming)
+
+    assert [insert.row for insert in diff["sections"].inserts] == [{"title": "C"}]
+    assert diff["sections"].updates == []
+    assert diff["sections"].deletes == [2]
+    assert [(i.parent, i.row) for i in diff["items"].inserts] == [
+        (New(0), {"title": "copy"})
+    ]
+    assert diff["items"].updates == [Update(11, {}, New(0))]
+    assert diff["items"].deletes == [20]
+    assert diff_trees(current, current).counts() == {
+        "sections": (0, 0, 0),
+        "items": (0, 0, 0),
+        "forms": (0, 0, 0),
+        "questions": (0, 0, 0),
+        "options": (0, 0, 0),
+    }
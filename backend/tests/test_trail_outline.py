@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from app.models.lk_item_type import LkItemType
+from app.models.trail_items import TrailItems
+from app.repositories.TrailsRepository import TrailsRepository
+from app.repositories.UserTrailsRepository import UserTrailsRepository
+from app.services.trail_outline import get_trail_outline
+
+
+def _video(title: str, *, required: bool = False) -> dict:
+    return {
+        "title": title,
+        "type": "VIDEO",
+        "url": "https://www.youtube.com/watch?v=abcdefgh",
+        "duration_seconds": 60,
+        "requires_completion": required,
+    }
+
+
+def _create_trail(session):
+    session.add(LkItemType(code="VIDEO"))
+    session.flush()
+    return TrailsRepository(session).create_trail(
+        name="Outline",
+        thumbnail_path=None,
+        description=None,
+        author=None,
+        created_by=None,
+        sections=[
+            {"title": "Second", "order_index": 1, "items": [_video("C")]},
+            {
+                "title": "First",
+                "order_index": 0,
+                "items": [_video("A", required=True), _video("B")],
+            },
+        ],
+    )
+
+
+def _item_ids(session, trail_id: int) -> dict[str, int]:
+    rows = session.query(TrailItems).filter(TrailItems.trail_id == trail_id).all()
+    return {row.title: row.id for row in rows}
+
+
+def test_outline_orders_items_by_section_and_exposes_neighbors(db_session):
+    trail = _create_trail(db_session)
+    ids = _item_ids(db_session, trail.id)
+
+    outline = get_trail_outline(db_session, trail.id)
+
+    assert outline.item_ids == [ids["A"], ids["B"], ids["C"]]
+    assert outline.neighbors(ids["A"]) == (None, ids["B"])
+    # Navigation does not cross section boundaries.
+    assert outline.neighbors(ids["B"]) == (ids["A"], None)
+    assert outline.neighbors(ids["C"]) == (None, None)
+    assert [item.id for item in outline.required_before(ids["C"])] == [ids["A"]]
+    assert get_trail_outline(db_session, trail.id) is outline
+
+
+def test_blocking_item_uses_outline_and_update_invalidates_it(db_session):
+    trail = _create_trail(db_session)
+    ids = _item_ids(db_session, trail.id)
+    repo = UserTrailsRepository(db_session)
+
+    blocker = repo.find_blocking_item(1, trail.id, ids["C"])
+    assert blocker == {"id": ids["A"], "title": "A"}
+    assert repo.find_blocking_item(1, trail.id, ids["A"]) is None
+    assert repo.get_first_trail_item_id(trail.id) == ids["A"]
+
+    before = get_trail_outline(db_session, trail.id)
+    TrailsRepository(db_session).update_trail(
+        trail.id,
+        name="Outline",
+        thumbnail_path=None,
+        description=None,
+        author=None,
+        sections=[{"title": "Only", "items": [_video("D")]}],
+    )
+    after = get_trail_outline(db_session, trail.id)
+
+    assert after.version != before.version
+    assert [item.title for item in after.items] == ["D"]
+    assert repo.find_blocking_item(1, trail.id, after.item_ids[0]) is None
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+
+from app.main import app
+from app.models.roles import RolesEnum
+from app.models.users import User
+from app.repositories.UsersRepository import UsersRepository
+from app.routes import uploads as uploads_routes
+from app.services import media
+from tests.test_me import register_and_login
+
+
+@pytest.fixture
+def admin_headers(client, db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "static_folder", str(tmp_path))
+    login = register_and_login(client, db_session)
+    user = db_session.query(User).order_by(User.user_id.desc()).first()
+    UsersRepository(db_session).UpdateUserRole(user, RolesEnum.Admin)
+    return {"X-CSRF-Token": login.headers["X-CSRF-Token"]}
+
+
+def _files(root):
+    return sorted(
+        str(path.relative_to(root)) for path in root.rglob("*") if path.is_file()
+    )
+
+
+def test_image_upload_is_moved_into_place_from_the_spool(
+    client, admin_headers, tmp_path, monkeypatch
+):
+    committed = []
+    commit = media.UploadSpool.commit
+    monkeypatch.setattr(
+        media.UploadSpool,
+        "commit",
+        lambda spool, destination: committed.append(spool.size)
+        or commit(spool, destination),
+    )
+
+    resp = client.post(
+        "/admin/uploads/trails",
+        data={"file": (io.BytesIO(b"\x89PNG" + b"0" * 2048), "capa.png")},
+        headers=admin_headers,
+        content_type="multipart/form-data",
+    )
+
+    assert resp.status_code == 201, resp.get_data(as_text=True)
+    path = resp.get_json()["path"]
+    assert _files(tmp_path / "uploads") == [path.removeprefix("uploads/")]
+    assert (tmp_path / path).stat().st_size == 2052
+    assert committed == [2052]
+
+
+def test_oversized_uploads_are_rejected_before_being_stored(
+    client, admin_headers, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(uploads_routes, "MAX_IMAGE_UPLOAD_BYTES", 1024)
+
+    # Within the declared-length allowance, so the streaming counter trips.
+    resp = client.post(
+        "/admin/uploads/members",
+        data={"file": (io.BytesIO(b"0" * 4096), "foto.png")},
+        headers=admin_headers,
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 413
+    assert resp.get_json()["detail"] == "A imagem deve ter no máximo 512 KB."
+
+    # Declared length far above the limit: refused without reading the body.
+    resp = client.post(
+        "/admin/uploads/members",
+        data={"file": (io.BytesIO(b"0" * 200_000), "foto.png")},
+        headers=admin_headers,
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 413
+    assert _files(tmp_path / "uploads") == []
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import uuid
+
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.models.trails import Trails
+from app.models.trail_items import TrailItems
+from app.models.user_trails import UserTrails
+from app.models.user_item_progress import UserItemProgress
+from app.models.trail_certificates import TrailCertificates
+from app.models.users import User
+from app.models.lk_enrollment_status import LkEnrollmentStatus
+from app.models.lk_progress_status import LkProgressStatus
+from app.models.lk_item_type import LkItemType
+from app.models.lookups import LkColor, LkRole, LkSex
+from app.core.settings import settings
+from app.repositories.UserProgressRepository import UserProgressRepository
+from app.repositories.TrailsRepository import TrailsRepository
+from app.repositories.UserTrailsRepository import (
+    UserTrailsRepository,
+    progress_percent_expr,
+)
+from app.scripts.reconcile_progress import reconcile
+from app.routes import user_trails as user_trails_routes
+from app.services.progress_buffer import ProgressEvent
+from app.services.trail_outline import get_trail_outline
+from tests.test_me import register_and_login
+
+# Registers the sqlite id assigner for trail_certificates.
+import tests.test_certificates  # noqa: F401
+
+
+def _seed(session, trail_count: int):
+    session.add_all(
+        [
+            LkEnrollmentStatus(code="ENROLLED"),
+            LkEnrollmentStatus(code="IN_PROGRESS"),
+            LkEnrollmentStatus(code="COMPLETED"),
+            LkProgressStatus(code="IN_PROGRESS"),
+            LkProgressStatus(code="COMPLETED"),
+            LkItemType(code="DOC"),
+        ]
+    )
+    session.flush()
+    item_type = session.query(LkItemType).filter_by(code="DOC").one()
+    enrolled = session.query(LkEnrollmentStatus).filter_by(code="ENROLLED").one()
+    completed = session.query(LkProgressStatus).filter_by(code="COMPLETED").one()
+
+    user = User(
+        email=f"sync_{uuid.uuid4().hex[:8]}@example.com",
+        password_hash="x",
+        name_for_certificate="Sync User",
+        username=f"sync_{uuid.uuid4().hex[:6]}",
+        sex_id=session.query(LkSex.id).filter_by(code="NS").scalar(),
+        color_id=session.query(LkColor.id).filter_by(code="NS").scalar(),
+        role_id=session.query(LkRole.id).filter_by(code="User").scalar(),
+    )
+    session.add(user)
+    session.flush()
+
+    now = datetime.now(timezone.utc)
+    trail_ids = []
+    next_id = 1
+    for index in range(trail_count):
+        trail = Trails(name=f"Trail {index}")
+        session.add(trail)
+        session.flush()
+        trail_ids.append(trail.id)
+        items = [
+            TrailItems(
+                trail_id=trail.id,
+                title=f"Item {order}",
+                url=f"https://example.com/{index}/{order}",
+                order_index=order,
+                duration_seconds=0,
+                legacy_type="DOC",
+                item_type_id=item_type.id,
+            )
+            for order in range(2)
+        ]
+        session.add_all(items)
+        session.flush()
+        session.add(
+            UserTrails(
+                id=index + 1,
+                user_id=user.user_id,
+                trail_id=trail.id,
+                status_id=enrolled.id,
+                progress_percent=0,
+                started_at=now,
+            )
+        )
+        # First trail fully completed, the others halfway through.
+        done_items = items if index == 0 else items[:1]
+        for item in done_items:
+            session.add(
+                UserItemProgress(
+                    id=next_id,
+                    user_id=user.user_id,
+                    trail_item_id=item.id,
+                    status_id=completed.id,
+                    progress_value=100,
+                    completed_at=now,
+                )
+            )
+            next_id += 1
+    session.flush()
+    return user.user_id, trail_ids
+
+
+def test_sync_progress_for_trails_updates_statuses_and_certificates(db_session):
+    user_id, trail_ids = _seed(db_session, trail_count=3)
+    repo = UserTrailsRepository(db_session)
+
+    progress = repo.get_progress_map_for_user(user_id, trail_ids, sync=True)
+
+    first, *others = trail_ids
+    assert progress[first]["status"] == "COMPLETED"
+    assert progress[first]["computed_progress_percent"] == 100.0
+    assert progress[first]["certificate"]["hash"]
+    for trail_id in others:
+        assert progress[trail_id]["status"] == "IN_PROGRESS"
+        assert progress[trail_id]["done"] == 1
+        assert progress[trail_id]["computed_progress_percent"] == 50.0
+        assert "certificate" not in progress[trail_id]
+
+    certificates = db_session.query(TrailCertificates).filter_by(user_id=user_id).all()
+    assert [cert.trail_id for cert in certificates] == [first]
+
+
+def test_sync_statement_count_does_not_grow_with_trails(db_session, query_budget):
+    user_id, trail_ids = _seed(db_session, trail_count=4)
+    repo = UserTrailsRepository(db_session)
+    # Warm-up sync so both measurements below run against settled rows.
+    repo.sync_progress_for_trails(user_id, trail_ids)
+
+    with query_budget() as single:
+        repo.sync_progress_for_trails(user_id, trail_ids[:1])
+    with query_budget(single.count, max_repeats=1):
+        repo.sync_progress_for_trails(user_id, trail_ids)
+
+
+def test_incremental_aggregation_bumps_counter_and_reconciles(
+    db_session, monkeypatch, query_budget
+):
+    monkeypatch.setattr(settings, "progress_aggregation_mode", "incremental")
+    user_id, trail_ids = _seed(db_session, trail_count=2)
+    trail_id = trail_ids[1]
+    pending = (
+        db_session.query(TrailItems)
+        .filter_by(trail_id=trail_id)
+        .order_by(TrailItems.order_index.desc())
+        .first()
+    )
+    # Another worker's outline cache may predate this item; totals must not
+    # come from it.
+    get_trail_outline(db_session, trail_id)
+    extra = TrailItems(
+        trail_id=trail_id,
+        title="Item extra",
+        url="https://example.com/extra",
+        order_index=2,
+        duration_seconds=0,
+        legacy_type="DOC",
+        item_type_id=pending.item_type_id,
+    )
+    db_session.add(extra)
+    db_session.flush()
+
+    def enrollment():
+        return (
+            db_session.query(UserTrails)
+            .filter_by(user_id=user_id, trail_id=trail_id)
+            .populate_existing()
+            .one()
+        )
+
+    # Seeds the counters of enrollments created before the column existed.
+    assert reconcile(db_session, log=lambda _msg: None).repaired == 2
+    assert enrollment().done_items == 1
+
+    repo = UserProgressRepository(db_session)
+    complete = [ProgressEvent(user_id, trail_id, pending.id, "COMPLETED", 100)]
+    with query_budget() as write:
+        repo.upsert_progress_batch(complete)
+
+    row = enrollment()
+    assert row.done_items == 2
+    assert float(row.progress_percent) == 66.67
+    assert row.completed_at is None
+    # No recount of the learner's items on the write path.
+    assert not any(
+        "user_item_progress" in statement and "count(" in statement.lower()
+        for statement in write.statements
+    )
+
+    with query_budget() as repeat:
+        repo.upsert_progress_batch(complete)
+    assert enrollment().done_items == 2
+    assert not any("user_trails" in statement for statement in repeat.statements)
+
+    # Reaching the total is confirmed by an exact recount before completing.
+    repo.upsert_progress_batch(
+        [ProgressEvent(user_id, trail_id, extra.id, "COMPLETED", 100)]
+    )
+    row = enrollment()
+    assert row.done_items == 3
+    assert float(row.progress_percent) == 100.0
+    assert row.completed_at is not None
+    assert db_session.query(TrailCertificates).filter_by(trail_id=trail_id).count()
+
+    db_session.query(UserTrails).filter_by(trail_id=trail_id).update(
+        {UserTrails.done_items: 0}
+    )
+    assert reconcile(db_session, log=lambda _msg: None).repaired == 1
+    assert enrollment().done_items == 3
+
+
+def test_incremental_counter_drift_does_not_complete_early(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "progress_aggregation_mode", "incremental")
+    user_id, trail_ids = _seed(db_session, trail_count=2)
+    trail_id = trail_ids[1]
+    reconcile(db_session, log=lambda _msg: None)
+    # A lost race left the counter one ahead of the learner's real progress.
+    db_session.query(UserTrails).filter_by(trail_id=trail_id).update(
+        {UserTrails.done_items: 2}
+    )
+
+    UserTrailsRepository(db_session).apply_completion_deltas(user_id, {trail_id: 1})
+
+    row = db_session.query(UserTrails).filter_by(trail_id=trail_id).one()
+    db_session.refresh(row)
+    assert row.done_items == 1
+    assert row.completed_at is None
+    assert not db_session.query(TrailCertificates).filter_by(trail_id=trail_id).count()
+
+
+def test_incremental_percent_rounds_a_numeric_on_postgresql():
+    sql = str(
+        select(progress_percent_expr(UserTrails.done_items + 1, 3)).compile(
+            dialect=postgresql.dialect()
+        )
+    )
+    # PostgreSQL has round(numeric, int) but no round(double precision, int).
+    assert "round(CAST(" in sql
+    assert "AS NUMERIC), " in sql
+
+
+def test_incremental_counters_reset_when_an_edit_removes_items(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "progress_aggregation_mode", "incremental")
+    user_id, _ = _seed(db_session, trail_count=0)
+    db_session.add(LkItemType(code="VIDEO"))
+    db_session.flush()
+    trails = TrailsRepository(db_session)
+    trail = trails.create_trail(
+        name="Editada",
+        thumbnail_path=None,
+        description=None,
+        author=None,
+        created_by=None,
+        sections=[
+            {
+                "title": "Seção",
+                "order_index": 0,
+                "items": [
+                    {
+                        "title": f"Vídeo {order}",
+                        "type": "VIDEO",
+                        "url": "https://www.youtube.com/watch?v=abcdefgh",
+                        "duration_seconds": 60,
+                        "order_index": order,
+                    }
+                    for order in range(4)
+                ],
+            }
+        ],
+    )
+    db_session.add(
+        UserTrails(
+            id=1,
+            user_id=user_id,
+            trail_id=trail.id,
+            status_id=db_session.query(LkEnrollmentStatus.id)
+            .filter_by(code="ENROLLED")
+            .scalar(),
+            progress_percent=0,
+            done_items=0,
+            started_at=datetime.now(timezone.utc),
+        )
+    )
+    db_session.flush()
+    item_ids = [
+        item_id
+        for (item_id,) in db_session.query(TrailItems.id)
+        .filter_by(trail_id=trail.id)
+        .order_by(TrailItems.order_index)
+    ]
+    progress = UserProgressRepository(db_session)
+
+    def complete(item_id):
+        progress.upsert_progress_batch(
+            [ProgressEvent(user_id, trail.id, item_id, "COMPLETED", 100)]
+        )
+
+    complete(item_ids[0])
+    complete(item_ids[1])
+
+    payload = trails.get_trail_builder_payload(trail.id)
+    payload["sections"][0]["items"].pop(1)
+    trails.update_trail(
+        trail.id,
+        name="Editada",
+        thumbnail_path=None,
+        description=None,
+        author=None,
+        sections=payload["sections"],
+    )
+    complete(item_ids[2])
+
+    row = (
+        db_session.query(UserTrails)
+        .filter_by(trail_id=trail.id)
+        .populate_existing()
+        .one()
+    )
+    assert row.done_items == 2
+    assert float(row.progress_percent) == 66.67
+    assert row.completed_at is None
+    assert not db_session.query(TrailCertificates).filter_by(trail_id=trail.id).count()
+
+
+def test_first_enrollment_sends_the_welcome_email(client, db_session, monkeypatch):
+    login = register_and_login(client, db_session)
+    user = db_session.query(User).order_by(User.user_id.desc()).first()
+    db_session.add(LkEnrollmentStatus(code="ENROLLED"))
+    trail = Trails(name="Boas-vindas")
+    db_session.add(trail)
+    db_session.flush()
+    sent: list[dict] = []
+    monkeypatch.setattr(
+        user_trails_routes,
+        "send_trail_enrollment_email",
+        lambda **kwargs: sent.append(kwargs),
+    )
+
+    def assign_id(mapper, connection, target):
+        if target.id is None:
+            target.id = connection.execute(
+                text("SELECT COALESCE(MAX(id), 0) + 1 FROM user_trails")
+            ).scalar_one()
+
+    event.listen(UserTrails, "before_insert", assign_id)
+    try:
+        for _ in range(2):
+            resp = client.post(
+                f"/user-trails/{trail.id}/enroll",
+                headers={"X-CSRF-Token": login.headers["X-CSRF-Token"]},
+            )
+            assert resp.status_code == 200, resp.get_data(as_text=True)
+    finally:
+        event.remove(UserTrails, "before_insert", assign_id)
+
+    assert sent == [
+        {
+            "email": user.email,
+            "name": "Me Route",
+            "trail_name": "Boas-vindas",
+        }
+    ]
@@ -93,6 +93,7 @@ type ItemTypeOption = { code: string; label: string };
 
 type DraftFormOption = {
   id: string;
+  serverId?: number;
   text: string;
   isCorrect: boolean;
   order: number;
@@ -102,6 +103,7 @@ type DraftQuestionType = "ESSAY" | "TRUE_OR_FALSE" | "SINGLE_CHOICE";
 
 type DraftFormQuestion = {
   id: string;
+  serverId?: number;
   prompt: string;
   type: DraftQuestionType;
   required: boolean;
@@ -110,6 +112,7 @@ type DraftFormQuestion = {
 };
 
 type DraftForm = {
+  serverId?: number;
   title: string;
   description: string;
   minScore: string;
@@ -119,6 +122,7 @@ type DraftForm = {
 
 type DraftItem = {
   id: string;
+  serverId?: number;
   title: string;
   type: string;
   content: string;
@@ -133,6 +137,7 @@ type DraftItem = {
 
 type DraftSection = {
   id: string;
+  serverId?: number;
   title: string;
   items: DraftItem[];
 };
@@ -250,6 +255,7 @@ function ensureQuestionOptions(question: DraftFormQuestion): DraftFormQuestion {
       return {
         ...option,
         id: existing?.id ?? option.id,
+        serverId: existing?.serverId,
         isCorrect: index === 0 ? existing?.isCorrect ?? true : existing?.isCorrect ?? false,
         order: index,
       };
@@ -446,6 +452,7 @@ export default function AdminPanel() {
     const mappedSections = trail.sections.length
       ? trail.sections.map((section) => ({
           id: randomId(),
+          serverId: section.id,
           title: section.title ?? "",
           items: section.items.map((item) => {
             const normalizedType = (item.type || "VIDEO").toUpperCase();
@@ -459,6 +466,7 @@ export default function AdminPanel() {
               normalizedType === "DOC" ? extractDocumentName(rawContent) : null;
             const baseItem: DraftItem = {
               id: randomId(),
+              serverId: item.id,
               title: item.title ?? "",
               type: normalizedType,
               content: rawContent,
@@ -475,6 +483,7 @@ export default function AdminPanel() {
                 const questionType = toDraftQuestionType(question.type);
                 const draftQuestion: DraftFormQuestion = {
                   id: randomId(),
+                  serverId: question.id,
                   prompt: question.prompt ?? "",
                   type: questionType,
                   required: Boolean(question.required),
@@ -484,6 +493,7 @@ export default function AdminPanel() {
                       ? []
                       : question.options.map((option) => ({
                           id: randomId(),
+                          serverId: option.id,
                           text: option.text ?? "",
                           isCorrect: option.is_correct,
                           order: option.order_index ?? 0,
@@ -492,6 +502,7 @@ export default function AdminPanel() {
                 return ensureQuestionOptions(draftQuestion);
               });
               baseItem.form = {
+                serverId: item.form.id,
                 title: item.form.title ?? "",
                 description: item.form.description ?? "",
                 minScore: String(item.form.min_score_to_pass ?? 70),
@@ -1059,9 +1070,11 @@ const handleStartNewTrail = () => {
       author: author.trim() || null,
       description: description.trim() || null,
       sections: sections.map((section, sectionIndex) => ({
+        id: section.serverId,
         title: section.title.trim(),
         order_index: sectionIndex,
         items: section.items.map((item, itemIndex) => ({
+          id: item.serverId,
           title: item.title.trim(),
           type: item.type,
           url: item.content.trim(),
@@ -1071,11 +1084,13 @@ const handleStartNewTrail = () => {
           form:
             item.type === "FORM" && item.form
               ? {
+                  id: item.form.serverId,
                   title: item.form.title.trim() || null,
                   description: item.form.description.trim() || null,
                   min_score_to_pass: parseNumericInput(item.form.minScore, 70),
                   randomize_questions: item.form.randomize,
                   questions: item.form.questions.map((question, questionIndex) => ({
+                    id: question.serverId,
                     prompt: question.prompt.trim(),
                     type: question.type,
                     required: question.required,
@@ -1085,6 +1100,7 @@ const handleStartNewTrail = () => {
                       question.type === "ESSAY"
                         ? []
                         : question.options.map((option, optionIndex) => ({
+                            id: option.serverId,
                             text: option.text.trim(),
                             is_correct: option.isCorrect,
                             order_index: optionIndex,
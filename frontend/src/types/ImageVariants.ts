@@ -0,0 +1,6 @@
+export type ImageVariants = {
+  width: number;
+  height: number;
+  placeholder: string;
+  srcset: Record<string, string>;
+};
@@ -1,7 +1,10 @@
+import type { ImageVariants } from "./ImageVariants";
+
 export type Trilha = {
   id: number;
   name: string;
   thumbnail_url?: string | null;
+  thumbnail_variants?: ImageVariants | null;
   author?: string;
   review?: number;          // 0..5
   review_count?: number;
@@ -1,3 +1,5 @@
+import type { ImageVariants } from "./ImageVariants";
+
 export type Member = {
   id: number;
   full_name: string;
@@ -6,6 +8,7 @@ export type Member = {
   order_index: number;
   photo_path?: string | null;
   photo_url: string | null;
+  photo_variants?: ImageVariants | null;
   created_at: string | null;
   updated_at: string | null;
 };